@@ -0,0 +1,73 @@
+"""
+gunicorn settings for production: ``gunicorn -c python:config.gunicorn``.
+
+The master imports config.wsgi once (``preload_app``), which loads Django,
+builds the GraphQL schema and warms it up (core.warmup), and every worker
+forks from it. Their pages stay shared until something writes to them,
+and the cyclic garbage collector does: each collection updates the header
+of every object it visits. So the master runs without collections while
+it loads, and freezes what it loaded just before forking; collections
+never visit a frozen object again, and its page stays shared.
+``scripts/measure_worker_memory.py`` reports what each worker holds alone.
+
+Everything can be overridden from the environment (GUNICORN_*).
+"""
+import gc
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _cpus():
+    # The CPUs this container may run on, not all of the host's.
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+wsgi_app = 'config.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no', 'off')
+
+# Workers run Python in parallel; threads overlap a worker's waits on the
+# database. Each thread holds its own connection (or one from the pool
+# when DB_POOL_MAX_SIZE is set), so workers * threads bounds them.
+workers = _env_int('GUNICORN_WORKERS', 2 * _cpus() + 1)
+threads = _env_int('GUNICORN_THREADS', 2)
+
+# Replace each worker after about this many requests, so memory it has
+# grown or unshared since the fork is returned; the jitter keeps workers
+# from restarting all at once.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+# Heartbeat files in memory rather than on the container's overlay disk.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+# Off only to measure what freezing saves (scripts/measure_worker_memory.py).
+gc_freeze = os.environ.get('GUNICORN_GC_FREEZE', '1').lower() not in ('0', 'false', 'no', 'off')
+
+if preload_app and gc_freeze:
+    # Collections while the app loads would leave holes in pages that
+    # are about to be shared; pre_fork turns them back on.
+    gc.disable()
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app and gc_freeze:
+        from django.db import connections
+
+        # Connections must not be shared across fork; core.warmup opens
+        # none, but anything else run at import time might have.
+        connections.close_all()
+        gc.freeze()
+        gc.enable()
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+if settings.GRAPHQL_WARMUP:
+    # Once in gunicorn's master with --preload, else once per worker at boot.
+    from core.warmup import warm_up
+    warm_up()
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import rollups
+        from .models import Organization, Project, Task
+        from .tenancy import organization_changed
+
+        post_save.connect(organization_changed, sender=Organization, dispatch_uid='tenancy.saved')
+        post_delete.connect(organization_changed, sender=Organization, dispatch_uid='tenancy.deleted')
+
+        post_save.connect(rollups.organization_created, sender=Organization, dispatch_uid='rollups.organization')
+        post_init.connect(rollups.project_initialized, sender=Project, dispatch_uid='rollups.project_init')
+        post_save.connect(rollups.project_saved, sender=Project, dispatch_uid='rollups.project')
+        post_init.connect(rollups.task_initialized, sender=Task, dispatch_uid='rollups.task_init')
+        pre_save.connect(rollups.task_saving, sender=Task, dispatch_uid='rollups.task_saving')
+        post_save.connect(rollups.task_saved, sender=Task, dispatch_uid='rollups.task_saved')
+        post_delete.connect(rollups.task_deleted, sender=Task, dispatch_uid='rollups.task_deleted')
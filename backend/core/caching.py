@@ -0,0 +1,62 @@
+"""
+HTTP caching for GraphQL queries sent over GET.
+
+Each root field has a shared-cache lifetime in GRAPHQL_CACHE_MAX_AGE; an
+operation gets the shortest lifetime among its root fields, and fields
+without one make it uncacheable. Browsers are told to revalidate every
+time (``max-age=0``) with the response's ETag, so they never show data
+older than the server's; shared caches such as the nginx microcache in
+frontend/nginx.conf may reuse a response for ``s-maxage`` seconds.
+"""
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from graphql import FieldNode, OperationType, get_operation_ast
+
+NO_STORE = {'no_store': True}
+
+
+def cache_max_age(document, operation_name=None):
+    """Seconds a shared cache may keep the result, or None if it must not"""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+
+    policies = getattr(settings, 'GRAPHQL_CACHE_MAX_AGE', {})
+    max_age = None
+    for selection in operation.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        name = selection.name.value
+        if name == '__typename':
+            continue
+        field_age = policies.get(name)
+        if not field_age:
+            return None
+        max_age = field_age if max_age is None else min(max_age, field_age)
+    return max_age
+
+
+def finalize_response(request, response, max_age, encoding=None, etag=None):
+    """
+    Add Cache-Control and an ETag to a GraphQL response, and turn it into
+    a 304 when the client already holds this result. ``encoding`` is the
+    Content-Encoding the body will be sent with: each encoding is a
+    different representation, so it gets its own strong ETag.
+
+    ``etag`` is given for results that change only with the schema
+    (core.introspection). It stands in for a hash of the body, and every
+    cache revalidates the result each time, so none keeps it past a deploy.
+    """
+    if request.method != 'GET' or response.status_code != 200 or not (max_age or etag):
+        patch_cache_control(response, **NO_STORE)
+        return response
+
+    if etag:
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+    else:
+        set_response_etag(response)
+        patch_cache_control(response, public=True, max_age=0, s_maxage=max_age, must_revalidate=True)
+    if encoding:
+        response['ETag'] = f'{response["ETag"][:-1]}-{encoding}"'
+    return get_conditional_response(request, etag=response['ETag'], response=response)
@@ -0,0 +1,75 @@
+"""
+Content-Encoding negotiation for GraphQL responses.
+
+Responses of at least GRAPHQL_COMPRESS_MIN_BYTES are compressed with
+Brotli when the client accepts it and the ``brotli`` package is installed,
+otherwise with gzip. Smaller responses are sent as they are: the framing
+overhead outweighs the savings.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(request, response):
+    """The coding to compress ``response`` with, or None"""
+    if response.streaming or response.has_header('Content-Encoding'):
+        return None
+    if len(response.content) < getattr(settings, 'GRAPHQL_COMPRESS_MIN_BYTES', 1024):
+        return None
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for coding in available_encodings():
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, encoding):
+    """Compress ``response`` in place with ``encoding`` (which may be None)"""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if encoding is None or response.status_code != 200:
+        return response
+    compressed = compress(response.content, encoding)
+    if len(compressed) >= len(response.content):
+        return response
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,415 @@
+"""
+An index advisor for the queries a workload actually runs.
+
+``record()`` captures the SQL of a block of code, such as a replay of the
+frontend's GraphQL operations. ``parse()`` reads what each single-table
+SELECT asks of its table: columns compared for equality, a range, an
+excluded value, a sort order, and for aggregates the columns it reads.
+``propose()`` turns those into the B-tree indexes that would serve them:
+
+* composite: the equality columns, then the range or ORDER BY columns;
+* partial: ``NOT (column = value)`` becomes the index condition, so an
+  index for open tasks leaves the finished ones out;
+* covering: an aggregate's other columns are INCLUDEd, so it can be
+  answered from the index alone (PostgreSQL; other databases ignore it).
+
+The tenant column is left out of proposed keys when the query has another
+equality column: the parent row's key already implies the tenant, and
+partitioned tables are pruned on it. Candidates already served by an
+existing index are dropped, and candidates on the same columns merged.
+``verify()`` then builds them in a transaction that is rolled back and
+compares the planner's cost of every query before and after (PostgreSQL).
+
+The parser only understands the SQL the Django ORM generates; anything it
+doesn't (joins, OR, expressions) is left out of the advice, not guessed at.
+"""
+import json
+import re
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.backends.utils import names_digest
+from django.db.models import Index, Q
+
+from core.partitioning import PARTITION_KEY, partitioned_tables
+
+TENANT_COLUMN = PARTITION_KEY
+
+_CLAUSES = ('SELECT', 'FROM', 'WHERE', 'GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT', 'OFFSET', 'FOR UPDATE')
+_COLUMN = r'"(?P<table>\w+)"\."(?P<column>\w+)"'
+_EQUAL = re.compile(rf'^{_COLUMN} (?:= %s|IN \()')
+_RANGE = re.compile(rf'^{_COLUMN} (?:<|<=|>|>=) %s$')
+_EXCLUDED = re.compile(rf'^NOT \({_COLUMN} = %s\)$')
+_ORDER = re.compile(rf'^{_COLUMN}(?: (?P<direction>ASC|DESC))?$')
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+@dataclass
+class Access:
+    """What one SELECT needs from its table"""
+    sql: str
+    params: tuple
+    table: str
+    equal: list = field(default_factory=list)
+    ranges: list = field(default_factory=list)
+    excluded: dict = field(default_factory=dict)
+    order: list = field(default_factory=list)  # (column, descending)
+    read: set = field(default_factory=set)
+    aggregate: bool = False
+
+    @property
+    def key(self):
+        """The statement with IN lists collapsed, so repeats of one query compare equal"""
+        return _IN_LIST.sub('IN (...)', self.sql)
+
+
+@dataclass
+class Candidate:
+    model: type
+    columns: list  # (column, descending)
+    include: list = field(default_factory=list)
+    excluded: dict = field(default_factory=dict)
+    accesses: list = field(default_factory=list)
+    supersedes: list = field(default_factory=list)  # existing indexes with the same key
+    sorts: bool = False  # the key saves a query's ORDER BY a sort
+    adopted: bool = False  # the columns are an existing index's, to add the INCLUDE to
+
+    def index(self):
+        """The candidate as a ``models.Index`` on field names"""
+        opts = self.model._meta
+        fields = [('-' if descending else '') + _field(opts, column).name for column, descending in self.columns]
+        include = [_field(opts, column).name for column in self.include]
+        condition = None
+        for column, value in self.excluded.items():
+            condition = (condition or Q()) & ~Q(**{_field(opts, column).name: value})
+        # Django's automatic names hash the fields only; a partial or
+        # covering index needs its condition and INCLUDE in the hash too.
+        digest = names_digest(
+            opts.db_table, *[('-' if descending else '') + column for column, descending in self.columns],
+            *self.include,
+            *[f'{column}<>{value}' for column, value in self.excluded.items()], length=6,
+        )
+        name = f'{opts.db_table[:11]}_{self.columns[0][0][:7]}_{digest}_idx'
+        return Index(fields=fields, include=include, condition=condition, name=name)
+
+
+def _field(opts, column):
+    return next(field for field in opts.concrete_fields if field.column == column)
+
+
+def _python_value(table, column, value):
+    """A parameter compared with ``column`` as its field holds it: a choice rather than its code"""
+    model = _models().get(table)
+    if model is None or not any(field.column == column for field in model._meta.concrete_fields):
+        return value
+    return _field(model._meta, column).to_python(value)
+
+
+# Recording --------------------------------------------------------------------
+
+@contextmanager
+def record():
+    """Collect ``(sql, params)`` of every SELECT run in the block, on every database"""
+    statements = []
+
+    def recorder(execute, sql, params, many, context):
+        if sql.startswith('SELECT'):
+            statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield statements
+
+
+# Parsing ----------------------------------------------------------------------
+
+def _split(text, separator):
+    """Split ``text`` on ``separator`` outside parentheses"""
+    parts, depth, start, i = [], 0, 0, 0
+    while i < len(text):
+        char = text[i]
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and text.startswith(separator, i):
+            parts.append(text[start:i])
+            i += len(separator)
+            start = i
+            continue
+        i += 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts]
+
+
+def _clauses(sql):
+    """The top-level clauses of a SELECT, by keyword, with the offset of each"""
+    found, depth = [], 0
+    for i, char in enumerate(sql):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0 and (i == 0 or sql[i - 1] == ' '):
+            for keyword in _CLAUSES:
+                if sql.startswith(keyword + ' ', i) or sql.startswith(keyword, i) and i + len(keyword) == len(sql):
+                    found.append((keyword, i))
+                    break
+    clauses = {}
+    for index, (keyword, start) in enumerate(found):
+        end = found[index + 1][1] if index + 1 < len(found) else len(sql)
+        clauses[keyword] = (sql[start + len(keyword):end].strip(), start + len(keyword))
+    return clauses
+
+
+def _unwrap(text):
+    """``text`` without parentheses around all of it"""
+    while text.startswith('(') and text.endswith(')'):
+        depth = 0
+        for i, char in enumerate(text):
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if depth == 0 and i < len(text) - 1:
+                return text  # the first parenthesis closes early: "(a) AND (b)"
+        text = text[1:-1].strip()
+    return text
+
+
+def parse(sql, params=()):
+    """The Access of an ORM-generated single-table SELECT, or None"""
+    clauses = _clauses(sql)
+    source = clauses.get('FROM', ('', 0))[0]
+    match = re.fullmatch(r'"(\w+)"', source)
+    if not match:
+        return None  # joins, subqueries in FROM, or no table at all
+    access = Access(sql=sql, params=tuple(params), table=match.group(1))
+    own = re.compile(rf'"{access.table}"\."(\w+)"')
+
+    if 'WHERE' in clauses:
+        where, offset = clauses['WHERE']
+        conditions = _split(_unwrap(where), ' AND ')
+        position = offset
+        for condition in conditions:
+            # The parameter a condition compares with is the one after all
+            # placeholders earlier in the statement.
+            start = sql.index(condition, position)
+            placeholder = sql.count('%s', 0, start)
+            position = start + len(condition)
+            condition = _unwrap(condition)
+            if _split(condition, ' OR ') != [condition]:
+                continue
+            for pattern, kind in ((_EQUAL, 'equal'), (_RANGE, 'range'), (_EXCLUDED, 'excluded')):
+                found = pattern.match(condition)
+                if not found or found.group('table') != access.table:
+                    continue
+                column = found.group('column')
+                if kind == 'equal' and column not in access.equal:
+                    access.equal.append(column)
+                elif kind == 'range' and column not in access.ranges:
+                    access.ranges.append(column)
+                elif kind == 'excluded' and placeholder < len(params):
+                    access.excluded[column] = _python_value(access.table, column, params[placeholder])
+                break
+
+    if 'ORDER BY' in clauses:
+        for term in _split(clauses['ORDER BY'][0], ','):
+            found = _ORDER.match(term)
+            if not found or found.group('table') != access.table:
+                access.order = []
+                break
+            access.order.append((found.group('column'), found.group('direction') == 'DESC'))
+
+    select = clauses.get('SELECT', ('', 0))[0]
+    access.aggregate = 'GROUP BY' in clauses or bool(re.search(r'\b(?:COUNT|SUM|MIN|MAX|AVG)\(', select))
+    access.read = set(own.findall(select))
+    return access
+
+
+# Proposing --------------------------------------------------------------------
+
+def _models():
+    return {model._meta.db_table: model for model in apps.get_models()}
+
+
+def existing_indexes(connection, table):
+    """
+    The B-tree indexes, unique constraints and primary key of ``table``, by
+    name. Indexes on expressions (whose columns introspect as None) are
+    left out, as only column lists are compared.
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {
+        name: constraint for name, constraint in constraints.items()
+        if constraint['columns'] and None not in constraint['columns']
+        and (constraint['index'] or constraint['unique'] or constraint['primary_key'])
+        and constraint.get('type', Index.suffix) in (Index.suffix, 'btree')
+    }
+
+
+def serves(columns, access, key, include=()):
+    """
+    Whether an index on ``columns`` serves ``key`` (the equality columns an
+    index needs, then the range or order columns) for ``access``: every
+    leading column up to the equality ones is compared for equality, the
+    rest of the key follows, and ``include`` is somewhere in the index.
+    """
+    remaining = [column for column, _ in key]
+    position = 0
+    equal = [column for column in remaining if column in access.equal]
+    while equal and position < len(columns) and columns[position] in access.equal:
+        if columns[position] in equal:
+            equal.remove(columns[position])
+        position += 1
+    if equal:
+        return False
+    rest = [column for column in remaining if column not in access.equal]
+    if columns[position:position + len(rest)] != rest:
+        return False
+    return set(include) <= set(columns)
+
+
+def _key(model, access):
+    # The tenant leads, like in the hand-written indexes, unless a parent
+    # row's key implies it (a status or a name doesn't).
+    equal = sorted(access.equal, key=lambda column: column != TENANT_COLUMN)
+    opts = model._meta
+    if TENANT_COLUMN in equal and any(
+        column == opts.pk.column or _field(opts, column).many_to_one
+        for column in equal if column != TENANT_COLUMN
+    ):
+        equal.remove(TENANT_COLUMN)
+    key = [(column, False) for column in equal]
+    if access.ranges:
+        key.append((access.ranges[0], False))
+    elif access.order and not access.aggregate:
+        order = access.order
+        if len(order) > 1 and order[-1][0] == opts.pk.column:
+            # A trailing primary key only breaks ties (see apply_order in
+            # core.schema); an index on the keys before it leaves a cheap
+            # incremental sort.
+            order = order[:-1]
+        key += [(column, descending) for column, descending in order if column not in equal]
+    return key
+
+
+def untenanted(accesses):
+    """
+    Accesses that look a row of a partitioned table up by primary key
+    alone, which searches every partition. The query should name the tenant
+    rather than get an index of its own.
+    """
+    return [
+        access for access in accesses
+        if access.table in partitioned_tables() and access.equal == [_models()[access.table]._meta.pk.column]
+    ]
+
+
+def propose(accesses, connection):
+    """Candidates for the accesses no existing index serves, merged by table and condition"""
+    models = _models()
+    indexes = {}
+    candidates = []
+    for access in accesses:
+        model = models.get(access.table)
+        if model is None:
+            continue
+        key = _key(model, access)
+        if not key or key == [(model._meta.pk.column, False)]:
+            continue
+        include = []
+        if access.aggregate:
+            include = sorted(access.read - {column for column, _ in key} - set(access.excluded))
+        if access.table not in indexes:
+            indexes[access.table] = existing_indexes(connection, access.table)
+        existing = indexes[access.table]
+        if any(index['unique'] and set(index['columns']) <= set(access.equal) for index in existing.values()):
+            continue  # at most one row
+        if not access.excluded and any(
+            serves(index['columns'], access, key, include) for index in existing.values()
+        ):
+            continue
+        sorted_by_key = bool(access.order) and not access.aggregate and not access.ranges
+        candidate = Candidate(
+            model, key, include, dict(access.excluded), [access],
+            sorts=sorted_by_key and not any(serves(index['columns'], access, key) for index in existing.values()),
+        )
+        if include and not access.excluded:
+            # A plain index that already has the key only lacks the INCLUDE;
+            # take over its columns so the new index can replace it.
+            plain = [
+                (name, index) for name, index in existing.items()
+                if index['index'] and not index['unique'] and len(index['columns']) > len(key)
+                and serves(index['columns'], access, key)
+            ]
+            if plain:
+                name, index = max(plain, key=lambda item: len(set(item[1]['columns']) & set(include)))
+                orders = index.get('orders') or ['ASC'] * len(index['columns'])
+                candidate.columns = [(column, order == 'DESC') for column, order in zip(index['columns'], orders)]
+                candidate.include = [column for column in include if column not in index['columns']]
+                candidate.supersedes.append(name)
+                candidate.adopted = True
+        candidates.append(candidate)
+    # Names hash the whole definition, so a partial index that exists already
+    # (which introspection can't compare) has the candidate's name.
+    return [
+        candidate for candidate in _merge(candidates)
+        if candidate.index().name not in indexes[candidate.model._meta.db_table]
+    ]
+
+
+def _merge(candidates):
+    """Fold each candidate into a longer one on the same table and condition that starts with its columns"""
+    merged = []
+    for candidate in sorted(candidates, key=lambda c: -len(c.columns)):
+        names = [column for column, _ in candidate.columns]
+        for kept in merged:
+            if (kept.model is candidate.model and kept.excluded == candidate.excluded
+                    and [column for column, _ in kept.columns[:len(names)]] == names):
+                kept.include += [
+                    column for column in candidate.include
+                    if column not in kept.include and column not in {c for c, _ in kept.columns}
+                ]
+                kept.accesses += candidate.accesses
+                kept.sorts = kept.sorts or candidate.sorts
+                kept.supersedes += [name for name in candidate.supersedes if name not in kept.supersedes]
+                break
+        else:
+            merged.append(candidate)
+    return merged
+
+
+# Verifying --------------------------------------------------------------------
+
+def cost(connection, access):
+    """The planner's total cost estimate for ``access`` (PostgreSQL)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {access.sql}', access.params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Total Cost']
+
+
+def verify(candidates, connection):
+    """
+    Return ``{access key: (cost before, cost after)}`` for the accesses of
+    ``candidates``, with the candidates built in a transaction that is
+    rolled back. PostgreSQL only; None elsewhere.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    accesses = {access.key: access for candidate in candidates for access in candidate.accesses}
+    before = {key: cost(connection, access) for key, access in accesses.items()}
+    with transaction.atomic(using=connection.alias):
+        # CREATE INDEX fails while deferred constraint checks are pending.
+        connection.check_constraints()
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for candidate in candidates:
+                schema_editor.add_index(candidate.model, candidate.index())
+        after = {key: cost(connection, access) for key, access in accesses.items()}
+        transaction.set_rollback(True, using=connection.alias)
+    return {key: (before[key], after[key]) for key in accesses}
@@ -0,0 +1,80 @@
+"""
+PostgreSQL backend that borrows connections from an in-process pool.
+
+Selected by settings when DB_POOL_MAX_SIZE is set. CONN_MAX_AGE is forced to
+0 in that mode so every request hands its connection back to the pool when
+Django closes it, rather than pinning one per thread or greenlet.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+
+from core.db.pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _is_healthy(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return True
+
+
+def get_pool(alias, settings_dict, conn_params):
+    # Pools are per process: a pool inherited across fork() would share
+    # sockets between gunicorn workers.
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict.get('POOL', {})
+                pool = _pools[key] = ConnectionPool(
+                    lambda: base.Database.connect(**conn_params),
+                    min_size=options.get('MIN_SIZE', 0),
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 30.0),
+                    max_lifetime=options.get('MAX_LIFETIME', 3600.0),
+                    check_interval=options.get('CHECK_INTERVAL', 30.0),
+                    is_healthy=_is_healthy,
+                )
+    return pool
+
+
+class _PooledDatabase:
+    """Stands in for the psycopg module; ``connect`` borrows from the pool"""
+
+    def __init__(self, wrapper):
+        self._wrapper = wrapper
+
+    def connect(self, **conn_params):
+        return self._wrapper.pool(conn_params).getconn()
+
+    def __getattr__(self, name):
+        return getattr(base.Database, name)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.Database = _PooledDatabase(self)
+
+    def pool(self, conn_params=None):
+        if conn_params is None:
+            conn_params = self.get_connection_params()
+        return get_pool(self.alias, self.settings_dict, conn_params)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        conn = self.connection
+        discard = bool(conn.closed)
+        if not discard and not conn.autocommit:
+            try:
+                conn.rollback()
+            except base.Database.Error:
+                discard = True
+        self.pool().putconn(conn, discard=discard)
@@ -0,0 +1,57 @@
+"""
+Tenant-scoped single-statement inserts.
+
+``insert_returning`` inserts a row whose parent keys come from a query, as
+``INSERT ... SELECT ... RETURNING``. The tenant check (the parent exists
+and belongs to the organization the client named) and the insert are then
+one statement and one round trip; if the check fails, the SELECT yields no
+row and nothing is inserted.
+"""
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
+
+
+def insert_returning(model, values, scope, columns):
+    """
+    Insert a ``model`` row with ``values`` (field name -> value) and return
+    it, or None if ``scope`` matched no row.
+
+    ``scope`` is a queryset of at most one row; ``columns`` maps the
+    attribute names of the fields it fills to the ``scope`` fields they are
+    read from, e.g. ``{'project_id': 'id'}``. Fields given neither way get
+    their defaults.
+
+    ``post_save`` is sent as for ``save()``; ``pre_save`` is not.
+    """
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    opts = model._meta
+    quote = connection.ops.quote_name
+
+    instance = model(**values)
+    fields = [
+        field for field in opts.concrete_fields
+        if field is not opts.auto_field and field.attname not in columns
+    ]
+    params = [field.get_db_prep_save(field.pre_save(instance, True), connection) for field in fields]
+    scope_sql, scope_params = (
+        scope.order_by().values_list(*columns.values())[:1].query.get_compiler(using=alias).as_sql()
+    )
+    targets = [quote(field.column) for field in fields]
+    targets += [quote(opts.get_field(name).column) for name in columns]
+    placeholders = ', '.join(['%s'] * len(fields) + ['s.*'])
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} ({", ".join(targets)}) '
+        f'SELECT {placeholders} FROM ({scope_sql}) AS s '
+        f'RETURNING {", ".join(quote(field.column) for field in opts.concrete_fields)}'
+    )
+
+    with transaction.atomic(using=alias):
+        rows = list(model._default_manager.db_manager(alias).raw(sql, params + list(scope_params)))
+        if not rows:
+            return None
+        created = rows[0]
+        post_save.send(
+            sender=model, instance=created, created=True, update_fields=None, raw=False, using=alias,
+        )
+    return created
@@ -0,0 +1,162 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db.migrations import AddIndex
+from django.db.migrations.operations.base import Operation
+
+
+def _partitions(schema_editor, table):
+    """The partitions of ``table``, or None if it is not partitioned"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [table])
+        if cursor.fetchone()[0] != 'p':
+            return None
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = %s::regclass ORDER BY 1",
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _suffixed(name, suffix):
+    # PostgreSQL truncates identifiers to 63 bytes.
+    return f'{name[:63 - len(suffix)]}{suffix}'
+
+
+class AddIndexOnline(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so writes continue while the
+    index builds; a plain AddIndex elsewhere. Needs ``atomic = False`` on
+    the migration.
+
+    PostgreSQL can't build an index on a partitioned table concurrently
+    (see core.partitioning). There the index is created on the parent
+    alone, built concurrently on each partition and attached to it.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+            return
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        partitions = _partitions(schema_editor, model._meta.db_table)
+        if partitions is None:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+
+        quote = schema_editor.quote_name
+        # Columns, INCLUDE and WHERE as Django renders them for the table.
+        statement = self.index.create_sql(model, schema_editor)
+        definition = '({columns}){include}{condition}'.format(**statement.parts)
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(self.index.name)} '
+            f'ON ONLY {quote(model._meta.db_table)} {definition}'
+        )
+        for position, partition in enumerate(partitions):
+            name = quote(_suffixed(self.index.name, f'_{position}'))
+            schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {partition} {definition}')
+            schema_editor.execute(f'ALTER INDEX {quote(self.index.name)} ATTACH PARTITION {name}')
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _partitions(schema_editor, model._meta.db_table) is None:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+            return
+        # Dropping a partitioned index drops its partitions' indexes with it;
+        # CONCURRENTLY is not supported for it.
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(self.index.name)}')
+
+
+class AlterChoicesToCodes(Operation):
+    """
+    Convert choice columns of a model from their strings to the codes of a
+    core.fields.CodedChoiceField, and back when reversed. ``fields`` is a
+    list of (name, field) pairs giving the new fields.
+
+    On PostgreSQL the columns change type in one ALTER TABLE, so the table
+    is rewritten (and its indexes rebuilt) once, under an ACCESS EXCLUSIVE
+    lock. Indexes whose definition compares a converted column with a
+    string (a partial index's WHERE, an expression) would not survive the
+    rewrite meaningfully: drop them before this operation and add them
+    back after it. Elsewhere the values are mapped in place and the
+    columns altered as usual.
+
+    A value that is not one of the choices fails the migration (NOT NULL)
+    rather than being lost.
+    """
+
+    reversible = True
+
+    def __init__(self, model_name, fields):
+        self.model_name = model_name
+        self.fields = fields
+        super().__init__()
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {'model_name': self.model_name, 'fields': self.fields}
+
+    @property
+    def model_name_lower(self):
+        return self.model_name.lower()
+
+    def state_forwards(self, app_label, state):
+        for name, field in self.fields:
+            state.alter_field(app_label, self.model_name_lower, name, field, True)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._convert(app_label, schema_editor, from_state, to_state, to_codes=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._convert(app_label, schema_editor, from_state, to_state, to_codes=False)
+
+    def _convert(self, app_label, schema_editor, from_state, to_state, to_codes):
+        from_model = from_state.apps.get_model(app_label, self.model_name)
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, to_model):
+            return
+        quote = schema_editor.quote_name
+        table = quote(to_model._meta.db_table)
+        changes = []
+        for name, _ in self.fields:
+            old, new = from_model._meta.get_field(name), to_model._meta.get_field(name)
+            coded = new if to_codes else old
+            pairs = coded.codes.items() if to_codes else ((code, value) for value, code in coded.codes.items())
+            column = quote(new.column)
+            mapping = 'CASE {} {} END'.format(column, ' '.join(
+                f'WHEN {schema_editor.quote_value(before)} THEN {schema_editor.quote_value(after)}'
+                for before, after in pairs
+            ))
+            changes.append((old, new, column, mapping))
+
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute('ALTER TABLE {} {}'.format(table, ', '.join(
+                f'ALTER COLUMN {column} TYPE {new.db_type(schema_editor.connection)} USING {mapping}'
+                for old, new, column, mapping in changes
+            )))
+            return
+        # Strings become codes while the column still holds text (and the
+        # other way around), then the column is altered as usual. Altering
+        # with the new model keeps the columns altered before (SQLite
+        # rebuilds the whole table from the model).
+        if not to_codes:
+            for old, new, column, mapping in changes:
+                schema_editor.alter_field(to_model, old, new)
+        schema_editor.execute('UPDATE {} SET {}'.format(table, ', '.join(
+            f'{column} = {mapping}' for old, new, column, mapping in changes
+        )))
+        if to_codes:
+            for old, new, column, mapping in changes:
+                schema_editor.alter_field(to_model, old, new)
+
+    def describe(self):
+        names = ', '.join(name for name, _ in self.fields)
+        return f'Store {names} of {self.model_name} as choice codes'
+
+    @property
+    def migration_name_fragment(self):
+        return f'{self.model_name_lower}_choice_codes'
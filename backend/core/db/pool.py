@@ -0,0 +1,129 @@
+"""
+In-process database connection pool.
+
+Used by the ``core.db.backends.postgresql_pool`` engine so that threaded or
+green-threaded workers share a bounded set of physical connections instead
+of each opening (and tearing down) its own.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect, min_size=0, max_size=10, timeout=30.0,
+                 max_lifetime=3600.0, check_interval=30.0, is_healthy=None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self._is_healthy = is_healthy or (lambda conn: True)
+
+        self._idle = deque()  # (connection, created_at, released_at)
+        self._born = {}       # id(connection) -> created_at
+        self._size = 0
+        self._cond = threading.Condition()
+
+        # Counters reported by the load test.
+        self.created = 0
+        self.discarded = 0
+
+        for _ in range(self.min_size):
+            self._idle.append(self._new_entry())
+
+    def _new_entry(self):
+        conn = self._connect()
+        now = time.monotonic()
+        self._born[id(conn)] = now
+        self._size += 1
+        self.created += 1
+        return conn, now, now
+
+    def _usable(self, entry):
+        conn, created_at, released_at = entry
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if getattr(conn, 'closed', False):
+            return False
+        if now - released_at > self.check_interval:
+            try:
+                return self._is_healthy(conn)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        self._size -= 1
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    entry = self._idle.pop()
+                    if self._usable(entry):
+                        return entry[0]
+                    self._discard(entry[0])
+                if self._size < self.max_size:
+                    # Reserve the slot before connecting outside the lock.
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection available after {self.timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            created_at = self._born.get(id(conn))
+            if discard or created_at is None or getattr(conn, 'closed', False):
+                if created_at is not None:
+                    self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    @property
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'created': self.created,
+                'discarded': self.discarded,
+            }
@@ -0,0 +1,158 @@
+"""
+Primary/replica routing with read-your-writes consistency.
+
+Reads go to a replica unless the current request is pinned to the primary:
+during mutations, and afterwards while the client's consistency token says
+the replica may not have its writes yet. The token carries an expiry time
+and, on PostgreSQL, the primary's WAL LSN after the write; a replica that
+has replayed past that LSN is used again even before the window expires.
+"""
+import math
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+_reads_from = ContextVar('reads_from', default=None)
+
+# pg_lsn's text form: two 32-bit hexadecimal halves.
+LSN_PATTERN = re.compile(r'[0-9A-F]{1,8}/[0-9A-F]{1,8}')
+
+
+def replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def primary_reads(pinned=True):
+    """Route reads inside the block to the primary when ``pinned``"""
+    reset = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(reset)
+
+
+@contextmanager
+def reads_from(alias):
+    """Route reads inside the block to ``alias``, unless pinned to the primary"""
+    reset = _reads_from.set(alias)
+    try:
+        yield
+    finally:
+        _reads_from.reset(reset)
+
+
+def read_alias():
+    """The database a read made here would go to"""
+    return PrimaryReplicaRouter().db_for_read(None)
+
+
+@contextmanager
+def snapshot(alias):
+    """
+    One transaction on ``alias``, in which every read sees the same
+    snapshot on PostgreSQL (REPEATABLE READ). Inside a transaction already,
+    the block just joins it.
+    """
+    connection = connections[alias]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=alias):
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        return _reads_from.get() or random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+def _window():
+    return getattr(settings, 'READ_YOUR_WRITES_WINDOW', 5)
+
+
+class ConsistencyToken:
+    """
+    ``<expires_at>[:<lsn>]``, issued after a client writes to the primary.
+
+    Clients send it back unsigned, so ``parse`` trusts it no further than
+    an issued one could go: the expiry is clamped to the window from now,
+    and a token whose LSN is not one is ignored.
+    """
+
+    def __init__(self, expires_at, lsn=None):
+        self.expires_at = expires_at
+        self.lsn = lsn
+
+    @classmethod
+    def issue(cls):
+        return cls(time.time() + _window(), current_primary_lsn())
+
+    @classmethod
+    def parse(cls, value):
+        if not value:
+            return None
+        expires_at, _, lsn = value.partition(':')
+        try:
+            expires_at = float(expires_at)
+        except ValueError:
+            return None
+        if not math.isfinite(expires_at) or (lsn and not LSN_PATTERN.fullmatch(lsn)):
+            return None
+        return cls(min(expires_at, time.time() + _window()), lsn or None)
+
+    def __str__(self):
+        return f'{self.expires_at:.3f}:{self.lsn}' if self.lsn else f'{self.expires_at:.3f}'
+
+    def requires_primary(self):
+        if time.time() >= self.expires_at:
+            return False
+        if self.lsn is None:
+            return True
+        return not all(replica_has_replayed(alias, self.lsn) for alias in replicas())
+
+
+def current_primary_lsn():
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_wal_lsn()::text')
+        return cursor.fetchone()[0]
+
+
+def replica_has_replayed(alias, lsn):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        # NULL means the server is not in recovery, i.e. it is not lagging.
+        cursor.execute(
+            'SELECT COALESCE(pg_wal_lsn_diff(pg_last_wal_replay_lsn(), %s::pg_lsn) >= 0, TRUE)',
+            [lsn],
+        )
+        return cursor.fetchone()[0]
@@ -0,0 +1,137 @@
+"""
+Conditional single-row updates with optimistic concurrency.
+
+``update_returning`` writes only the changed columns of one row, bumps its
+``version`` and reads the new row back with ``UPDATE ... RETURNING``, in a
+single statement. Its WHERE clause carries the tenant filters and, when the
+client sent one, the version (or ``updated_at``) it last read, so a write
+based on a stale read matches no row instead of overwriting someone else's.
+
+Receivers of ``post_save`` (the rollups in core.rollups) need the values
+the row had before the update. On PostgreSQL the statement joins the row
+to itself through a ``FOR UPDATE`` subquery, whose columns still hold the
+old values in RETURNING. SQLite, which serializes writers, reads them just
+before the update and makes the update conditional on the version it read.
+"""
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+_OLD_PREFIX = 'previous_'
+
+
+class UpdateConflict(Exception):
+    """The row exists but no longer has the version the client expected"""
+
+    def __init__(self, current):
+        super().__init__(f'{current._meta.object_name} {current.pk} was changed by another request')
+        self.current = current
+
+
+def _column(model, name, connection):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
+def _from_db(model, name, value, connection):
+    field = model._meta.get_field(name)
+    if value is None or not hasattr(field, 'from_db_value'):
+        return value
+    return field.from_db_value(value, None, connection)
+
+
+def _conditions(model, filters, connection, prefix=''):
+    """``<prefix>column = %s`` for each of ``filters``, and their parameters"""
+    sql, params = [], []
+    for name, value in filters.items():
+        field = model._meta.get_field(name)
+        sql.append(f'{prefix}{connection.ops.quote_name(field.column)} = %s')
+        params.append(field.get_db_prep_value(value, connection))
+    return sql, params
+
+
+def update_returning(model, filters, changes, expected=None, previous=()):
+    """
+    Apply ``changes`` (field name -> value) to the one row of ``model``
+    matching ``filters``, and return it as a model instance. ``previous``
+    names fields whose values before the update are kept in the
+    ``instance.previous`` dict.
+
+    ``expected`` (field name -> value, e.g. ``{'version': 3}``) must match
+    the stored row too; if it doesn't, UpdateConflict carries the current
+    row. If no row matches ``filters``, raise ``model.DoesNotExist``.
+
+    ``post_save`` is sent as for ``save(update_fields=...)``; ``pre_save``
+    is not, as there is no instance before the update.
+    """
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    opts = model._meta
+    changes = dict(changes)
+    for field in opts.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            changes[field.name] = timezone.now()
+    expected = {name: value for name, value in (expected or {}).items() if value is not None}
+
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    # SQLite's RETURNING only takes unqualified columns; PostgreSQL needs
+    # them qualified to tell the updated row from the joined one.
+    prefix = 't.' if connection.vendor == 'postgresql' else ''
+    version = _column(model, 'version', connection)
+    assignments = [f'{_column(model, name, connection)} = %s' for name in changes]
+    assignments.append(f'{version} = {prefix}{version} + 1')
+    set_params = [
+        opts.get_field(name).get_db_prep_save(value, connection) for name, value in changes.items()
+    ]
+    returning = [f'{prefix}{quote(field.column)}' for field in opts.concrete_fields]
+
+    with transaction.atomic(using=alias):
+        where, where_params = _conditions(model, {**filters, **expected}, connection, prefix)
+        if connection.vendor == 'postgresql':
+            # The subquery's row is the one locked and replaced; its columns
+            # keep the values from before the update.
+            inner, inner_params = _conditions(model, filters, connection, 'p.')
+            pk = quote(opts.pk.column)
+            old_columns = ''.join(f', p.{_column(model, name, connection)}' for name in previous)
+            returning += [f'p.{_column(model, name, connection)} AS {_OLD_PREFIX}{name}' for name in previous]
+            sql = (
+                f'UPDATE {table} AS t SET {", ".join(assignments)} '
+                f'FROM (SELECT p.{pk}{old_columns} FROM {table} AS p '
+                f'WHERE {" AND ".join(inner)} FOR UPDATE) AS p '
+                f'WHERE t.{pk} = p.{pk} AND {" AND ".join(where)} '
+                f'RETURNING {", ".join(returning)}'
+            )
+            params = set_params + inner_params + where_params
+            old = None
+        else:
+            old = model._default_manager.using(alias).filter(**filters).values('version', *previous).first()
+            if old is None:
+                raise model.DoesNotExist(f'{opts.object_name} matching query does not exist.')
+            version_sql, version_params = _conditions(model, {'version': old['version']}, connection)
+            sql = (
+                f'UPDATE {table} SET {", ".join(assignments)} '
+                f'WHERE {" AND ".join(where + version_sql)} '
+                f'RETURNING {", ".join(returning)}'
+            )
+            params = set_params + where_params + version_params
+
+        rows = list(model._default_manager.db_manager(alias).raw(sql, params))
+        if not rows:
+            current = model._default_manager.using(alias).filter(**filters).first()
+            if current is None:
+                raise model.DoesNotExist(f'{opts.object_name} matching query does not exist.')
+            raise UpdateConflict(current)
+        instance = rows[0]
+        if old is None:
+            # Extra columns of a raw() row come back as the database has them.
+            old = {
+                name: _from_db(model, name, getattr(instance, f'{_OLD_PREFIX}{name}'), connection)
+                for name in previous
+            }
+        instance.previous = {name: old[name] for name in previous}
+
+        post_save.send(
+            sender=model, instance=instance, created=False, update_fields=frozenset(changes),
+            raw=False, using=alias,
+        )
+    return instance
@@ -0,0 +1,195 @@
+"""
+Deleting and archiving projects and organizations in batches.
+
+``Model.delete()`` cascades through Django's collector, which loads every
+related task and comment into memory first, and deletes tasks one signal
+at a time; a project or organization with a million tasks runs out of
+memory or time. Here their rows are removed in batches of
+DELETION_BATCH_SIZE tasks, with their comments and history, each batch in
+a transaction of its own, so no lock is held for long and a retry resumes
+where the last attempt stopped. The parent row goes last, when nothing
+refers to it any more. These run as background jobs (core.jobs), which
+report the progress after every batch.
+
+Archiving moves a completed project instead: each batch copies the tasks
+and comments into the archive tables (``ArchivedProject``,
+``ArchivedTask`` and ``ArchivedTaskComment``) in the same transaction that
+deletes them. Like deleted ones, archived projects leave the analytics
+and velocity of their organization.
+
+Batches are plain DELETE statements and send no signals; the rollups of
+the organization are recomputed once its project is gone.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import (
+    ArchivedProject,
+    ArchivedTask,
+    ArchivedTaskComment,
+    Job,
+    Organization,
+    OrganizationDailyThroughput,
+    OrganizationRollupState,
+    OrganizationTaskRollup,
+    Project,
+    ProjectDailyThroughput,
+    ProjectTaskRollup,
+    Task,
+    TaskComment,
+    TaskStatusChange,
+)
+
+COMPLETED = 'COMPLETED'
+
+
+def _batch_size():
+    return getattr(settings, 'DELETION_BATCH_SIZE', 2000)
+
+
+def _connection():
+    return connections[router.db_for_write(Task)]
+
+
+def _table(model, connection):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _delete(model, organization_id, column, values, connection):
+    """DELETE the rows of ``model`` in the organization whose ``column`` is one of ``values``"""
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {_table(model, connection)} '
+            f'WHERE organization_id = %s AND {connection.ops.quote_name(column)} IN ({placeholders})',
+            [organization_id, *values],
+        )
+        return cursor.rowcount
+
+
+def _archive(source, target, organization_id, column, values, connection):
+    """Copy the rows ``_delete`` would remove from ``source`` into ``target``, which has the same columns"""
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in target._meta.concrete_fields)
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_table(target, connection)} ({columns}) '
+            f'SELECT {columns} FROM {_table(source, connection)} '
+            f'WHERE organization_id = %s AND {quote(column)} IN ({placeholders})',
+            [organization_id, *values],
+        )
+
+
+def _remove_tasks(organization_id, tasks, archive, connection):
+    """
+    Delete (or archive) the next batch of ``tasks`` with their comments and
+    history, in one transaction. Return (tasks, comments) removed.
+    """
+    with transaction.atomic(using=connection.alias):
+        ids = list(tasks.order_by('pk').values_list('pk', flat=True)[:_batch_size()])
+        if not ids:
+            return 0, 0
+        if archive:
+            _archive(Task, ArchivedTask, organization_id, 'id', ids, connection)
+            _archive(TaskComment, ArchivedTaskComment, organization_id, 'task_id', ids, connection)
+        comments = _delete(TaskComment, organization_id, 'task_id', ids, connection)
+        _delete(TaskStatusChange, organization_id, 'task_id', ids, connection)
+        return _delete(Task, organization_id, 'id', ids, connection), comments
+
+
+def _remove_project(project, archive, progress, counts):
+    connection = _connection()
+    organization_id = project.organization_id
+    if archive:
+        fields = ['name', 'description', 'status', 'due_date', 'created_at', 'updated_at']
+        ArchivedProject.objects.get_or_create(
+            id=project.pk, organization_id=organization_id,
+            defaults={name: getattr(project, name) for name in fields},
+        )
+    tasks = Task.objects.filter(organization_id=organization_id, project_id=project.pk)
+    while True:
+        removed, comments = _remove_tasks(organization_id, tasks, archive, connection)
+        if not removed:
+            break
+        counts['tasks'] += removed
+        counts['comments'] += comments
+        progress(counts)
+
+    with transaction.atomic(using=connection.alias):
+        # Tasks created since the last batch; none can be added once the
+        # project row is locked.
+        Project.objects.select_for_update().filter(pk=project.pk).first()
+        while True:
+            removed, comments = _remove_tasks(organization_id, tasks, archive, connection)
+            if not removed:
+                break
+            counts['tasks'] += removed
+            counts['comments'] += comments
+        for model in (TaskStatusChange, ProjectTaskRollup, ProjectDailyThroughput):
+            _delete(model, organization_id, 'project_id', [project.pk], connection)
+        Project.objects.filter(pk=project.pk).delete()
+    counts['projects'] += 1
+    progress(counts)
+
+
+def delete_project(organization_id, project_id, archive=False, progress=None):
+    """
+    Delete a project with its tasks, or with ``archive`` move it to the
+    archive tables, in batches; ``progress(counts)`` is called after each.
+    Return the counts of projects, tasks and comments removed: zero if the
+    project no longer exists.
+    """
+    progress = progress or (lambda counts: None)
+    counts = {'projects': 0, 'tasks': 0, 'comments': 0}
+    project = Project.objects.filter(pk=project_id, organization_id=organization_id).first()
+    if project is None:
+        return counts
+    if archive and project.status != COMPLETED:
+        raise ValueError('Only completed projects can be archived')
+    counts['total_tasks'] = Task.objects.filter(organization_id=organization_id, project_id=project_id).count()
+    progress(counts)
+    _remove_project(project, archive, progress, counts)
+    rollups.refresh_organization(organization_id)
+    return counts
+
+
+def delete_organization(organization_id, progress=None, keep_job=None):
+    """
+    Delete an organization and everything in it, project by project, in
+    batches; ``progress(counts)`` is called after each. ``keep_job`` is the
+    id of the job running the deletion, which is detached from the
+    organization rather than deleted with it. Return the counts removed.
+    """
+    progress = progress or (lambda counts: None)
+    counts = {'projects': 0, 'tasks': 0, 'comments': 0}
+    if not Organization.objects.filter(pk=organization_id).exists():
+        return counts
+    counts['total_tasks'] = Task.objects.filter(organization_id=organization_id).count()
+    counts['total_projects'] = Project.objects.filter(organization_id=organization_id).count()
+    progress(counts)
+    for project in Project.objects.filter(organization_id=organization_id).order_by('pk').iterator():
+        _remove_project(project, False, progress, counts)
+
+    connection = _connection()
+    archived = ArchivedTask.objects.filter(organization_id=organization_id)
+    while True:
+        with transaction.atomic(using=connection.alias):
+            ids = list(archived.order_by('pk').values_list('pk', flat=True)[:_batch_size()])
+            if not ids:
+                break
+            _delete(ArchivedTaskComment, organization_id, 'task_id', ids, connection)
+            _delete(ArchivedTask, organization_id, 'id', ids, connection)
+        progress(counts)
+
+    with transaction.atomic(using=connection.alias):
+        Job.objects.filter(pk=keep_job).update(organization=None)
+        for model in (
+            TaskStatusChange, OrganizationTaskRollup, OrganizationDailyThroughput,
+            OrganizationRollupState, ArchivedProject, Job,
+        ):
+            model.objects.filter(organization_id=organization_id).delete()
+        Organization.objects.filter(pk=organization_id).delete()
+    return counts
@@ -0,0 +1,64 @@
+"""
+Choice fields stored as small integers.
+
+A ``CodedChoiceField`` is declared, filtered, validated and serialized
+with its choice strings, exactly like a ``CharField`` with choices: model
+attributes, ``values()`` rows, lookups such as ``status='DONE'``, forms,
+the admin and the GraphQL enums all see ``'DONE'``. The database stores a
+``smallint`` code instead, which shrinks every row and every index the
+column is part of, and sorts in the order of the choices.
+
+A choice's code is its position in ``choices``, from 1; the blank string
+is 0. New choices therefore go at the end, and reordering the choices
+needs a data migration (see ``AlterChoicesToCodes`` in core.db.operations
+for converting a column).
+"""
+from django.core import exceptions
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class CodedChoiceField(models.SmallIntegerField):
+    description = 'Choice stored as a small integer code'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.choices:
+            raise ValueError(f'{type(self).__name__} needs choices')
+
+    @cached_property
+    def codes(self):
+        """The code of each choice, by value"""
+        return {'': 0, **{value: code for code, (value, _) in enumerate(self.flatchoices, start=1)}}
+
+    @cached_property
+    def _values(self):
+        return {code: value for value, code in self.codes.items()}
+
+    @property
+    def validators(self):
+        # The values being validated are the strings, not the codes, so the
+        # integer range checks of SmallIntegerField don't apply.
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        try:
+            return self._values[value]
+        except (KeyError, TypeError):
+            raise exceptions.ValidationError(
+                '%(value)r is not a code of this field.', code='invalid_choice', params={'value': value},
+            ) from None
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.codes[value]
+        except (KeyError, TypeError):
+            raise ValueError(f'{value!r} is not a choice of {self.name}') from None
@@ -0,0 +1,380 @@
+"""
+Incremental delivery (@defer and @stream) for GraphQL queries.
+
+graphql-core 3.2, which graphene 3 pins, executes an operation in a single
+pass. ``IncrementalPlan`` therefore strips the deferred fragments from the
+operation, and ``IncrementalExecutionContext`` runs what is left once. While
+it does, it keeps the objects each deferred fragment was selected on, and
+cuts streamed lists to their ``initialCount``, keeping the remaining items.
+
+The view sends the initial result as the first part of a multipart/mixed
+response. Each later payload resolves only the deferred selection set
+against the kept objects, or completes the kept items of a streamed list,
+in the same execution context: nothing above them runs twice.
+
+Streamed lists deliver their remaining items before any fragment is sent,
+so a fragment deferred inside a streamed list always lands on an item the
+client already has. @stream inside a deferred fragment or inside another
+streamed list is ignored, and that list arrives whole.
+"""
+import copy
+import itertools
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from django.db.models import Manager
+from graphql import (
+    DirectiveLocation,
+    DocumentNode,
+    ExecutionContext,
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLString,
+    InlineFragmentNode,
+    NameNode,
+    SelectionSetNode,
+    Visitor,
+    get_nullable_type,
+    get_operation_ast,
+    is_list_type,
+    located_error,
+    visit,
+)
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_directive_values
+
+DeferDirective = GraphQLDirective(
+    name='defer',
+    description='Deliver this fragment in a later payload.',
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+    },
+)
+
+StreamDirective = GraphQLDirective(
+    name='stream',
+    description='Deliver the first initialCount items of this list now and the rest later.',
+    locations=[DirectiveLocation.FIELD],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+        'initialCount': GraphQLArgument(GraphQLInt, default_value=0),
+    },
+)
+
+# Items per incremental payload for the rest of a streamed list.
+STREAM_BATCH_SIZE = 50
+
+MULTIPART_CONTENT_TYPE = 'multipart/mixed; boundary="-"; deferSpec=20220824'
+
+
+def _active(directive, node, variables):
+    """The directive's argument values, or None if absent or disabled"""
+    values = get_directive_values(directive, node, variables)
+    if values is None or not values['if']:
+        return None
+    return values
+
+
+def _replace(node, **changes):
+    node = copy.copy(node)
+    for name, value in changes.items():
+        setattr(node, name, value)
+    return node
+
+
+def _response_key(node):
+    return node.alias.value if node.alias else node.name.value
+
+
+def _without_stream(directives):
+    return tuple(d for d in directives or () if d.name.value != StreamDirective.name)
+
+
+def _inline_fragments(selection_set, fragments):
+    """Replace named fragment spreads with equivalent inline fragments"""
+    selections = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            selection = InlineFragmentNode(
+                type_condition=fragment.type_condition,
+                directives=selection.directives,
+                selection_set=fragment.selection_set,
+            )
+        if selection.selection_set is not None:
+            selection = _replace(
+                selection, selection_set=_inline_fragments(selection.selection_set, fragments)
+            )
+        selections.append(selection)
+    return SelectionSetNode(selections=tuple(selections))
+
+
+class _VariableCollector(Visitor):
+    def __init__(self):
+        super().__init__()
+        self.names = set()
+
+    def enter_variable(self, node, *args):
+        self.names.add(node.name.value)
+
+
+def _keys(path):
+    """The response keys along ``path``, without list indexes"""
+    return tuple(key for key in path.as_list() if isinstance(key, str)) if path else ()
+
+
+@dataclass
+class Patch:
+    kind: str  # 'stream' or 'defer'
+    chain: Tuple[FieldNode, ...]
+    node: object
+    label: Optional[str] = None
+    initial_count: int = 0
+    # The deferred fragment, or the streamed field, stripped as in the
+    # initial document.
+    selection: object = field(default=None, repr=False)
+    # What the payload is resolved from, by path: (path, parent type, object)
+    # for a fragment, (path, resolve info, remaining items) for a list.
+    targets: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def keys(self):
+        keys = tuple(_response_key(node) for node in self.chain)
+        return keys + (_response_key(self.node),) if self.kind == 'stream' else keys
+
+
+class IncrementalPlan:
+    def __init__(self, document, operation_name=None, variables=None):
+        self.variables = variables or {}
+        self.operation = get_operation_ast(document, operation_name)
+        self.patches = []
+        self.initial = None
+        self.context = None
+        if self.operation is None:
+            return
+
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        selection_set = _inline_fragments(self.operation.selection_set, fragments)
+        self._streamed = set()
+        self._collect(selection_set, (), in_defer=False, in_stream=False)
+        if not self.patches:
+            return
+
+        self.initial = self._document(self._strip(selection_set, keep=self._streamed))
+        # Remaining stream items first, then fragments in document order, so
+        # a fragment's objects are kept before its payload is resolved.
+        self.patches.sort(key=lambda patch: patch.kind != 'stream')
+        self._deferred = {}
+        self._streams = {}
+        for patch in self.patches:
+            if patch.kind == 'defer':
+                patch.selection = SelectionSetNode(selections=(_replace(
+                    patch.node,
+                    directives=tuple(d for d in patch.node.directives if d.name.value != DeferDirective.name),
+                    selection_set=self._strip(patch.node.selection_set),
+                ),))
+                self._deferred.setdefault(patch.keys, []).append(patch)
+            else:
+                streamed = patch.node
+                patch.selection = _replace(
+                    streamed,
+                    directives=_without_stream(streamed.directives),
+                    selection_set=streamed.selection_set and self._strip(streamed.selection_set),
+                )
+                self._streams[patch.keys] = patch
+        # Not a path: root fields have None for a parent.
+        self._last_parent = object()
+
+    def __bool__(self):
+        return bool(self.patches)
+
+    # Splitting ---------------------------------------------------------------
+
+    def _collect(self, selection_set, chain, in_defer, in_stream):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                nested_stream = in_stream
+                stream = _active(StreamDirective, selection, self.variables)
+                if stream is not None and not (in_defer or in_stream):
+                    self._streamed.add(id(selection))
+                    self.patches.append(Patch(
+                        'stream', chain, selection, stream.get('label'),
+                        max(stream.get('initialCount') or 0, 0),
+                    ))
+                    nested_stream = True
+                if selection.selection_set is not None:
+                    self._collect(selection.selection_set, chain + (selection,), in_defer, nested_stream)
+            elif isinstance(selection, InlineFragmentNode):
+                defer = _active(DeferDirective, selection, self.variables)
+                if defer is not None:
+                    self.patches.append(Patch('defer', chain, selection, defer.get('label')))
+                self._collect(selection.selection_set, chain, in_defer or defer is not None, in_stream)
+
+    def _strip(self, selection_set, keep=frozenset()):
+        """Drop deferred fragments, and @stream from fields not in ``keep``"""
+        selections = []
+        for selection in selection_set.selections:
+            if isinstance(selection, InlineFragmentNode):
+                if _active(DeferDirective, selection, self.variables) is not None:
+                    continue
+                selection = _replace(selection, selection_set=self._strip(selection.selection_set, keep))
+            else:
+                if id(selection) not in keep:
+                    selection = _replace(selection, directives=_without_stream(selection.directives))
+                if selection.selection_set is not None:
+                    selection = _replace(selection, selection_set=self._strip(selection.selection_set, keep))
+            selections.append(selection)
+        if not selections:
+            # Everything here was deferred; a selection set can't be empty.
+            selections.append(FieldNode(name=NameNode(value='__typename')))
+        return SelectionSetNode(selections=tuple(selections))
+
+    def _document(self, selection_set):
+        collector = _VariableCollector()
+        visit(selection_set, collector)
+        operation = _replace(
+            self.operation,
+            selection_set=selection_set,
+            variable_definitions=tuple(
+                definition for definition in self.operation.variable_definitions or ()
+                if definition.variable.name.value in collector.names
+            ),
+        )
+        return DocumentNode(definitions=(operation,))
+
+    # Execution -------------------------------------------------------------
+
+    def keep_parent(self, parent_type, source, path):
+        """Keep ``source`` if a deferred fragment was selected on it"""
+        parent = path.prev
+        if parent is self._last_parent:
+            # Sibling fields share their parent's path.
+            return
+        self._last_parent = parent
+        for patch in self._deferred.get(_keys(parent), ()):
+            patch.targets.setdefault(tuple(parent.as_list()) if parent else (), (parent, parent_type, source))
+
+    def split_stream(self, node, info, path, result):
+        """The first ``initialCount`` items of a streamed list, keeping the rest"""
+        if _active(StreamDirective, node, info.variable_values) is None:
+            return result
+        patch = self._streams.get(_keys(path))
+        if patch is None:
+            return result
+        if isinstance(result, Manager):
+            result = result.all()
+        items = list(result)
+        patch.targets[tuple(path.as_list())] = (path, info, items[patch.initial_count:])
+        return items[:patch.initial_count]
+
+    # Payloads ----------------------------------------------------------------
+
+    def _resolve_defer(self, patch):
+        context = self.context
+        for path, parent_type, source in patch.targets.values():
+            fields = collect_fields(
+                context.schema, context.fragments, context.variable_values, parent_type, patch.selection
+            )
+            try:
+                data = context.execute_fields(parent_type, source, path, fields)
+            except GraphQLError as error:
+                # A non-null field failed: the whole fragment is null.
+                context.collected_errors.add(error, path)
+                data = None
+            yield {'data': data, 'path': path.as_list() if path else []}
+
+    def _resolve_stream(self, patch):
+        context = self.context
+        key = _response_key(patch.node)
+        for path, info, items in patch.targets.values():
+            item_type = get_nullable_type(info.return_type).of_type
+            completed = []
+            for index, item in enumerate(items, start=patch.initial_count):
+                item_path = path.add_key(index)
+                try:
+                    completed.append(context.complete_value(item_type, [patch.selection], info, item_path, item))
+                except Exception as raw_error:
+                    error = located_error(raw_error, [patch.selection], item_path.as_list())
+                    context.collected_errors.add(error, item_path)
+                    completed.append(None)
+            parent = path.prev.as_list() if path.prev else []
+            for start in range(0, len(completed), STREAM_BATCH_SIZE):
+                yield {
+                    'items': completed[start:start + STREAM_BATCH_SIZE],
+                    'path': parent + [key, patch.initial_count + start],
+                }
+
+    def payloads(self, patch, format_error):
+        """The incremental entries delivering ``patch``, resolved from what the initial payload kept"""
+        errors = self.context.collected_errors.errors
+        seen = len(errors)
+        resolve = self._resolve_defer if patch.kind == 'defer' else self._resolve_stream
+        entries = list(resolve(patch))
+        if patch.label:
+            for entry in entries:
+                entry['label'] = patch.label
+        if len(errors) > seen:
+            if not entries:
+                entries.append({'data': None, 'path': []})
+            entries[0]['errors'] = [format_error(error) for error in errors[seen:]]
+        return entries
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    """
+    Execution context for the initial payload of an IncrementalPlan, found
+    as ``incremental_plan`` on the context value (the request). Every field
+    it executes offers its parent to the plan, and every list it completes
+    may be streamed; the plan resolves its later payloads in this context.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.plan = getattr(self.context_value, 'incremental_plan', None)
+        if self.plan is not None:
+            self.plan.context = self
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if self.plan is not None:
+            self.plan.keep_parent(parent_type, source, path)
+        return super().execute_field(parent_type, source, field_nodes, path)
+
+    def complete_value(self, return_type, field_nodes, info, path, result):
+        # Items of a list are completed with the list's own field nodes.
+        if (self.plan is not None and result is not None and field_nodes[0].directives
+                and is_list_type(return_type) and isinstance(path.key, str)):
+            result = self.plan.split_stream(field_nodes[0], info, path, result)
+        return super().complete_value(return_type, field_nodes, info, path, result)
+
+
+class MultipartBody:
+    """
+    Frame encoded JSON parts as a multipart/mixed body: ``first``, then
+    each of ``rest``. Closing the body closes ``rest``, even unstarted.
+    """
+
+    def __init__(self, first, rest):
+        self.first = first
+        self.rest = rest
+
+    def __iter__(self):
+        for part in itertools.chain([self.first], self.rest):
+            yield b'\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n' + part
+        yield b'\r\n-----\r\n'
+
+    def close(self):
+        self.rest.close()
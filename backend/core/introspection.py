@@ -0,0 +1,75 @@
+"""
+Introspection results, computed once per process.
+
+The schema doesn't change while a process runs, so an operation that asks
+for nothing but ``__schema``, ``__type`` and ``__typename`` always has the
+same result. GraphiQL and code generators send the same large introspection
+query again and again; each distinct one is validated and executed once and
+answered from memory afterwards. ``warm_up`` (core.warmup) computes the
+standard query's result before the first request.
+
+Every result is tagged with the schema's version, a digest of its SDL, so
+a client can revalidate it (ETag, see core.caching) or compare it with the
+files ``manage.py export_schema`` wrote, and never has to fetch it again
+while the schema stays the same.
+"""
+import hashlib
+from functools import lru_cache
+
+from graphql import (
+    FieldNode,
+    OperationType,
+    execute,
+    get_introspection_query,
+    get_operation_ast,
+    parse,
+    print_schema,
+    validate,
+)
+
+INTROSPECTION_FIELDS = frozenset({'__schema', '__type', '__typename'})
+
+
+def is_introspection(document, operation_name=None):
+    """Whether the operation selects nothing but introspection fields, without variables"""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None or operation.operation != OperationType.QUERY or operation.variable_definitions:
+        return False
+    return all(
+        isinstance(selection, FieldNode) and selection.name.value in INTROSPECTION_FIELDS
+        for selection in operation.selection_set.selections
+    )
+
+
+@lru_cache(maxsize=32)
+def cached_result(schema, query, operation_name=None):
+    """
+    The ExecutionResult of ``query`` against ``schema`` (a GraphQLSchema) if
+    it is a valid introspection operation, else None.
+    """
+    try:
+        document = parse(query)
+    except Exception:
+        return None
+    if not is_introspection(document, operation_name) or validate(schema, document):
+        return None
+    result = execute(schema, document, operation_name=operation_name)
+    return None if result.errors else result
+
+
+@lru_cache(maxsize=4)
+def schema_version(schema):
+    """A short digest of ``schema``'s SDL, which changes whenever the schema does"""
+    return hashlib.sha256(print_schema(schema).encode()).hexdigest()[:16]
+
+
+def etag(schema, query, operation_name=None):
+    """The entity tag of ``query``'s result: its schema version and the operation it runs"""
+    operation = hashlib.sha256(f'{operation_name or ""}\n{query}'.encode()).hexdigest()[:16]
+    return f'"{schema_version(schema)}-{operation}"'
+
+
+def prime(schema):
+    """Compute the schema version and the result of the standard introspection query"""
+    schema_version(schema)
+    return cached_result(schema, get_introspection_query(descriptions=True), 'IntrospectionQuery')
@@ -0,0 +1,319 @@
+"""
+Background jobs: a queue table in the database, worked by ``manage.py run_worker``.
+
+Work too slow for a request worker (recomputing an organization's rollups,
+backfilling its task history) is enqueued as a ``Job`` row and run by a
+worker process on the same machine; no broker is involved. A job enqueued
+inside a transaction only becomes visible to workers when it commits, and
+disappears if it rolls back.
+
+Workers claim due jobs with ``SELECT ... FOR UPDATE SKIP LOCKED``, so the
+threads and processes polling the table never wait on each other's claims.
+SQLite has no row locks; its single writer serializes claims instead. Either
+way a claim is a conditional update that only takes jobs still queued.
+
+A failed attempt is retried after an exponential backoff until the job's
+``max_attempts`` are used up. A running job whose worker stopped
+heartbeating (it crashed or was killed) is requeued once its lease of
+JOB_LEASE_SECONDS expires, so handlers must be safe to run again. Long
+handlers call ``heartbeat(job)`` to keep their lease, and can report their
+progress with it for clients polling the job.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import deletion, rollups
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED'
+
+
+@dataclass(frozen=True)
+class Handler:
+    func: Callable
+    public: bool  # may be enqueued through the GraphQL API
+    unique: bool  # enqueueing it again while one is queued or running returns that job
+
+
+HANDLERS = {}
+
+
+def handler(kind, public=False, unique=False):
+    """Register the decorated ``func(job)`` to run jobs of ``kind``; it returns the job's JSON result"""
+    def register(func):
+        HANDLERS[kind] = Handler(func, public, unique)
+        return func
+    return register
+
+
+def public_kinds():
+    return sorted(kind for kind, registered in HANDLERS.items() if registered.public)
+
+
+def _db():
+    # The queue is always read on the primary: a replica may lag behind claims.
+    return router.db_for_write(Job)
+
+
+def _jobs():
+    return Job.objects.using(_db())
+
+
+# Enqueueing ---------------------------------------------------------------------
+
+def _active_job(kind, organization, payload):
+    return _jobs().filter(
+        kind=kind, organization=organization, status__in=(QUEUED, RUNNING), payload=payload
+    ).first()
+
+
+def enqueue(kind, organization=None, payload=None, run_after=None, max_attempts=None):
+    """
+    Queue a job of ``kind`` and return it, or for a unique kind the job
+    already queued or running. The core_job_unique_active constraint
+    settles callers racing to queue the same job.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    payload = payload or {}
+    unique = HANDLERS[kind].unique
+    if unique:
+        active = _active_job(kind, organization, payload)
+        if active is not None:
+            return active
+    try:
+        # A savepoint: losing the race must not break the caller's transaction.
+        with transaction.atomic(using=_db()):
+            return _jobs().create(
+                kind=kind,
+                unique=unique,
+                organization=organization,
+                payload=payload,
+                run_after=run_after or timezone.now(),
+                max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            )
+    except IntegrityError:
+        # Queued by another caller since the lookup; it committed, so it is visible now.
+        active = _active_job(kind, organization, payload) if unique else None
+        if active is None:
+            raise
+        return active
+
+
+# Claiming and running -----------------------------------------------------------
+
+def claim(worker, limit=1, now=None):
+    """Claim up to ``limit`` due jobs for ``worker`` and return them"""
+    now = now or timezone.now()
+    with transaction.atomic(using=_db()):
+        ids = list(
+            _jobs().select_for_update(skip_locked=True)
+            .filter(status=QUEUED, run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        _jobs().filter(id__in=ids, status=QUEUED).update(
+            status=RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1
+        )
+        return list(_jobs().filter(id__in=ids, status=RUNNING, locked_by=worker, locked_at=now))
+
+
+def _owned(job):
+    # The attempt count fences off an attempt whose lease expired and was
+    # reclaimed by another worker.
+    return _jobs().filter(pk=job.pk, status=RUNNING, attempts=job.attempts)
+
+
+def heartbeat(job, progress=None):
+    """
+    Extend the lease of a running job, and record its ``progress`` (a JSON
+    value) if given; False if it is no longer this attempt's
+    """
+    fields = {'locked_at': timezone.now()}
+    if progress is not None:
+        fields['progress'] = progress
+    return bool(_owned(job).update(**fields))
+
+
+def _reporter(job):
+    """A progress callback for long handlers that stops them once they lose their lease"""
+    def report(progress):
+        if not heartbeat(job, dict(progress)):
+            raise RuntimeError(f'Job {job.pk} attempt {job.attempts} lost its lease')
+    return report
+
+
+def backoff(attempts):
+    """Seconds before retrying after ``attempts`` failed attempts, with jitter"""
+    delay = min(settings.JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1)
+
+
+def run(job):
+    """Run a claimed job and record its outcome; return True if it succeeded"""
+    registered = HANDLERS.get(job.kind)
+    started = time.perf_counter()
+    try:
+        if registered is None:
+            raise LookupError(f'No handler for job kind: {job.kind}')
+        result = registered.func(job)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            _owned(job).update(status=FAILED, finished_at=now, locked_by='', last_error=error)
+            logger.exception('Job %s (%s) failed after %s attempts', job.pk, job.kind, job.attempts)
+        else:
+            retry_at = now + timedelta(seconds=backoff(job.attempts))
+            _owned(job).update(status=QUEUED, run_after=retry_at, locked_by='', last_error=error)
+            logger.warning('Job %s (%s) attempt %s failed, retrying at %s',
+                           job.pk, job.kind, job.attempts, retry_at.isoformat())
+        return False
+
+    _owned(job).update(status=SUCCEEDED, finished_at=timezone.now(), locked_by='', result=result)
+    logger.info('Job %s (%s) succeeded in %.0fms', job.pk, job.kind, (time.perf_counter() - started) * 1000)
+    return True
+
+
+def work(worker, limit=1):
+    """Claim and run up to ``limit`` due jobs; return how many were claimed"""
+    claimed = claim(worker, limit)
+    for job in claimed:
+        run(job)
+    return len(claimed)
+
+
+# Maintenance --------------------------------------------------------------------
+
+def requeue_expired(now=None):
+    """
+    Requeue running jobs whose lease expired, or fail them if they have no
+    attempts left. Return how many jobs were touched.
+    """
+    now = now or timezone.now()
+    expired = _jobs().filter(status=RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+    error = 'Worker lease expired'
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED, finished_at=now, locked_by='', last_error=error
+    )
+    requeued = expired.update(status=QUEUED, run_after=now, locked_by='', last_error=error)
+    return failed + requeued
+
+
+def purge(now=None):
+    """Delete jobs that finished more than JOB_RETENTION_DAYS ago"""
+    now = now or timezone.now()
+    finished_before = now - timedelta(days=settings.JOB_RETENTION_DAYS)
+    deleted, _ = _jobs().filter(status__in=[SUCCEEDED, FAILED], finished_at__lt=finished_before).delete()
+    return deleted
+
+
+class Worker:
+    """
+    Runs jobs on ``concurrency`` threads until ``stop()`` is called or, in
+    ``burst`` mode, until no job is due. The calling thread requeues
+    expired jobs and purges old ones every ``maintenance_interval`` seconds.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=1.0, burst=False, maintenance_interval=60.0, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.maintenance_interval = maintenance_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs; running ones finish first"""
+        self._stopping.set()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, args=(f'{self.name}:{index}',), name=f'job-worker-{index}')
+            for index in range(self.concurrency)
+        ]
+        try:
+            self.maintain()
+            maintained = time.monotonic()
+            for thread in threads:
+                thread.start()
+            while any(thread.is_alive() for thread in threads):
+                self._stopping.wait(self.poll_interval)
+                if not self._stopping.is_set() and time.monotonic() - maintained >= self.maintenance_interval:
+                    self.maintain()
+                    maintained = time.monotonic()
+        finally:
+            self.stop()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            connections.close_all()
+
+    def maintain(self):
+        requeued = requeue_expired()
+        purged = purge()
+        if requeued or purged:
+            logger.info('Requeued %s expired jobs, purged %s finished jobs', requeued, purged)
+
+    def _loop(self, name):
+        try:
+            while not self._stopping.is_set():
+                try:
+                    claimed = work(name)
+                except Exception:
+                    logger.exception('Worker %s could not claim a job', name)
+                    claimed = 0
+                    connections.close_all()
+                if not claimed:
+                    if self.burst:
+                        return
+                    self._stopping.wait(self.poll_interval)
+        finally:
+            # Each thread has its own connections.
+            connections.close_all()
+
+
+# Handlers -----------------------------------------------------------------------
+
+@handler('refresh_rollups', public=True, unique=True)
+def refresh_rollups(job):
+    return {'project_cells': rollups.refresh_organization(job.organization_id)}
+
+
+@handler('backfill_history', public=True, unique=True)
+def backfill_history(job):
+    rollups.backfill_history(job.organization_id)
+    return {'project_cells': rollups.refresh_organization(job.organization_id)}
+
+
+@handler('delete_project', unique=True)
+def delete_project(job):
+    return deletion.delete_project(
+        job.payload['organization_id'], job.payload['project_id'],
+        archive=job.payload.get('archive', False), progress=_reporter(job),
+    )
+
+
+@handler('delete_organization', unique=True)
+def delete_organization(job):
+    # The organization id is in the payload too: the job outlives it.
+    return deletion.delete_organization(
+        job.payload['organization_id'], progress=_reporter(job), keep_job=job.pk
+    )
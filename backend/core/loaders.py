@@ -0,0 +1,120 @@
+"""
+Request-scoped loaders for per-object aggregates and rollups.
+
+Fields such as ``Project.taskCount`` or ``Project.analytics`` would
+otherwise run their own query for every object in a list. A loader is told
+which objects a list resolver returned (``queue``); the first time any of
+them needs its values, they are fetched for all of them with one query.
+
+Loaders live on the request, like the organization memo in ``tenancy``, so
+every operation of a batched request shares them. The view clears them
+after each mutation, so an operation never sees aggregates from before a
+write made earlier in the same request.
+"""
+from abc import ABC, abstractmethod
+
+from django.db.models import Count, Q
+
+from .models import (
+    OrganizationRollupState,
+    OrganizationTaskRollup,
+    Project,
+    ProjectTaskRollup,
+    Task,
+    TaskComment,
+)
+
+ROLLUP_FIELDS = ('status', 'priority', 'task_count', 'overdue_count')
+
+_REQUEST_ATTR = '_loaders'
+
+
+class BatchLoader(ABC):
+    """Values per key, fetched for every queued key at once"""
+
+    def __init__(self):
+        self._pending = set()
+        self._values = {}
+
+    def queue(self, keys):
+        """Load ``keys`` along with the next one requested"""
+        self._pending.update(key for key in keys if key not in self._values)
+
+    def load(self, key):
+        if key not in self._values:
+            keys, self._pending = self._pending | {key}, set()
+            self._values.update(self.fetch(keys))
+        return self._values[key]
+
+    @abstractmethod
+    def fetch(self, keys):
+        """Return a dict with the value of every key in ``keys``"""
+
+
+class AggregateLoader(BatchLoader):
+    """Aggregates of ``queryset`` grouped by the ``group_by`` column; zero for keys without rows"""
+
+    def __init__(self, queryset, group_by, **aggregates):
+        super().__init__()
+        self.queryset = queryset
+        self.group_by = group_by
+        self.aggregates = aggregates
+
+    def fetch(self, keys):
+        values = {key: dict.fromkeys(self.aggregates, 0) for key in keys}
+        rows = (
+            self.queryset.filter(**{f'{self.group_by}__in': keys})
+            .order_by()
+            .values(self.group_by)
+            .annotate(**self.aggregates)
+        )
+        for row in rows:
+            values[row.pop(self.group_by)] = row
+        return values
+
+
+class RowsLoader(BatchLoader):
+    """The rows of ``queryset`` with each ``group_by`` value, as lists of dicts of ``fields``"""
+
+    def __init__(self, queryset, group_by, *fields):
+        super().__init__()
+        self.queryset = queryset
+        self.group_by = group_by
+        self.fields = fields
+
+    def fetch(self, keys):
+        values = {key: [] for key in keys}
+        rows = self.queryset.filter(**{f'{self.group_by}__in': keys}).values(self.group_by, *self.fields)
+        for row in rows:
+            values[row.pop(self.group_by)].append(row)
+        return values
+
+
+class Loaders:
+    def __init__(self):
+        done = Count('id', filter=Q(status='DONE'))
+        self.project_tasks = AggregateLoader(Task.objects, 'project_id', total=Count('id'), done=done)
+        self.organization_tasks = AggregateLoader(Task.objects, 'organization_id', total=Count('id'), done=done)
+        self.organization_projects = AggregateLoader(Project.objects, 'organization_id', total=Count('id'))
+        self.task_comments = AggregateLoader(TaskComment.objects, 'task_id', total=Count('id'))
+        self.project_rollups = RowsLoader(ProjectTaskRollup.objects, 'project_id', *ROLLUP_FIELDS)
+        self.organization_rollups = RowsLoader(OrganizationTaskRollup.objects, 'organization_id', *ROLLUP_FIELDS)
+        self.rollup_states = RowsLoader(OrganizationRollupState.objects, 'organization_id', 'overdue_before')
+
+
+def get_loaders(request):
+    """
+    The loaders for ``request`` (a resolver's ``info.context``), created on
+    first use. Without a request every call gets fresh loaders.
+    """
+    loaders = getattr(request, _REQUEST_ATTR, None)
+    if loaders is None:
+        loaders = Loaders()
+        if request is not None:
+            setattr(request, _REQUEST_ATTR, loaders)
+    return loaders
+
+
+def clear_loaders(request):
+    if request is not None and hasattr(request, _REQUEST_ATTR):
+        delattr(request, _REQUEST_ATTR)
@@ -0,0 +1,145 @@
+"""
+Logging helpers that keep disk I/O off the request path.
+
+Request threads only put records on an in-memory queue; a background
+QueueListener formats them as JSON and writes them to a size-rotated file.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every LogRecord has; anything else was passed through ``extra``.
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime',
+}
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record as one JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc_info'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in every ``1 / rate`` records at or below ``max_level``.
+
+    Warnings and errors always pass, so sampling only thins out the
+    high-volume informational lines.
+    """
+
+    def __init__(self, rate=1.0, max_level='INFO', name=''):
+        super().__init__(name)
+        rate = float(rate)
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.max_level = logging._checkLevel(max_level)
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not super().filter(record):
+            return False
+        if record.levelno > self.max_level:
+            return True
+        if self.every == 0:
+            return False
+        with self._lock:
+            self._seen += 1
+            return (self._seen - 1) % self.every == 0
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing when the queue is saturated.
+        self.queue.put(self._sentinel)
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    QueueHandler that owns its listener and a RotatingFileHandler target.
+
+    ``emit`` never blocks: when the queue is full the record is counted in
+    ``dropped`` and discarded. The listener thread is restarted in forked
+    children (gunicorn workers), since threads do not survive ``fork``.
+    """
+
+    def __init__(self, filename, maxBytes=10 * 1024 * 1024, backupCount=5,
+                 encoding='utf-8', queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = RotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount,
+            encoding=encoding, delay=True,
+        )
+        self.dropped = 0
+        self.listener = None
+        self._start_listener()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self):
+        self.listener = _Listener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def _after_fork(self):
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self._start_listener()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, not in the caller.
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve %-args and tracebacks now (they may reference mutable
+        # objects), but leave the JSON rendering to the target formatter.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self.listener and self.listener._thread is not None:
+            self.listener.stop()
+            self.target.flush()
+            self._start_listener()
+
+    def close(self):
+        if self.listener is not None:
+            if self.listener._thread is not None:
+                self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,222 @@
+import json
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.serializer import serializer_factory
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import Count
+from django.test import RequestFactory
+
+from core.db import advisor
+from core.db.operations import AddIndexOnline
+from core.models import Organization, Task, TaskComment
+from core.schema import schema
+
+# The operations the frontend issues (frontend/src/graphql/queries.ts), with
+# the fields that reach the database.
+WORKLOAD = {
+    'GetOrganizations': '''query { organizations { id projectCount totalTasks completedTasks } }''',
+    'GetDashboardData': '''query($organizationSlug: String!) {
+        organization(slug: $organizationSlug) { id projectCount totalTasks completedTasks }
+        projects(organizationSlug: $organizationSlug, limit: 5, orderBy: UPDATED_AT_DESC) {
+            id taskCount completedTasksCount
+        }
+    }''',
+    'GetProjects': '''query($organizationSlug: String!, $status: String) {
+        projects(organizationSlug: $organizationSlug, status: $status) { id taskCount completedTasksCount }
+    }''',
+    'GetOrganizationStats': '''query($organizationSlug: String!) {
+        organization(slug: $organizationSlug) { analytics { overdueTasks byStatus { key count } } }
+        projects(organizationSlug: $organizationSlug) { id taskCount analytics { overdueTasks } }
+    }''',
+    'GetProject': '''query($projectId: ID!, $organizationSlug: String!) {
+        project(id: $projectId, organizationSlug: $organizationSlug) { id taskCount completedTasksCount }
+    }''',
+    'GetTasks': '''query($projectId: ID!, $organizationSlug: String!, $status: String, $openOnly: Boolean) {
+        tasks(projectId: $projectId, organizationSlug: $organizationSlug, status: $status,
+              openOnly: $openOnly, limit: 50) {
+            id commentCount project { id }
+        }
+    }''',
+    'GetTask': '''query($taskId: ID!, $organizationSlug: String!) {
+        task(id: $taskId, organizationSlug: $organizationSlug) { id commentCount project { id } }
+    }''',
+    'GetTaskComments': '''query($taskId: ID!, $organizationSlug: String!) {
+        taskComments(taskId: $taskId, organizationSlug: $organizationSlug) { id task { id } }
+    }''',
+    'GetProjectVelocity': '''query($projectId: ID!, $organizationSlug: String!, $from: Date!, $to: Date!) {
+        projectVelocity(projectId: $projectId, organizationSlug: $organizationSlug, from: $from, to: $to) {
+            start created completed
+        }
+    }''',
+}
+
+# Variables beyond the tenant's slug, project and task, per replay.
+VARIANTS = {
+    'GetProjects': [{}, {'status': 'ACTIVE'}],
+    'GetTasks': [{}, {'status': 'TODO'}, {'openOnly': True}],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the GraphQL workload for the largest tenant (or operations recorded in a JSON '
+        'file), propose composite, covering and partial indexes for its queries, check them '
+        'against the planner and optionally write them to a migration.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations',
+            help='JSON file with a list of recorded {"query": ..., "variables": ...} operations to replay '
+                 'instead of the built-in workload',
+        )
+        parser.add_argument('--write', metavar='NAME', help='Write the proposed indexes to a core migration NAME')
+        parser.add_argument(
+            '--min-gain', type=float, default=10.0,
+            help='Percent of the planner cost an index must save to be kept (default: 10)',
+        )
+        parser.add_argument(
+            '--no-verify', action='store_true',
+            help='Skip building the indexes in a rolled-back transaction to compare query costs',
+        )
+
+    def handle(self, *args, **options):
+        operations = self.recorded(options['operations']) if options['operations'] else self.workload()
+        with advisor.record() as statements:
+            for query, variables in operations:
+                result = schema.execute(query, variables=variables, context_value=RequestFactory().post('/graphql/'))
+                if result.errors:
+                    raise CommandError(f'Replay failed: {result.errors[0]}')
+
+        accesses = {}
+        for sql, params in statements:
+            access = advisor.parse(sql, params)
+            if access is not None:
+                accesses.setdefault(access.key, access)
+        self.stdout.write(
+            f'Replayed {len(operations)} operations: {len(statements)} SELECTs, {len(accesses)} distinct'
+        )
+
+        for access in advisor.untenanted(accesses.values()):
+            self.stdout.write(f'! Looked up by primary key without {advisor.TENANT_COLUMN}: {access.key[:150]}')
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        candidates = advisor.propose(accesses.values(), connection)
+        if not candidates:
+            self.stdout.write('Every query is served by an existing index.')
+            return
+        costs = None if options['no_verify'] else advisor.verify(candidates, connection)
+        if costs is None:
+            self.stdout.write('Costs not checked (PostgreSQL only); every candidate is kept.')
+
+        kept = []
+        for candidate in candidates:
+            keep = True
+            if costs is not None:
+                keep = self.worth_keeping(candidate, costs, options['min_gain'] / 100)
+                if keep is None:
+                    continue  # all that is left of it is an index that exists
+            if keep:
+                kept.append(candidate)
+            index = candidate.index()
+            self.stdout.write(f'{"+" if keep else "-"} {candidate.model.__name__}: {self.describe(index)}')
+            for access in candidate.accesses:
+                line = f'    {access.key[:150]}'
+                if costs is not None:
+                    line += f'  (cost {costs[access.key][0]:.1f} -> {costs[access.key][1]:.1f})'
+                self.stdout.write(line)
+            for name in candidate.supersedes:
+                self.stdout.write(f'    makes {name} redundant')
+
+        if options['write'] and kept:
+            self.stdout.write(f'Wrote {self.write_migration(options["write"], kept)}')
+            self.stdout.write('Add the same indexes to the models\' Meta.indexes:')
+            for candidate in kept:
+                self.stdout.write(f'  {candidate.model.__name__}: {self.describe(candidate.index())},')
+
+    @staticmethod
+    def worth_keeping(candidate, costs, min_gain):
+        """
+        Whether the planner's costs justify ``candidate``, after dropping its
+        INCLUDE if no aggregate (the only queries reading it) gains enough.
+        None if what is left duplicates the index it would replace.
+        """
+        def gained(accesses):
+            before = sum(costs[access.key][0] for access in accesses)
+            after = sum(costs[access.key][1] for access in accesses)
+            return (before - after) / before if before else 0
+
+        if candidate.include and gained([a for a in candidate.accesses if a.aggregate]) < min_gain:
+            candidate.include = []
+            if candidate.adopted:
+                return None
+        gain = gained(candidate.accesses)
+        # On a small table the planner may prefer a scan today; an index that
+        # saves a sort is kept for when the table grows. A partial index only
+        # holds the rows it serves, so any gain pays for it.
+        return candidate.sorts or gain >= min_gain or bool(candidate.excluded) and gain > 0
+
+    def workload(self):
+        tenant = (
+            Organization.objects.annotate(n=Count('tasks')).filter(n__gt=0).order_by('-n')
+            .values_list('id', 'slug').first()
+        )
+        if tenant is None:
+            raise CommandError('No tasks found; run seed_tasks first.')
+        organization_id, slug = tenant
+        # A task with comments, if the tenant has any.
+        commented = TaskComment.objects.filter(organization_id=organization_id).order_by('-id').first()
+        task = commented.task if commented else Task.objects.filter(organization_id=organization_id).first()
+        common = {
+            'organizationSlug': slug, 'projectId': task.project_id, 'taskId': task.id,
+            'from': (date.today() - timedelta(days=30)).isoformat(), 'to': date.today().isoformat(),
+        }
+        operations = []
+        for name, query in WORKLOAD.items():
+            declared = {variable for variable in common if f'${variable}:' in query}
+            for variant in VARIANTS.get(name, [{}]):
+                operations.append((query, {**{key: common[key] for key in declared}, **variant}))
+        return operations
+
+    def recorded(self, path):
+        with open(path) as file:
+            return [(operation['query'], operation.get('variables') or {}) for operation in json.load(file)]
+
+    @staticmethod
+    def describe(index):
+        parts = [f'fields={index.fields!r}']
+        if index.include:
+            parts.append(f'include={list(index.include)!r}')
+        if index.condition is not None:
+            parts.append(f'condition={serializer_factory(index.condition).serialize()[0]}')
+        parts.append(f'name={index.name!r}')
+        return f'models.Index({", ".join(parts)})'
+
+    def write_migration(self, name, candidates):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaves = loader.graph.leaf_nodes('core')
+        number = int(leaves[0][1][:4]) + 1 if leaves else 1
+        migration = migrations.Migration(f'{number:04d}_{name}', 'core')
+        migration.dependencies = leaves
+        migration.operations = [
+            AddIndexOnline(model_name=candidate.model._meta.model_name, index=candidate.index())
+            for candidate in sorted(candidates, key=lambda candidate: candidate.model._meta.model_name)
+        ]
+        writer = MigrationWriter(migration)
+        source = (
+            writer.as_string()
+            .replace('import core.db.operations\n', '')
+            .replace(
+                'from django.db import migrations, models\n',
+                'from django.db import migrations, models\n\nfrom core.db.operations import AddIndexOnline\n',
+            )
+            .replace('core.db.operations.AddIndexOnline(', 'AddIndexOnline(')
+            # Indexes are built concurrently, which can't run in a transaction.
+            .replace('class Migration(migrations.Migration):\n', 'class Migration(migrations.Migration):\n    atomic = False\n')
+        )
+        with open(writer.path, 'w') as file:
+            file.write(source)
+        return writer.path
@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure core_task and its indexes, and time the scans that filter or sort on status and '
+        'priority. Run before and after migration 0012, which stores them as choice codes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Needs PostgreSQL.')
+        table = Task._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = 'status'",
+                [table],
+            )
+            coded = cursor.fetchone()[0] == 'smallint'
+            cursor.execute(
+                f'SELECT organization_id, project_id FROM {table} GROUP BY 1, 2 ORDER BY count(*) DESC LIMIT 1'
+            )
+            largest = cursor.fetchone()
+        if largest is None:
+            raise CommandError('No tasks found; run seed_tasks first.')
+
+        self.stdout.write(f'{table}: status and priority stored as {"codes" if coded else "strings"}')
+        self.report_sizes(table)
+        self.report_scans(table, coded, largest, options['repeat'])
+
+    def report_sizes(self, table):
+        # Partitioned tables and indexes are the sum of their partitions;
+        # pg_partition_tree() is empty for the others.
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT coalesce((SELECT sum(pg_table_size(relid)) FROM pg_partition_tree(%s::regclass)),
+                                pg_table_size(%s::regclass))
+            """, [table, table])
+            heap = cursor.fetchone()[0]
+            cursor.execute(f'SELECT avg(pg_column_size(t.*)) FROM {table} t TABLESAMPLE SYSTEM (1)')
+            width = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT i.indexrelid::regclass::text,
+                       coalesce((SELECT sum(pg_relation_size(relid)) FROM pg_partition_tree(i.indexrelid)),
+                                pg_relation_size(i.indexrelid))
+                FROM pg_index i WHERE i.indrelid = %s::regclass ORDER BY 1
+            """, [table])
+            indexes = cursor.fetchall()
+        self.stdout.write(f'  table: {_mb(heap)}, rows {width or 0:.1f} bytes on average')
+        for name, size in indexes:
+            self.stdout.write(f'  {name}: {_mb(size)}')
+        self.stdout.write(f'  all indexes: {_mb(sum(size for _, size in indexes))}')
+
+    def report_scans(self, table, coded, largest, repeat):
+        status, priority = Task._meta.get_field('status'), Task._meta.get_field('priority')
+        done, todo, high = (
+            (status.codes['DONE'], status.codes['TODO'], priority.codes['HIGH']) if coded
+            else ('DONE', 'TODO', 'HIGH')
+        )
+        # The strings sort by urgency through the expression index of
+        # migration 0011, the codes by themselves.
+        urgency = 'priority' if coded else 'CASE {} END'.format(' '.join(
+            f"WHEN priority = '{value}' THEN {code}" for value, code in priority.codes.items() if value
+        ))
+        organization_id, project_id = largest
+        page = f'SELECT * FROM {table} WHERE organization_id = %s AND project_id = %s'
+        scans = {
+            'tasks by status (whole table)': (
+                f'SELECT status, count(*) FROM {table} GROUP BY status', []
+            ),
+            'count of (status, priority)': (
+                f'SELECT count(*) FROM {table} WHERE status = %s AND priority = %s', [todo, high]
+            ),
+            'project page by priority': (
+                f'{page} ORDER BY {urgency} DESC, id DESC LIMIT 50', [organization_id, project_id]
+            ),
+            'project page of open tasks': (
+                f'{page} AND NOT status = %s ORDER BY created_at DESC LIMIT 50',
+                [organization_id, project_id, done],
+            ),
+        }
+        for name, (sql, params) in scans.items():
+            timings = []
+            with connection.cursor() as cursor:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append(time.perf_counter() - start)
+            self.stdout.write(f'  {name}: median {statistics.median(timings) * 1000:.2f}ms')
+
+
+def _mb(size):
+    return f'{(size or 0) / 1024 / 1024:.1f} MB'
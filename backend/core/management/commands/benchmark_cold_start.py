@@ -0,0 +1,82 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, like a gunicorn worker booting config.wsgi.
+# Times are from the moment the parent spawned it, so they include the
+# interpreter's own startup.
+CHILD = '''
+import json, os, sys, time
+spawned = float(os.environ['COLD_START_SPAWNED'])
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+timings = {'setup': time.time() - spawned}
+if settings.GRAPHQL_WARMUP:
+    from core.warmup import warm_up
+    warm_up()
+timings['ready'] = time.time() - spawned
+from django.test import Client
+host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h and not h.startswith('.')), 'localhost')
+client = Client(HTTP_HOST=host)
+for name in ('first request', 'second request'):
+    start = time.perf_counter()
+    response = client.post('/graphql/', {'query': sys.argv[1]}, content_type='application/json')
+    timings[name] = time.perf_counter() - start
+    if response.status_code != 200:
+        sys.exit(f'{name}: HTTP {response.status_code}')
+timings['first response'] = timings['ready'] + timings['first request']
+print('COLD_START', json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Start fresh interpreters that load config.wsgi and serve two GraphQL requests, without '
+        'and with the warm-up (core.warmup), and report the median time of each phase. With '
+        '--check, fail if a warmed-up process takes longer than COLD_START_BUDGET_MS to its '
+        'first response.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--query', default='{ organizations { id name slug } }')
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, **options):
+        results = {}
+        for warmup in (False, True):
+            runs = [self.run_child(options['query'], warmup) for _ in range(options['runs'])]
+            results[warmup] = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+            self.stdout.write(f'warm-up {"on" if warmup else "off"} (median of {len(runs)})')
+            for name, seconds in results[warmup].items():
+                self.stdout.write(f'  {name}: {seconds * 1000:.1f}ms')
+
+        budget = settings.COLD_START_BUDGET_MS
+        first_response = results[True]['first response'] * 1000
+        if options['check'] and first_response > budget:
+            raise CommandError(f'First response after {first_response:.0f}ms, over the {budget}ms budget.')
+
+    def run_child(self, query, warmup):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),
+            'GRAPHQL_WARMUP': '1' if warmup else '0',
+            # Every run is the same client; its bucket would run dry.
+            'RATELIMIT_ENABLE': '0',
+            'COLD_START_SPAWNED': repr(time.time()),
+        }
+        completed = subprocess.run(
+            [sys.executable, '-c', CHILD, query],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        for line in completed.stdout.splitlines():
+            if line.startswith('COLD_START '):
+                return json.loads(line.split(' ', 1)[1])
+        raise CommandError(f'The process failed:\n{completed.stderr or completed.stdout}')
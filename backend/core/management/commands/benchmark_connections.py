@@ -0,0 +1,104 @@
+import io
+import json
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+QUERY = json.dumps({'query': '{ organizations { id slug } }'}).encode()
+
+
+class Command(BaseCommand):
+    help = 'Load test /graphql/ and report database connection churn with and without persistent connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per client')
+
+    def handle(self, *args, **options):
+        self.application = get_wsgi_application()
+        db_settings = connections.settings['default']
+        configured = {
+            'CONN_MAX_AGE': db_settings['CONN_MAX_AGE'],
+            'ENGINE': db_settings['ENGINE'],
+        }
+
+        with override_settings(RATELIMIT_ENABLE=False):
+            db_settings['CONN_MAX_AGE'] = 0
+            self.run('Before (CONN_MAX_AGE=0)', options)
+            db_settings['CONN_MAX_AGE'] = configured['CONN_MAX_AGE']
+            self.run(
+                f"After (ENGINE={configured['ENGINE']}, CONN_MAX_AGE={configured['CONN_MAX_AGE']})",
+                options,
+            )
+
+    def environ(self):
+        host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h), 'localhost')
+        return {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/graphql/',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(QUERY)),
+            'HTTP_ACCEPT': 'application/json',
+            'HTTP_HOST': host.lstrip('.'),
+            'SERVER_NAME': host.lstrip('.'),
+            'SERVER_PORT': '80',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.input': io.BytesIO(QUERY),
+            'wsgi.url_scheme': 'http',
+        }
+
+    def run(self, label, options):
+        connections.close_all()
+        created = []
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+
+        def on_connect(sender, connection, **kwargs):
+            with lock:
+                created.append(connection.alias)
+
+        def client():
+            local = []
+            for _ in range(options['requests']):
+                status = []
+                start = time.perf_counter()
+                response = self.application(self.environ(), lambda s, h, *a: status.append(s))
+                b''.join(response)
+                response.close()
+                local.append(time.perf_counter() - start)
+                if not status or not status[0].startswith('200'):
+                    failures.append(status[0] if status else 'no response')
+            connections.close_all()
+            with lock:
+                latencies.extend(local)
+
+        connection_created.connect(on_connect)
+        try:
+            threads = [threading.Thread(target=client) for _ in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection_created.disconnect(on_connect)
+
+        total = len(latencies)
+        line = (
+            f'{label}: {total} requests, {len(created)} connections opened '
+            f'({len(created) / max(total, 1):.2f} per request), '
+            f'mean latency {statistics.mean(latencies) * 1000:.2f}ms'
+        )
+        pool = getattr(connections['default'], 'pool', None)
+        if callable(pool):
+            line += f", pool {pool().stats}"
+        if failures:
+            line += f', {len(failures)} failed ({failures[0]})'
+        self.stdout.write(line)
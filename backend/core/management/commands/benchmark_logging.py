@@ -0,0 +1,89 @@
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.log import JSONFormatter, QueuedRotatingFileHandler, SamplingFilter
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request logging overhead of the synchronous and queued file handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Simulated requests per thread')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads')
+        parser.add_argument('--sample-rate', type=float, default=1.0, help='Sampling rate for INFO lines')
+        parser.add_argument('--write-delay-ms', type=float, default=0.0,
+                            help='Simulated disk latency added to every write')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sync_handler = logging.FileHandler(os.path.join(tmpdir, 'sync.log'))
+            sync_handler.setFormatter(logging.Formatter(
+                '{levelname} {asctime} {module} {process:d} {thread:d} {message}', style='{'
+            ))
+            self.slow_down(sync_handler, options['write_delay_ms'])
+            self.report('FileHandler (synchronous)', sync_handler, options)
+
+            queued_handler = QueuedRotatingFileHandler(os.path.join(tmpdir, 'queued.log'))
+            queued_handler.setFormatter(JSONFormatter())
+            queued_handler.addFilter(SamplingFilter(rate=options['sample_rate']))
+            self.slow_down(queued_handler.target, options['write_delay_ms'])
+            self.report('QueuedRotatingFileHandler', queued_handler, options)
+
+    def slow_down(self, handler, delay_ms):
+        if not delay_ms:
+            return
+        emit = handler.emit
+
+        def delayed_emit(record):
+            time.sleep(delay_ms / 1000)
+            emit(record)
+
+        handler.emit = delayed_emit
+
+    def report(self, label, handler, options):
+        logger = logging.getLogger(f'benchmark.{id(handler)}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+
+        timings = []
+        lock = threading.Lock()
+
+        def simulate():
+            local = []
+            for i in range(options['requests']):
+                start = time.perf_counter()
+                # The three INFO lines a typical dashboard request emits.
+                logger.info("GraphQL request from %s", '127.0.0.1')
+                logger.info("Fetching projects for organization: %s", 'techcorp-solutions')
+                logger.info("Fetching tasks for project: %s", i)
+                local.append(time.perf_counter() - start)
+            with lock:
+                timings.extend(local)
+
+        threads = [threading.Thread(target=simulate) for _ in range(options['threads'])]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_start
+
+        handler.flush()
+        logger.removeHandler(handler)
+        handler.close()
+
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f'{label}: mean {statistics.mean(timings) * 1e6:.1f}us, '
+            f'p99 {p99 * 1e6:.1f}us per request, '
+            f'{len(timings) / wall:.0f} requests/s'
+            + (f', {handler.dropped} records dropped' if getattr(handler, 'dropped', 0) else '')
+        )
@@ -0,0 +1,97 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.db.inserts import insert_returning
+from core.models import Organization, Project, Task
+from core.tenancy import organization_id
+
+
+class Command(BaseCommand):
+    help = (
+        'Time task creation under concurrent writers: looking up the organization and project '
+        'before the INSERT (as CreateTask used to), against the single INSERT ... SELECT it '
+        'issues now. Tasks go to a scratch organization that is deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,8', help='Comma-separated numbers of concurrent writers')
+        parser.add_argument('--requests', type=int, default=200, help='Tasks created per writer')
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.create(
+            name=f'Mutation Benchmark {uuid.uuid4().hex[:8]}', contact_email='bench@example.com'
+        )
+        project = Project.objects.create(organization=organization, name='Mutation Benchmark')
+        strategies = {
+            'lookups + INSERT': self.create_after_lookups,
+            'INSERT ... SELECT': self.create_in_one_statement,
+        }
+        try:
+            for name, create in strategies.items():
+                # The first task of a cell creates its rollup rows; count a later one.
+                create(organization.slug, project.id, 'warm-up')
+                with CaptureQueriesContext(connection) as queries:
+                    create(organization.slug, project.id, 'probe')
+                self.stdout.write(f'{name}: {len(queries)} statements per task, including rollups and history')
+
+            for threads in [int(n) for n in options['threads'].split(',')]:
+                self.stdout.write(f'{threads} concurrent writers, {options["requests"]} tasks each')
+                for name, create in strategies.items():
+                    self.run(name, create, threads, options['requests'], organization.slug, project.id)
+        finally:
+            organization.delete()
+
+    @staticmethod
+    def create_after_lookups(slug, project_id, title):
+        with transaction.atomic():
+            organization = Organization.objects.get(slug=slug)
+            project = Project.objects.get(id=project_id, organization=organization)
+            return Task.objects.create(project=project, organization=organization, title=title)
+
+    @staticmethod
+    def create_in_one_statement(slug, project_id, title):
+        return insert_returning(
+            Task,
+            {'title': title},
+            Project.objects.filter(id=project_id, organization_id=organization_id(slug)),
+            {'project_id': 'id', 'organization_id': 'organization_id'},
+        )
+
+    def run(self, name, create, threads, requests, slug, project_id):
+        latencies = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def writer(index):
+            timings = []
+            try:
+                barrier.wait()
+                for i in range(requests):
+                    start = time.perf_counter()
+                    create(slug, project_id, f'Writer {index} task {i}')
+                    timings.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(timings)
+
+        workers = [threading.Thread(target=writer, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f'  {name}: {len(latencies) / elapsed:.0f} tasks/s, '
+            f'median {statistics.median(latencies) * 1000:.2f}ms, p95 {p95 * 1000:.2f}ms'
+        )
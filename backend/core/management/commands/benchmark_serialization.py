@@ -0,0 +1,93 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import compression
+from core.models import Organization, Project, Task
+from core.schema import schema
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+QUERY = '''
+    query($projectId: ID!, $organizationSlug: String!, $limit: Int) {
+        tasks(projectId: $projectId, organizationSlug: $organizationSlug, limit: $limit) {
+            id title description status priority assigneeEmail dueDate createdAt updatedAt
+            project { id name status organization { id name slug contactEmail } }
+        }
+    }
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure JSON serialization time and bytes on the wire for a large tasks response. '
+        'The tasks are created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            data = self.build_response(options['tasks'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Response with {options['tasks']} tasks")
+        encoders = {'json (stdlib)': lambda: json.dumps(data, separators=(',', ':')).encode()}
+        if orjson is not None:
+            encoders['orjson'] = lambda: orjson.dumps(data)
+        for name, encode in encoders.items():
+            self.stdout.write(f'  {name}: {self.median_ms(encode, options["repeat"]):.1f}ms to serialize')
+
+        body = encoders['json (stdlib)']()
+        self.stdout.write(f'  identity: {len(body):,} bytes')
+        for encoding in compression.available_encodings():
+            compressed = compression.compress(body, encoding)
+            elapsed = self.median_ms(lambda: compression.compress(body, encoding), options['repeat'])
+            self.stdout.write(
+                f'  {encoding}: {len(compressed):,} bytes '
+                f'({len(compressed) / len(body):.1%}), {elapsed:.1f}ms to compress'
+            )
+
+    def build_response(self, count):
+        organization = Organization.objects.create(
+            name='Serialization Benchmark Org', contact_email='bench@example.com'
+        )
+        project = Project.objects.create(organization=organization, name='Serialization Benchmark')
+        Task.objects.bulk_create([
+            Task(
+                project=project,
+                organization=organization,
+                title=f'Task {i}',
+                description='Investigate the report, reproduce it locally and write up the fix. ' * 3,
+                status=['TODO', 'IN_PROGRESS', 'DONE', 'BLOCKED'][i % 4],
+                priority=['LOW', 'MEDIUM', 'HIGH', 'URGENT'][i % 4],
+                assignee_email=f'user{i % 25}@example.com',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+        started = time.perf_counter()
+        result = schema.execute(QUERY, variables={
+            'projectId': project.id, 'organizationSlug': organization.slug, 'limit': count,
+        })
+        self.stdout.write(f'Executed query in {(time.perf_counter() - started) * 1000:.0f}ms')
+        if result.errors:
+            raise result.errors[0]
+        return {'data': result.data}
+
+    @staticmethod
+    def median_ms(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1000
@@ -0,0 +1,76 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from core.models import Organization, Task, TaskComment
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the org-scoped queries behind task, taskComments, tasks and the task mutations '
+        'for the largest, median and smallest tenant. Run before and after partition_tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        tenants = list(
+            Organization.objects.annotate(n=Count('tasks')).filter(n__gt=0).order_by('-n')
+            .values_list('id', 'slug', 'n')
+        )
+        if not tenants:
+            raise CommandError('No tasks found; run seed_tasks first.')
+        picks = {'largest': tenants[0], 'median': tenants[len(tenants) // 2], 'smallest': tenants[-1]}
+
+        for label, (org_id, slug, task_count) in picks.items():
+            task = Task.objects.filter(organization_id=org_id).order_by('-id').first()
+            queries = {
+                'task (by id)': lambda: Task.objects.get(id=task.id, organization_id=org_id),
+                'taskComments': lambda: list(
+                    TaskComment.objects.filter(task_id=task.id, organization_id=org_id)
+                ),
+                'tasks (project page)': lambda: list(
+                    Task.objects.filter(project_id=task.project_id, organization_id=org_id)
+                    .order_by('-created_at')[:50]
+                ),
+                'completed count': lambda: Task.objects.filter(
+                    organization_id=org_id, status='DONE'
+                ).count(),
+            }
+            self.stdout.write(f'{label} tenant {slug} ({task_count} tasks)')
+            for name, query in queries.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    query()
+                    timings.append(time.perf_counter() - start)
+                line = f'  {name}: median {statistics.median(timings) * 1000:.2f}ms'
+                partitions = self.partitions_scanned(org_id)
+                if partitions is not None and name == 'completed count':
+                    line += f', {partitions} relation(s) scanned'
+                self.stdout.write(line)
+
+    def partitions_scanned(self, org_id):
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = Task.objects.filter(organization_id=org_id, status='DONE').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        relations = set()
+
+        def walk(node):
+            if 'Relation Name' in node:
+                relations.add(node['Relation Name'])
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return len(relations)
@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from graphene_django.settings import graphene_settings
+from graphql import print_schema
+
+from core import introspection
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the GraphQL schema as SDL (schema.graphql) and the result of the standard '
+        'introspection query (introspection.json), so that clients and code generators can load '
+        'them without querying a server. With --check, write nothing and fail if the files are '
+        'missing or out of date.'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--out-dir', type=Path,
+            default=Path(settings.BASE_DIR).parent / 'frontend' / 'src' / 'graphql',
+        )
+        parser.add_argument('--check', action='store_true')
+
+    def handle(self, *args, **options):
+        schema = graphene_settings.SCHEMA.graphql_schema
+        version = introspection.schema_version(schema)
+        result = introspection.prime(schema)
+        files = {
+            'schema.graphql': print_schema(schema) + '\n',
+            'introspection.json': json.dumps(
+                {'data': result.data, 'extensions': {'schemaVersion': version}}, indent=2, sort_keys=True
+            ) + '\n',
+        }
+
+        out_dir = options['out_dir']
+        if options['check']:
+            stale = [
+                name for name, content in files.items()
+                if not (out_dir / name).exists() or (out_dir / name).read_text() != content
+            ]
+            if stale:
+                raise CommandError(
+                    f'{", ".join(stale)} in {out_dir} not up to date with schema {version}; '
+                    'run manage.py export_schema.'
+                )
+            self.stdout.write(f'{out_dir} is up to date with schema {version}')
+            return
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name, content in files.items():
+            (out_dir / name).write_text(content)
+            self.stdout.write(f'Wrote {out_dir / name}')
+        self.stdout.write(f'Schema version {version}')
@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.partitioning import PARTITION_KEY, PartitionPlan, partitioned_tables
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert core_task and core_taskcomment to tables partitioned by organization_id. '
+        'Prints the SQL unless --execute is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('step', choices=['prepare', 'copy', 'swap', 'all'])
+        parser.add_argument('--strategy', choices=['hash', 'list'], default='hash')
+        parser.add_argument('--partitions', type=int, default=16, help='Hash partition count')
+        parser.add_argument('--tenant', type=int, action='append', default=[], dest='tenants',
+                            help='Organization id that gets its own list partition (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between copy batches')
+        parser.add_argument('--execute', action='store_true', help='Run the statements instead of printing them')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Declarative partitioning requires PostgreSQL.')
+        try:
+            plan = PartitionPlan(options['strategy'], options['partitions'], options['tenants'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.execute_sql = options['execute']
+
+        steps = ['prepare', 'copy', 'swap'] if options['step'] == 'all' else [options['step']]
+        with connection.cursor() as cursor:
+            for step in steps:
+                getattr(self, f'step_{step}')(cursor, plan, options)
+
+    def run(self, cursor, statements, params=None):
+        for sql in statements:
+            if self.execute_sql:
+                cursor.execute(sql, params)
+            else:
+                self.stdout.write(sql.strip() + ';')
+
+    def step_prepare(self, cursor, plan, options):
+        for table in plan.tables:
+            cursor.execute(f'SELECT count(*) FROM {table} WHERE {PARTITION_KEY} IS NULL')
+            missing = cursor.fetchone()[0]
+            if missing:
+                raise CommandError(
+                    f'{missing} rows in {table} have no {PARTITION_KEY}; backfill them first.'
+                )
+        with transaction.atomic():
+            self.run(cursor, plan.prepare(cursor))
+        self.stdout.write(self.style.SUCCESS('Shadow tables and sync triggers created.'))
+
+    def step_copy(self, cursor, plan, options):
+        for table in plan.tables:
+            copied = 0
+            for sql, params in plan.copy_batches(cursor, table, options['batch_size']):
+                if not self.execute_sql:
+                    self.stdout.write(f'{sql};  -- batches of {options["batch_size"]} ids')
+                    break
+                cursor.execute(sql, params)
+                copied += cursor.rowcount
+                self.stdout.write(f'{table}: ids < {params[1]} copied ({copied} rows)')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            self.run(cursor, plan.link_statements(cursor, table))
+        self.stdout.write(self.style.SUCCESS('Existing rows copied.'))
+
+    def step_swap(self, cursor, plan, options):
+        if self.execute_sql:
+            for table in plan.tables:
+                differences = plan.differences(cursor, table)
+                if differences:
+                    raise CommandError(
+                        f'{differences} ids differ between {table} and its shadow; not swapping. '
+                        'Run prepare and copy again.'
+                    )
+        statements, validations, dropped = plan.swap(cursor)
+        with transaction.atomic():
+            self.run(cursor, statements)
+        self.run(cursor, validations)
+        for fk in dropped:
+            self.stdout.write(self.style.WARNING(
+                f'Dropped database constraint {fk}: the referencing table has no {PARTITION_KEY}.'
+            ))
+        old_tables = ', '.join(f'{table}_unpartitioned' for table in partitioned_tables())
+        self.stdout.write(self.style.SUCCESS(
+            f'Partitioned tables swapped in. Drop {old_tables} once verified.'
+        ))
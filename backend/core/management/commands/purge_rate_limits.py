@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ratelimit import buckets
+
+
+class Command(BaseCommand):
+    help = 'Delete rate-limit buckets that have been idle long enough to refill completely'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-for', type=float, default=None,
+            help='Seconds since last use; defaults to the slowest bucket refill time',
+        )
+
+    def handle(self, *args, **options):
+        idle_for = options['idle_for']
+        if idle_for is None:
+            idle_for = max(
+                settings.RATELIMIT_CLIENT_CAPACITY / settings.RATELIMIT_CLIENT_RATE,
+                settings.RATELIMIT_ORG_CAPACITY / settings.RATELIMIT_ORG_RATE,
+                *(capacity / rate for capacity, rate in settings.RATELIMIT_ORG_QUOTAS.values()),
+            )
+        deleted = buckets.purge(idle_for)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idle buckets'))
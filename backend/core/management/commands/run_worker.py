@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (core.jobs). Several workers, on this machine or others '
+        'sharing the database, can run side by side. SIGINT or SIGTERM stops claiming jobs '
+        'and exits once the running ones finish.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Jobs run at once, one thread each')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before polling again when no job is due')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        worker = jobs.Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(
+            f"Worker {worker.name} running {options['concurrency']} threads "
+            f"for: {', '.join(sorted(jobs.HANDLERS))}"
+        )
+        worker.run()
+        self.stdout.write(self.style.SUCCESS('Worker stopped'))
@@ -0,0 +1,122 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import rollups
+from core.models import Organization, Project, Task, TaskComment
+
+STATUSES = [choice for choice, _ in Task.STATUS_CHOICES]
+PRIORITIES = [choice for choice, _ in Task.PRIORITY_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a benchmark dataset whose tasks are Zipf-distributed across organizations, '
+        'so a few tenants own most rows'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orgs', type=int, default=100)
+        parser.add_argument('--projects-per-org', type=int, default=5)
+        parser.add_argument('--tasks', type=int, default=1_000_000, help='Total tasks across all orgs')
+        parser.add_argument('--comments-per-task', type=float, default=0.5)
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent; 0 spreads tasks evenly')
+        parser.add_argument('--batch-size', type=int, default=100_000)
+        parser.add_argument('--prefix', default='Bench', help='Name prefix for generated organizations')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        weights = [1 / (rank ** options['skew']) for rank in range(1, options['orgs'] + 1)]
+        total_weight = sum(weights)
+
+        for rank, weight in enumerate(weights, start=1):
+            tasks = round(options['tasks'] * weight / total_weight)
+            with transaction.atomic():
+                org = Organization.objects.create(
+                    name=f"{options['prefix']} Org {rank}",
+                    contact_email=f'bench{rank}@example.com',
+                )
+                projects = Project.objects.bulk_create([
+                    Project(organization=org, name=f'Project {i}')
+                    for i in range(options['projects_per_org'])
+                ])
+            self.create_tasks(org, [p.id for p in projects], tasks, options)
+            # bulk_create skips the signals that maintain history and rollups.
+            rollups.backfill_history(org.pk)
+            rollups.refresh_organization(org.pk)
+            self.stdout.write(f'{org.slug}: {tasks} tasks')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['tasks']} tasks in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def db_values(self, field_name, values):
+        field = Task._meta.get_field(field_name)
+        return [field.get_db_prep_value(value, connection) for value in values]
+
+    def create_tasks(self, org, project_ids, count, options):
+        comments = int(count * options['comments_per_task'])
+        if connection.vendor == 'postgresql':
+            self.create_tasks_sql(org, project_ids, count, comments, options['batch_size'])
+            return
+
+        for start in range(0, count, options['batch_size']):
+            size = min(options['batch_size'], count - start)
+            tasks = Task.objects.bulk_create([
+                Task(
+                    project_id=random.choice(project_ids),
+                    organization=org,
+                    title=f'Task {start + i}',
+                    status=random.choice(STATUSES),
+                    priority=random.choice(PRIORITIES),
+                )
+                for i in range(size)
+            ])
+            TaskComment.objects.bulk_create([
+                TaskComment(task=task, organization=org, content='Benchmark comment',
+                            author_email='bench@example.com')
+                for task in random.sample(tasks, min(len(tasks), int(size * options['comments_per_task'])))
+            ])
+
+    def create_tasks_sql(self, org, project_ids, count, comments, batch_size):
+        task_table = Task._meta.db_table
+        comment_table = TaskComment._meta.db_table
+        with connection.cursor() as cursor:
+            for start in range(0, count, batch_size):
+                cursor.execute(
+                    f"""
+                    INSERT INTO {task_table} (project_id, organization_id, title, description,
+                        status, priority, assignee_email, due_date, created_at, updated_at, version)
+                    SELECT (%(projects)s::bigint[])[1 + g %% %(project_count)s], %(org)s,
+                           'Task ' || g, '',
+                           (%(statuses)s)[1 + (g * 7) %% %(status_count)s],
+                           (%(priorities)s)[1 + (g * 13) %% %(priority_count)s],
+                           'user' || (g %% 50) || '@example.com', NULL,
+                           now() - (g %% 20000) * interval '1 hour', now(), 1
+                    FROM generate_series(%(start)s, %(stop)s) AS g
+                    """,
+                    {
+                        'projects': project_ids,
+                        'project_count': len(project_ids),
+                        'org': org.id,
+                        'statuses': self.db_values('status', STATUSES),
+                        'status_count': len(STATUSES),
+                        'priorities': self.db_values('priority', PRIORITIES),
+                        'priority_count': len(PRIORITIES),
+                        'start': start,
+                        'stop': min(start + batch_size, count) - 1,
+                    },
+                )
+            if comments:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {comment_table} (task_id, organization_id, content, author_email,
+                        created_at, updated_at)
+                    SELECT id, organization_id, 'Benchmark comment', 'bench@example.com', now(), now()
+                    FROM {task_table} WHERE organization_id = %s
+                    ORDER BY id LIMIT %s
+                    """,
+                    [org.id, comments],
+                )
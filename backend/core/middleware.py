@@ -0,0 +1,43 @@
+from django.conf import settings
+
+from .db import routers
+
+CONSISTENCY_COOKIE = 'rw_token'
+CONSISTENCY_HEADER = 'X-Consistency-Token'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin a client's reads to the primary after it writes.
+
+    Unsafe requests are assumed to write unless the view says otherwise via
+    ``request.wrote_to_primary`` (the GraphQL view clears it for queries).
+    Writers receive a consistency token as a cookie and a response header;
+    while it is fresh, and the replicas have not replayed past its LSN,
+    that client's reads stay on the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.replicas():
+            return self.get_response(request)
+
+        token = routers.ConsistencyToken.parse(
+            request.headers.get(CONSISTENCY_HEADER) or request.COOKIES.get(CONSISTENCY_COOKIE)
+        )
+        request.wrote_to_primary = request.method not in SAFE_METHODS
+
+        with routers.primary_reads(token is not None and token.requires_primary()):
+            response = self.get_response(request)
+
+        if request.wrote_to_primary:
+            token = routers.ConsistencyToken.issue()
+            window = getattr(settings, 'READ_YOUR_WRITES_WINDOW', 5)
+            response[CONSISTENCY_HEADER] = str(token)
+            response.set_cookie(
+                CONSISTENCY_COOKIE, str(token), max_age=window, httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_organization(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    Task = apps.get_model('core', 'Task')
+    TaskComment = apps.get_model('core', 'TaskComment')
+    Task.objects.filter(organization__isnull=True).update(
+        organization=models.Subquery(
+            Project.objects.filter(pk=models.OuterRef('project_id')).values('organization_id')[:1]
+        )
+    )
+    TaskComment.objects.filter(organization__isnull=True).update(
+        organization=models.Subquery(
+            Task.objects.filter(pk=models.OuterRef('task_id')).values('organization_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_organization_core_organi_slug_517c11_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='organization',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='core.organization'),
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='organization',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_comments', to='core.organization'),
+        ),
+        migrations.RunPython(backfill_organization, migrations.RunPython.noop),
+    ]
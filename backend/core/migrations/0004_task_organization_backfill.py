@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+from core.db.operations import AddIndexOnline
+
+BATCH_SIZE = 5000
+
+
+def backfill(model, parent, parent_field):
+    # Walk the primary key in ranges; with the migration non-atomic each
+    # UPDATE commits on its own, so row locks are held for one batch only.
+    bounds = model.objects.filter(organization__isnull=True).aggregate(
+        low=models.Min('id'), high=models.Max('id')
+    )
+    if bounds['low'] is None:
+        return
+    organization = models.Subquery(
+        parent.objects.filter(pk=models.OuterRef(parent_field)).values('organization_id')[:1]
+    )
+    for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+        model.objects.filter(
+            id__gte=start, id__lt=start + BATCH_SIZE, organization__isnull=True
+        ).update(organization=organization)
+
+
+def backfill_organization(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    Task = apps.get_model('core', 'Task')
+    TaskComment = apps.get_model('core', 'TaskComment')
+    # Tasks first: comments copy their task's organization.
+    backfill(Task, Project, 'project_id')
+    backfill(TaskComment, Task, 'task_id')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_task_organization'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_organization, migrations.RunPython.noop),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['organization', 'status'], name='core_task_organiz_f17728_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['organization', 'created_at'], name='core_task_organiz_ec7dc1_idx'),
+        ),
+        AddIndexOnline(
+            model_name='taskcomment',
+            index=models.Index(fields=['organization', 'task'], name='core_taskco_organiz_9714eb_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_task_organization_backfill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField(help_text='Unix time of the last refill')),
+                ('allowed', models.BooleanField(default=True, help_text='Outcome of the last charge')),
+            ],
+            options={
+                'verbose_name': 'Rate Limit Bucket',
+                'verbose_name_plural': 'Rate Limit Buckets',
+                'indexes': [models.Index(fields=['updated_at'], name='core_rateli_updated_2ef895_idx')],
+            },
+        ),
+    ]
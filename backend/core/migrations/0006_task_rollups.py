@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationRollupState',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup_state', serialize=False, to='core.organization')),
+                ('overdue_before', models.DateTimeField(help_text='Open tasks due before this time count as overdue')),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Organization Rollup State',
+                'verbose_name_plural': 'Organization Rollup States',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganizationTaskRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('TODO', 'To Do'), ('IN_PROGRESS', 'In Progress'), ('DONE', 'Done'), ('BLOCKED', 'Blocked')], max_length=20)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('URGENT', 'Urgent')], max_length=20)),
+                ('task_count', models.IntegerField(default=0)),
+                ('overdue_count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_rollups', to='core.organization')),
+            ],
+            options={
+                'verbose_name': 'Organization Task Rollup',
+                'verbose_name_plural': 'Organization Task Rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectTaskRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('TODO', 'To Do'), ('IN_PROGRESS', 'In Progress'), ('DONE', 'Done'), ('BLOCKED', 'Blocked')], max_length=20)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('URGENT', 'Urgent')], max_length=20)),
+                ('task_count', models.IntegerField(default=0)),
+                ('overdue_count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='project_task_rollups', to='core.organization')),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_rollups', to='core.project')),
+            ],
+            options={
+                'verbose_name': 'Project Task Rollup',
+                'verbose_name_plural': 'Project Task Rollups',
+                'indexes': [models.Index(fields=['organization', 'project'], name='core_projec_organiz_00ba03_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='projecttaskrollup',
+            constraint=models.UniqueConstraint(fields=('project', 'status', 'priority'), name='core_projecttaskrollup_cell'),
+        ),
+        migrations.AddConstraint(
+            model_name='organizationtaskrollup',
+            constraint=models.UniqueConstraint(fields=('organization', 'status', 'priority'), name='core_organizationtaskrollup_cell'),
+        ),
+    ]
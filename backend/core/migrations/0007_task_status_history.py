@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_history(apps, schema_editor):
+    # Existing tasks get a creation record and, if finished, a completion
+    # at their last update: the time they reached DONE was never stored.
+    Task = apps.get_model('core', 'Task')
+    TaskStatusChange = apps.get_model('core', 'TaskStatusChange')
+    quote = schema_editor.quote_name
+    history, tasks = quote(TaskStatusChange._meta.db_table), quote(Task._meta.db_table)
+    columns = f'INSERT INTO {history} (task_id, organization_id, project_id, from_status, to_status, changed_at)'
+    schema_editor.execute(
+        f"{columns} SELECT id, organization_id, project_id, %s, %s, updated_at FROM {tasks} WHERE status = %s",
+        ['TODO', 'DONE', 'DONE'],
+    )
+    schema_editor.execute(
+        f"{columns} SELECT id, organization_id, project_id, '', "
+        f"CASE WHEN status = %s THEN %s ELSE status END, created_at FROM {tasks}",
+        ['DONE', 'TODO'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_task_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationDailyThroughput',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('reopened', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_throughput', to='core.organization')),
+            ],
+            options={
+                'verbose_name': 'Organization Daily Throughput',
+                'verbose_name_plural': 'Organization Daily Throughput',
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('TODO', 'To Do'), ('IN_PROGRESS', 'In Progress'), ('DONE', 'Done'), ('BLOCKED', 'Blocked')], max_length=20)),
+                ('to_status', models.CharField(choices=[('TODO', 'To Do'), ('IN_PROGRESS', 'In Progress'), ('DONE', 'Done'), ('BLOCKED', 'Blocked')], max_length=20)),
+                ('changed_at', models.DateTimeField()),
+                ('organization', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_status_changes', to='core.organization')),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_status_changes', to='core.project')),
+                ('task', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_changes', to='core.task')),
+            ],
+            options={
+                'verbose_name': 'Task Status Change',
+                'verbose_name_plural': 'Task Status Changes',
+                'ordering': ['changed_at'],
+                'indexes': [models.Index(fields=['task', 'changed_at'], name='core_taskst_task_id_9fb6d9_idx'), models.Index(fields=['organization', 'changed_at'], name='core_taskst_organiz_86976f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectDailyThroughput',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('reopened', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='project_daily_throughput', to='core.organization')),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_throughput', to='core.project')),
+            ],
+            options={
+                'verbose_name': 'Project Daily Throughput',
+                'verbose_name_plural': 'Project Daily Throughput',
+                'indexes': [models.Index(fields=['organization', 'day'], name='core_projec_organiz_685e57_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='projectdailythroughput',
+            constraint=models.UniqueConstraint(fields=('project', 'day'), name='core_projectdailythroughput_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='organizationdailythroughput',
+            constraint=models.UniqueConstraint(fields=('organization', 'day'), name='core_organizationdailythroughput_day'),
+        ),
+        migrations.RunPython(backfill_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_jobs'),
+    ]
+
+    # A constant default is kept in the catalog on PostgreSQL 11+, so
+    # neither table is rewritten.
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='version',
+            field=models.IntegerField(default=1, editable=False, help_text='Incremented by every update; see core.db.updates'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='version',
+            field=models.IntegerField(default=1, editable=False, help_text='Incremented by every update; see core.db.updates'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:53
+
+from django.db import migrations, models
+
+from core.db.operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_row_versions'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='project',
+            index=models.Index(fields=['organization', 'status', '-created_at'], name='core_projec_organiz_03be2d_idx'),
+        ),
+        AddIndexOnline(
+            model_name='project',
+            index=models.Index(fields=['organization', '-updated_at'], name='core_projec_organiz_512652_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', '-created_at'], name='core_task_project_2ad884_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'DONE'), _negated=True), fields=['project', '-created_at'], name='core_task_project_a44a05_idx'),
+        ),
+        AddIndexOnline(
+            model_name='taskcomment',
+            index=models.Index(fields=['task', '-created_at'], name='core_taskco_task_id_6454a0_idx'),
+        ),
+    ]
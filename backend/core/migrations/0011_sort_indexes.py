@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:03
+
+from django.db import migrations, models
+
+from core.db.operations import AddIndexOnline
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_workload_indexes'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='project',
+            index=models.Index(fields=['organization', 'due_date', 'id'], name='core_project_org_due_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['project', 'updated_at', 'id'], name='core_task_project_updated_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['project', 'due_date', 'id'], name='core_task_project_due_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(models.F('project'), models.Case(models.When(priority='LOW', then=models.Value(1)), models.When(priority='MEDIUM', then=models.Value(2)), models.When(priority='HIGH', then=models.Value(3)), models.When(priority='URGENT', then=models.Value(4)), output_field=models.SmallIntegerField()), models.F('id'), name='core_task_project_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:13
+
+import core.fields
+from django.db import migrations, models
+
+from core.db.operations import AddIndexOnline, AlterChoicesToCodes
+
+STATUS_CHOICES = [('TODO', 'To Do'), ('IN_PROGRESS', 'In Progress'), ('DONE', 'Done'), ('BLOCKED', 'Blocked')]
+PRIORITY_CHOICES = [('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('URGENT', 'Urgent')]
+PROJECT_STATUS_CHOICES = [('ACTIVE', 'Active'), ('COMPLETED', 'Completed'), ('ON_HOLD', 'On Hold'), ('CANCELLED', 'Cancelled')]
+
+
+class Migration(migrations.Migration):
+    # Each AlterChoicesToCodes rewrites its table under an ACCESS EXCLUSIVE
+    # lock; running them outside one transaction releases each table as
+    # soon as it is done.
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_sort_indexes'),
+    ]
+
+    operations = [
+        # Both compare task columns with strings; they are rebuilt below
+        # against the codes. The priority rank expression is no longer
+        # needed: the codes sort by urgency.
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_project_a44a05_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_project_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_project_62461d_idx',
+        ),
+        AlterChoicesToCodes(
+            model_name='project',
+            fields=[
+                ('status', core.fields.CodedChoiceField(choices=PROJECT_STATUS_CHOICES, default='ACTIVE')),
+            ],
+        ),
+        AlterChoicesToCodes(
+            model_name='task',
+            fields=[
+                ('status', core.fields.CodedChoiceField(choices=STATUS_CHOICES, default='TODO')),
+                ('priority', core.fields.CodedChoiceField(choices=PRIORITY_CHOICES, default='MEDIUM')),
+            ],
+        ),
+        AlterChoicesToCodes(
+            model_name='projecttaskrollup',
+            fields=[
+                ('status', core.fields.CodedChoiceField(choices=STATUS_CHOICES)),
+                ('priority', core.fields.CodedChoiceField(choices=PRIORITY_CHOICES)),
+            ],
+        ),
+        AlterChoicesToCodes(
+            model_name='organizationtaskrollup',
+            fields=[
+                ('status', core.fields.CodedChoiceField(choices=STATUS_CHOICES)),
+                ('priority', core.fields.CodedChoiceField(choices=PRIORITY_CHOICES)),
+            ],
+        ),
+        AlterChoicesToCodes(
+            model_name='taskstatuschange',
+            fields=[
+                ('from_status', core.fields.CodedChoiceField(blank=True, choices=STATUS_CHOICES)),
+                ('to_status', core.fields.CodedChoiceField(choices=STATUS_CHOICES)),
+            ],
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'DONE'), _negated=True), fields=['project', '-created_at'], name='core_task_project_a44a05_idx'),
+        ),
+        AddIndexOnline(
+            model_name='task',
+            index=models.Index(fields=['project', 'priority', 'id'], name='core_task_project_priority_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The (organization, ...) indexes from 0004 cover the foreign key lookups, so
+# the single-column indexes 0003 created are dropped. A plain AlterField would
+# also drop and re-validate the foreign keys; only the index goes here.
+FOREIGN_KEYS = [('core_task', 'organization_id'), ('core_taskcomment', 'organization_id')]
+
+
+def index_names(schema_editor):
+    for table, column in FOREIGN_KEYS:
+        yield table, column, schema_editor._create_index_name(table, [column], suffix='')
+
+
+def drop_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for table, column, name in index_names(schema_editor):
+        schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def create_indexes(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    for table, column, name in index_names(schema_editor):
+        schema_editor.execute(
+            f'CREATE INDEX {concurrently}IF NOT EXISTS {schema_editor.quote_name(name)} '
+            f'ON {schema_editor.quote_name(table)} ({schema_editor.quote_name(column)})'
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_archive_and_job_progress'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='task',
+                    name='organization',
+                    field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='core.organization'),
+                ),
+                migrations.AlterField(
+                    model_name='taskcomment',
+                    name='organization',
+                    field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_comments', to='core.organization'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_indexes, create_indexes),
+            ],
+        ),
+    ]
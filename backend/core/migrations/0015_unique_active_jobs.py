@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:21
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_task_organization_no_fk_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='unique',
+            field=models.BooleanField(default=False, help_text='At most one such job is queued or running at a time; see core.jobs'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(models.F('kind'), django.db.models.functions.comparison.Coalesce('organization', models.Value(0)), models.F('payload'), condition=models.Q(('status__in', ['QUEUED', 'RUNNING']), ('unique', True)), name='core_job_unique_active'),
+        ),
+    ]
@@ -1,7 +1,33 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import EmailValidator
 
+from .fields import CodedChoiceField
+
+
+def _count_update(instance, kwargs):
+    """Bump the version of a model instance about to be updated by save()"""
+    if instance._state.adding:
+        return
+    instance.version += 1
+    if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+
+
+def _remember(instance, *attnames):
+    """Record the values of ``attnames`` as loaded from or saved to the database"""
+    instance._loaded_values = {name: instance.__dict__.get(name) for name in attnames}
+
+
+def _loaded(instance, attname):
+    """
+    The value of ``attname`` when ``instance`` was last loaded or saved; None
+    for new instances and for those loaded without it.
+    """
+    return instance.__dict__.get('_loaded_values', {}).get(attname)
+
 
 class Organization(models.Model):
     """Organization model for multi-tenancy"""
@@ -46,14 +72,18 @@ class Project(models.Model):
     )
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    status = models.CharField(
-        max_length=20, 
-        choices=STATUS_CHOICES, 
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
         default='ACTIVE'
     )
     due_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(
+        default=1,
+        editable=False,
+        help_text='Incremented by every update; see core.db.updates'
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -66,11 +96,41 @@ class Project(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['due_date']),
             models.Index(fields=['name']),
+            # Proposed by manage.py advise_indexes (migration 0010).
+            models.Index(fields=['organization', 'status', '-created_at'], name='core_projec_organiz_03be2d_idx'),
+            models.Index(fields=['organization', '-updated_at'], name='core_projec_organiz_512652_idx'),
+            # Sort keys of the projects query (migration 0011).
+            models.Index(fields=['organization', 'due_date', 'id'], name='core_project_org_due_idx'),
         ]
 
     def __str__(self):
         return f"{self.organization.name} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        _remember(instance, 'organization_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        _count_update(self, kwargs)
+        update_fields = kwargs.get('update_fields')
+        moved = not self._state.adding and self.organization_id != _loaded(self, 'organization_id') and (
+            update_fields is None or {'organization', 'organization_id'} & set(update_fields)
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if moved:
+                # Keep the organization denormalized onto tasks and comments
+                # in step when the project moves between organizations.
+                self.tasks.exclude(organization_id=self.organization_id).update(
+                    organization_id=self.organization_id, version=models.F('version') + 1
+                )
+                TaskComment.objects.filter(task__project=self).exclude(
+                    organization_id=self.organization_id
+                ).update(organization_id=self.organization_id)
+        _remember(self, 'organization_id')
+
     @property
     def task_count(self):
         return self.tasks.count()
@@ -96,6 +156,7 @@ class Task(models.Model):
         ('BLOCKED', 'Blocked'),
     ]
 
+    # Stored as codes in this order (core.fields), so tasks sort by urgency.
     PRIORITY_CHOICES = [
         ('LOW', 'Low'),
         ('MEDIUM', 'Medium'),
@@ -108,15 +169,24 @@ class Task(models.Model):
         on_delete=models.CASCADE,
         related_name='tasks'
     )
+    # Denormalized from project.organization: tenant filters and the
+    # PostgreSQL partition key use it without joining core_project. The
+    # composite indexes in Meta lead with it, so it needs no index of its own.
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='tasks',
+        null=True,
+        editable=False,
+        db_index=False
+    )
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    status = models.CharField(
-        max_length=20, 
-        choices=STATUS_CHOICES, 
+    status = CodedChoiceField(
+        choices=STATUS_CHOICES,
         default='TODO'
     )
-    priority = models.CharField(
-        max_length=20,
+    priority = CodedChoiceField(
         choices=PRIORITY_CHOICES,
         default='MEDIUM'
     )
@@ -127,26 +197,62 @@ class Task(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(
+        default=1,
+        editable=False,
+        help_text='Incremented by every update; see core.db.updates'
+    )
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
         indexes = [
+            models.Index(fields=['organization', 'status']),
+            models.Index(fields=['organization', 'created_at']),
             models.Index(fields=['project', 'status']),
-            models.Index(fields=['project', 'priority']),
             models.Index(fields=['project', 'created_at']),
             models.Index(fields=['status', 'priority']),
             models.Index(fields=['assignee_email']),
             models.Index(fields=['due_date']),
+            # Proposed by manage.py advise_indexes (migration 0010).
+            models.Index(fields=['project', 'status', '-created_at'], name='core_task_project_2ad884_idx'),
+            models.Index(
+                fields=['project', '-created_at'], condition=~models.Q(status='DONE'),
+                name='core_task_project_a44a05_idx',
+            ),
+            # Sort keys of the tasks query (migration 0011).
+            models.Index(fields=['project', 'updated_at', 'id'], name='core_task_project_updated_idx'),
+            models.Index(fields=['project', 'due_date', 'id'], name='core_task_project_due_idx'),
+            # Priority codes follow urgency (migration 0012).
+            models.Index(fields=['project', 'priority', 'id'], name='core_task_project_priority_idx'),
         ]
 
     def __str__(self):
         return f"{self.project.name} - {self.title}"
 
-    @property
-    def organization(self):
-        return self.project.organization
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        _remember(instance, 'project_id', 'organization_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # A task moved to another organization's project moves with it.
+        if self.project_id is not None and (
+            self.organization_id is None or self.project_id != _loaded(self, 'project_id')
+        ):
+            self.organization_id = self.project.organization_id
+        moved_from = None if self._state.adding else _loaded(self, 'organization_id')
+        _count_update(self, kwargs)
+        # The analytics rollups are updated from post_save (core.rollups)
+        # and must commit or roll back together with the task.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if moved_from is not None and moved_from != self.organization_id:
+                self.comments.update(organization_id=self.organization_id)
+                self.status_changes.update(organization_id=self.organization_id)
+        _remember(self, 'project_id', 'organization_id')
 
 
 class TaskComment(models.Model):
@@ -156,6 +262,14 @@ class TaskComment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='task_comments',
+        null=True,
+        editable=False,
+        db_index=False
+    )
     content = models.TextField()
     author_email = models.EmailField(validators=[EmailValidator()])
     created_at = models.DateTimeField(auto_now_add=True)
@@ -165,10 +279,409 @@ class TaskComment(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Task Comment'
         verbose_name_plural = 'Task Comments'
+        indexes = [
+            models.Index(fields=['organization', 'task']),
+            # Proposed by manage.py advise_indexes (migration 0010).
+            models.Index(fields=['task', '-created_at'], name='core_taskco_task_id_6454a0_idx'),
+        ]
 
     def __str__(self):
         return f"Comment on {self.task.title} by {self.author_email}"
 
-    @property
-    def organization(self):
-        return self.task.project.organization
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        _remember(instance, 'task_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.task_id is not None and (
+            self.organization_id is None or self.task_id != _loaded(self, 'task_id')
+        ):
+            self.organization_id = self.task.organization_id
+        super().save(*args, **kwargs)
+        _remember(self, 'task_id')
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket shared by every worker; see core.ratelimit"""
+    key = models.CharField(max_length=255, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField(help_text='Unix time of the last refill')
+    allowed = models.BooleanField(default=True, help_text='Outcome of the last charge')
+
+    class Meta:
+        verbose_name = 'Rate Limit Bucket'
+        verbose_name_plural = 'Rate Limit Buckets'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.0f} tokens"
+
+
+class OrganizationRollupState(models.Model):
+    """
+    Whether an organization's task rollups exist, and the cutoff their
+    overdue counts are measured against; see core.rollups
+    """
+    organization = models.OneToOneField(
+        Organization,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup_state'
+    )
+    overdue_before = models.DateTimeField(
+        help_text='Open tasks due before this time count as overdue'
+    )
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Organization Rollup State'
+        verbose_name_plural = 'Organization Rollup States'
+
+    def __str__(self):
+        return f"{self.organization_id}: overdue before {self.overdue_before:%Y-%m-%d %H:%M}"
+
+
+class ProjectTaskRollup(models.Model):
+    """Task counts of one project by status and priority"""
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='project_task_rollups',
+        db_index=False
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='task_rollups',
+        db_index=False
+    )
+    status = CodedChoiceField(choices=Task.STATUS_CHOICES)
+    priority = CodedChoiceField(choices=Task.PRIORITY_CHOICES)
+    task_count = models.IntegerField(default=0)
+    overdue_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Project Task Rollup'
+        verbose_name_plural = 'Project Task Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['project', 'status', 'priority'], name='core_projecttaskrollup_cell'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'project']),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} {self.status}/{self.priority}: {self.task_count}"
+
+
+class OrganizationTaskRollup(models.Model):
+    """Task counts of one organization by status and priority"""
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='task_rollups',
+        db_index=False
+    )
+    status = CodedChoiceField(choices=Task.STATUS_CHOICES)
+    priority = CodedChoiceField(choices=Task.PRIORITY_CHOICES)
+    task_count = models.IntegerField(default=0)
+    overdue_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Organization Task Rollup'
+        verbose_name_plural = 'Organization Task Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'status', 'priority'], name='core_organizationtaskrollup_cell'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id} {self.status}/{self.priority}: {self.task_count}"
+
+
+class TaskStatusChange(models.Model):
+    """
+    A task moving from one status to another, recorded by core.rollups on
+    every save that changes it. Creation is recorded with a blank
+    ``from_status``.
+    """
+    # History outlives its task, so throughput can be recomputed from it.
+    # No database constraint: a partitioned core_task (core.partitioning)
+    # has no unique key on id alone to reference.
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.SET_NULL,
+        related_name='status_changes',
+        null=True,
+        db_index=False,
+        db_constraint=False
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='task_status_changes',
+        null=True,
+        db_index=False
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='task_status_changes',
+        db_index=False
+    )
+    from_status = CodedChoiceField(choices=Task.STATUS_CHOICES, blank=True)
+    to_status = CodedChoiceField(choices=Task.STATUS_CHOICES)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['changed_at']
+        verbose_name = 'Task Status Change'
+        verbose_name_plural = 'Task Status Changes'
+        indexes = [
+            models.Index(fields=['task', 'changed_at']),
+            models.Index(fields=['organization', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class ProjectDailyThroughput(models.Model):
+    """Tasks created, completed and reopened in one project on one day"""
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='project_daily_throughput',
+        db_index=False
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='daily_throughput',
+        db_index=False
+    )
+    day = models.DateField()
+    created = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    reopened = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Project Daily Throughput'
+        verbose_name_plural = 'Project Daily Throughput'
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'day'], name='core_projectdailythroughput_day'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} {self.day}: +{self.created} done {self.completed}"
+
+
+class OrganizationDailyThroughput(models.Model):
+    """Tasks created, completed and reopened in one organization on one day"""
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='daily_throughput',
+        db_index=False
+    )
+    day = models.DateField()
+    created = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    reopened = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Organization Daily Throughput'
+        verbose_name_plural = 'Organization Daily Throughput'
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'day'], name='core_organizationdailythroughput_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.organization_id} {self.day}: +{self.created} done {self.completed}"
+
+
+class Job(models.Model):
+    """A unit of background work for ``manage.py run_worker``; see core.jobs"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    unique = models.BooleanField(
+        default=False,
+        help_text='At most one such job is queued or running at a time; see core.jobs'
+    )
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+        db_index=False
+    )
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='QUEUED'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        help_text='Not claimed by a worker before this time'
+    )
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Claim time or last heartbeat of the running attempt'
+    )
+    result = models.JSONField(null=True, blank=True)
+    progress = models.JSONField(
+        null=True,
+        blank=True,
+        help_text='Reported by the running attempt with every heartbeat'
+    )
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # Workers only scan the jobs they could claim or reclaim.
+            models.Index(
+                fields=['run_after', 'id'], name='core_job_queued_idx', condition=models.Q(status='QUEUED')
+            ),
+            models.Index(
+                fields=['locked_at'], name='core_job_running_idx', condition=models.Q(status='RUNNING')
+            ),
+            models.Index(fields=['organization', 'created_at']),
+            models.Index(fields=['finished_at']),
+        ]
+        constraints = [
+            # Jobs without an organization are alike too, so NULL is coalesced.
+            models.UniqueConstraint(
+                models.F('kind'), Coalesce('organization', models.Value(0)), models.F('payload'),
+                name='core_job_unique_active',
+                condition=models.Q(unique=True, status__in=['QUEUED', 'RUNNING']),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}: {self.status}"
+
+
+class ArchivedProject(models.Model):
+    """
+    A completed project moved out of core_project by core.deletion, with
+    its tasks and their comments. The archive tables keep the rows' ids and
+    columns but only the indexes needed to find or drop a project's rows.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='archived_projects',
+        db_index=False
+    )
+    name = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = CodedChoiceField(choices=Project.STATUS_CHOICES)
+    due_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-archived_at']
+        verbose_name = 'Archived Project'
+        verbose_name_plural = 'Archived Projects'
+        indexes = [
+            models.Index(fields=['organization', 'archived_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (archived {self.archived_at:%Y-%m-%d})"
+
+
+class ArchivedTask(models.Model):
+    """A task of an ArchivedProject"""
+    id = models.BigIntegerField(primary_key=True)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='archived_tasks',
+        db_index=False
+    )
+    project = models.ForeignKey(
+        ArchivedProject,
+        on_delete=models.CASCADE,
+        related_name='tasks',
+        db_index=False
+    )
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    status = CodedChoiceField(choices=Task.STATUS_CHOICES)
+    priority = CodedChoiceField(choices=Task.PRIORITY_CHOICES)
+    assignee_email = models.EmailField(blank=True)
+    due_date = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Archived Task'
+        verbose_name_plural = 'Archived Tasks'
+        indexes = [
+            models.Index(fields=['organization', 'project']),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTaskComment(models.Model):
+    """A comment on an ArchivedTask"""
+    id = models.BigIntegerField(primary_key=True)
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='archived_task_comments',
+        db_index=False
+    )
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        db_index=False
+    )
+    content = models.TextField()
+    author_email = models.EmailField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Archived Task Comment'
+        verbose_name_plural = 'Archived Task Comments'
+        indexes = [
+            models.Index(fields=['organization', 'task']),
+        ]
+
+    def __str__(self):
+        return f"Comment on archived task {self.task_id} by {self.author_email}"
@@ -0,0 +1,81 @@
+"""
+Server-side bounds for list fields.
+
+Every list of rows has a default page size, used when the client sends no
+``limit``, and a maximum page size that caps whatever ``limit`` it sends,
+per field in GRAPHQL_LIST_LIMITS. The rows of one request are capped too:
+once GRAPHQL_MAX_LIST_ROWS rows have been returned by its lists, later
+lists come back shorter (or empty).
+
+One row more than the page is fetched to tell whether a list was cut
+short. Each bounded list is reported, by its path in the response, in the
+``pageInfo`` extension of the response that holds it::
+
+    "extensions": {"pageInfo": {
+        "projects": {"limit": 20, "offset": 0, "hasNextPage": true},
+        "projects.0.tasks": {"limit": 20, "offset": 0, "hasNextPage": false}
+    }}
+
+A client that sees ``hasNextPage`` asks again with a larger ``offset``.
+"""
+from django.conf import settings
+
+_REQUEST_ATTR = '_pages'
+
+
+class _Pages:
+    """The pageInfo a request has yet to report, and the rows it has returned"""
+
+    def __init__(self):
+        self.info = {}
+        self.rows = 0
+
+
+def _pages(request):
+    pages = getattr(request, _REQUEST_ATTR, None)
+    if pages is None:
+        pages = _Pages()
+        if request is not None:
+            setattr(request, _REQUEST_ATTR, pages)
+    return pages
+
+
+def limits(field_name):
+    """The (default, maximum) page size of list field ``field_name``, or None if it is not bounded"""
+    return getattr(settings, 'GRAPHQL_LIST_LIMITS', {}).get(field_name)
+
+
+def page_size(field_name, limit=None):
+    """Rows bounded list field ``field_name`` returns when asked for ``limit``"""
+    default, maximum = limits(field_name)
+    if limit is None or limit <= 0:
+        return default
+    return min(limit, maximum)
+
+
+def paginate(info, queryset, limit=None, offset=None):
+    """
+    Return the page of ``queryset`` (an ordered queryset) the list field
+    being resolved returns for ``limit`` and ``offset``, and record it in
+    the request's pageInfo.
+    """
+    request = info.context
+    pages = _pages(request)
+    offset = max(offset or 0, 0)
+    size = page_size(info.field_name, limit)
+    size = max(min(size, getattr(settings, 'GRAPHQL_MAX_LIST_ROWS', 5000) - pages.rows), 0)
+
+    rows = list(queryset[offset:offset + size + 1])
+    has_next_page = len(rows) > size
+    del rows[size:]
+    pages.rows += len(rows)
+    path = '.'.join(str(key) for key in info.path.as_list())
+    pages.info[path] = {'limit': size, 'offset': offset, 'hasNextPage': has_next_page}
+    return rows
+
+
+def take_page_info(request):
+    """The pageInfo recorded for ``request`` since the last call"""
+    pages = _pages(request)
+    info, pages.info = pages.info, {}
+    return info
@@ -0,0 +1,268 @@
+"""
+Online conversion of the task tables to PostgreSQL declarative partitions
+keyed by organization_id.
+
+The conversion is split so that the bulk copy never holds a table lock:
+
+1. ``prepare`` creates a ``<table>_partitioned`` shadow for each table, with
+   its partitions and indexes, and triggers that mirror every write on the
+   live table into the shadow.
+2. ``copy`` backfills existing rows in primary-key batches. Each batch
+   locks its rows FOR SHARE while it copies them, so a concurrent UPDATE or
+   DELETE either commits first, and the batch copies what it left, or waits
+   for the batch and then goes through the trigger. Rows the triggers
+   already mirrored are skipped.
+3. ``swap`` first compares each shadow with its live table by id, and
+   refuses to go on if they differ. It then takes a short ACCESS EXCLUSIVE
+   lock, drops the triggers, renames the shadows into place and re-points
+   foreign keys at them. The old tables are kept as
+   ``<table>_unpartitioned`` until dropped by hand.
+
+Every unique constraint on a partitioned table must contain the partition
+key. The primary keys therefore become ``(organization_id, id)``, and foreign
+keys into a partitioned table become composite keys on
+``(organization_id, <column>)``. Referencing tables without an
+organization_id column lose the database-level constraint; Django still
+enforces those relations.
+"""
+import re
+
+from .models import Task, TaskComment
+
+PARTITION_KEY = 'organization_id'
+
+
+def partitioned_tables():
+    # Parents before children: comments reference tasks.
+    return [Task._meta.db_table, TaskComment._meta.db_table]
+
+
+def shadow_name(table):
+    return f'{table}_partitioned'
+
+
+def _suffixed(name, suffix):
+    # PostgreSQL truncates identifiers to 63 bytes.
+    return f'{name[:63 - len(suffix)]}{suffix}'
+
+
+class PartitionPlan:
+    def __init__(self, strategy='hash', partitions=16, tenants=()):
+        if strategy not in ('hash', 'list'):
+            raise ValueError("strategy must be 'hash' or 'list'")
+        if strategy == 'hash' and partitions < 1:
+            raise ValueError("hash partitioning needs at least one partition")
+        if strategy == 'list' and not tenants:
+            raise ValueError("list partitioning needs at least one tenant")
+        self.strategy = strategy
+        self.partitions = partitions
+        self.tenants = list(tenants)
+        self.tables = partitioned_tables()
+
+    # Catalog helpers -----------------------------------------------------
+
+    @staticmethod
+    def secondary_indexes(cursor, table):
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = %s::regclass AND NOT i.indisprimary AND NOT i.indisunique
+            ORDER BY c.relname
+            """,
+            [table],
+        )
+        return cursor.fetchall()
+
+    @staticmethod
+    def foreign_keys(cursor, table, referencing=False):
+        """FKs declared on ``table``, or pointing at it when ``referencing``"""
+        column = 'confrelid' if referencing else 'conrelid'
+        cursor.execute(
+            f"""
+            SELECT con.conname, con.conrelid::regclass::text, con.confrelid::regclass::text,
+                   att.attname
+            FROM pg_constraint con
+            JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1]
+            WHERE con.contype = 'f' AND con.{column} = %s::regclass
+              AND array_length(con.conkey, 1) = 1
+            ORDER BY con.conname
+            """,
+            [table],
+        )
+        return cursor.fetchall()
+
+    @staticmethod
+    def has_column(cursor, table, column):
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s",
+            [table, column],
+        )
+        return cursor.fetchone() is not None
+
+    # Steps -----------------------------------------------------------------
+
+    def partition_statements(self, table):
+        shadow = shadow_name(table)
+        if self.strategy == 'hash':
+            return [
+                f'CREATE TABLE {table}_p{i} PARTITION OF {shadow} '
+                f'FOR VALUES WITH (MODULUS {self.partitions}, REMAINDER {i})'
+                for i in range(self.partitions)
+            ]
+        statements = [
+            f'CREATE TABLE {table}_org{tenant} PARTITION OF {shadow} FOR VALUES IN ({int(tenant)})'
+            for tenant in self.tenants
+        ]
+        statements.append(f'CREATE TABLE {table}_default PARTITION OF {shadow} DEFAULT')
+        return statements
+
+    def prepare(self, cursor):
+        statements = []
+        for table in self.tables:
+            shadow = shadow_name(table)
+            method = 'HASH' if self.strategy == 'hash' else 'LIST'
+            statements += [
+                f'CREATE TABLE {shadow} (LIKE {table} INCLUDING DEFAULTS INCLUDING IDENTITY '
+                f'INCLUDING STORAGE) PARTITION BY {method} ({PARTITION_KEY})',
+                f'ALTER TABLE {shadow} ALTER COLUMN {PARTITION_KEY} SET NOT NULL',
+                f'ALTER TABLE {shadow} ADD CONSTRAINT {shadow}_pkey PRIMARY KEY ({PARTITION_KEY}, id)',
+            ]
+            statements += self.partition_statements(table)
+
+            for name, definition in self.secondary_indexes(cursor, table):
+                statements.append(re.sub(
+                    r'^CREATE INDEX \S+ ON \S+ ',
+                    f'CREATE INDEX {_suffixed(name, "_p")} ON {shadow} ',
+                    definition,
+                ))
+
+            # FKs to unpartitioned tables can be enforced from the start.
+            for name, _, target, column in self.foreign_keys(cursor, table):
+                if target not in self.tables:
+                    statements.append(
+                        f'ALTER TABLE {shadow} ADD CONSTRAINT {_suffixed(name, "_p")} '
+                        f'FOREIGN KEY ({column}) REFERENCES {target} (id) '
+                        f'DEFERRABLE INITIALLY DEFERRED'
+                    )
+
+            statements += [
+                f"""
+                CREATE FUNCTION {table}_partition_sync() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        DELETE FROM {shadow}
+                        WHERE {PARTITION_KEY} = OLD.{PARTITION_KEY} AND id = OLD.id;
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                        INSERT INTO {shadow} SELECT (NEW).*;
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+                """,
+                f'CREATE TRIGGER {table}_partition_sync AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                f'FOR EACH ROW EXECUTE FUNCTION {table}_partition_sync()',
+            ]
+        return statements
+
+    def copy_batches(self, cursor, table, batch_size):
+        """Yield (sql, params) for each primary-key batch of ``table``"""
+        cursor.execute(f'SELECT min(id), max(id) FROM {table}')
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        # Without the lock, a row deleted or moved to another organization
+        # while the batch runs would be copied as it was before: the trigger
+        # finds nothing to remove in the shadow yet.
+        sql = (
+            f'WITH batch AS (SELECT * FROM {table} WHERE id >= %s AND id < %s FOR SHARE) '
+            f'INSERT INTO {shadow_name(table)} SELECT * FROM batch ON CONFLICT DO NOTHING'
+        )
+        for start in range(low, high + 1, batch_size):
+            yield sql, [start, start + batch_size]
+
+    @staticmethod
+    def differences(cursor, table):
+        """
+        The number of ids missing from ``table``'s shadow, left in it after
+        they were deleted, or in it under another organization or twice.
+        The triggers write in the transaction of the write they mirror, so
+        one statement sees both tables consistently.
+        """
+        cursor.execute(
+            f"""
+            SELECT count(*) FROM {table} live FULL JOIN {shadow_name(table)} shadow ON shadow.id = live.id
+            WHERE live.id IS NULL OR shadow.id IS NULL
+               OR shadow.{PARTITION_KEY} IS DISTINCT FROM live.{PARTITION_KEY}
+            """
+        )
+        return cursor.fetchone()[0]
+
+    def link_statements(self, cursor, table):
+        """Composite FKs between shadow tables, added once ``table`` is copied"""
+        statements = []
+        for child in self.tables:
+            for name, _, target, column in self.foreign_keys(cursor, child):
+                if target == table:
+                    statements.append(
+                        f'ALTER TABLE {shadow_name(child)} ADD CONSTRAINT {_suffixed(name, "_p")} '
+                        f'FOREIGN KEY ({PARTITION_KEY}, {column}) '
+                        f'REFERENCES {shadow_name(table)} ({PARTITION_KEY}, id) '
+                        f'DEFERRABLE INITIALLY DEFERRED'
+                    )
+        return statements
+
+    def swap(self, cursor):
+        """
+        Return (statements, validations, dropped). ``statements`` run in one
+        transaction under the lock; ``validations`` run after it commits.
+        ``dropped`` lists FKs that could not be recreated.
+        """
+        statements = [f'LOCK TABLE {", ".join(self.tables)} IN ACCESS EXCLUSIVE MODE']
+        validations, dropped = [], []
+
+        external_fks = []
+        for table in self.tables:
+            for fk in self.foreign_keys(cursor, table, referencing=True):
+                if fk[1] not in self.tables:
+                    external_fks.append(fk)
+
+        for table in self.tables:
+            shadow = shadow_name(table)
+            old = f'{table}_unpartitioned'
+            statements += [
+                f'DROP TRIGGER {table}_partition_sync ON {table}',
+                f'DROP FUNCTION {table}_partition_sync()',
+                f'ALTER TABLE {table} RENAME TO {old}',
+                f'ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey',
+                f'ALTER TABLE {shadow} RENAME TO {table}',
+                f'ALTER TABLE {table} RENAME CONSTRAINT {shadow}_pkey TO {table}_pkey',
+            ]
+            # Keep the index names Django's migrations know about.
+            for name, _ in self.secondary_indexes(cursor, table):
+                statements += [
+                    f'ALTER INDEX {name} RENAME TO {_suffixed(name, "_old")}',
+                    f'ALTER INDEX {_suffixed(name, "_p")} RENAME TO {name}',
+                ]
+            for name, *_ in self.foreign_keys(cursor, table):
+                statements.append(
+                    f'ALTER TABLE {table} RENAME CONSTRAINT {_suffixed(name, "_p")} TO {name}'
+                )
+            statements.append(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(max(id), 0) + 1 FROM {table}), false)"
+            )
+
+        for name, source, target, column in external_fks:
+            statements.append(f'ALTER TABLE {source} DROP CONSTRAINT {name}')
+            if self.has_column(cursor, source, PARTITION_KEY):
+                statements.append(
+                    f'ALTER TABLE {source} ADD CONSTRAINT {name} '
+                    f'FOREIGN KEY ({PARTITION_KEY}, {column}) REFERENCES {target} ({PARTITION_KEY}, id) '
+                    f'DEFERRABLE INITIALLY DEFERRED NOT VALID'
+                )
+                validations.append(f'ALTER TABLE {source} VALIDATE CONSTRAINT {name}')
+            else:
+                dropped.append(f'{source}.{column} -> {target}')
+        return statements, validations, dropped
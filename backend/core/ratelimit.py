@@ -0,0 +1,483 @@
+"""
+Token-bucket rate limiting for the GraphQL endpoint.
+
+Each operation is charged its estimated cost (see ``query_cost``) against
+two buckets:
+
+* one per organization and client, so clients behind a shared NAT no longer
+  throttle each other;
+* one per organization, bounding what all of its clients use together.
+
+Operations that target no organization are charged to the client's bucket
+alone.
+
+Introspection from anonymous clients is answered from memory
+(core.introspection) but is what scrapers send most; it is charged one
+token per operation against a bucket of its own, per client, instead.
+
+Buckets live in the database (``RateLimitBucket``), so every worker and
+host sees the same state. A charge is a single upsert that refills and
+debits the bucket in one statement, so concurrent requests cannot spend
+the same tokens twice.
+
+Clients are identified by a signed ``rl_client`` cookie issued on first
+contact, and by IP address until they present one. Each cookie comes with
+full buckets of its own, so an address is only issued a few of them
+(RATELIMIT_CLIENT_ISSUE_CAPACITY, then RATELIMIT_CLIENT_ISSUE_RATE per
+second); callers refused one stay limited by their address. Behind a proxy
+listed in RATELIMIT_TRUSTED_PROXIES, the address is taken from the
+X-Forwarded-For hops it appended.
+"""
+import ipaddress
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F, Value
+from django.db.models.functions import Least
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    IntValueNode,
+    OperationType,
+    StringValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_list_type,
+)
+
+from . import introspection, pagination
+from .models import Organization, RateLimitBucket
+from .tenancy import get_organization
+
+CLIENT_COOKIE = 'rl_client'
+CLIENT_COOKIE_SALT = 'core.ratelimit'
+CLIENT_COOKIE_MAX_AGE = 365 * 24 * 3600
+HEADER_LIMIT = 'X-RateLimit-Limit'
+HEADER_REMAINING = 'X-RateLimit-Remaining'
+HEADER_COST = 'X-RateLimit-Cost'
+
+INTROSPECTION_COST = 50
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Cost estimation -----------------------------------------------------------
+
+def _list_size(field, variables):
+    limit = None
+    for argument in field.arguments:
+        if argument.name.value not in ('limit', 'first'):
+            continue
+        value = argument.value
+        if isinstance(value, VariableNode):
+            value = variables.get(value.name.value)
+        elif isinstance(value, IntValueNode):
+            value = int(value.value)
+        if isinstance(value, int) and value > 0:
+            limit = value
+            break
+    if pagination.limits(field.name.value) is not None:
+        # What the server will actually return, not what was asked for.
+        return pagination.page_size(field.name.value, limit)
+    return limit or _setting('RATELIMIT_DEFAULT_LIST_SIZE', 20)
+
+
+def _selection_cost(schema, selection_set, parent_type, fragments, variables, seen=frozenset()):
+    total = 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name == '__typename':
+                continue
+            if name in ('__schema', '__type'):
+                total += INTROSPECTION_COST
+                continue
+            field = getattr(parent_type, 'fields', {}).get(name)
+            if field is None:
+                # Unknown fields fail validation; nothing will run.
+                continue
+            cost = 1
+            if parent_type is schema.mutation_type:
+                cost = _setting('RATELIMIT_MUTATION_COST', 10)
+            if selection.selection_set:
+                children = _selection_cost(
+                    schema, selection.selection_set, get_named_type(field.type),
+                    fragments, variables, seen,
+                )
+                if is_list_type(get_nullable_type(field.type)):
+                    children *= _list_size(selection, variables)
+                cost += children
+            total += cost
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = parent_type
+            if selection.type_condition:
+                fragment_type = schema.get_type(selection.type_condition.name.value)
+            total += _selection_cost(
+                schema, selection.selection_set, fragment_type, fragments, variables, seen
+            )
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            if fragment is None or name in seen:
+                continue
+            total += _selection_cost(
+                schema, fragment.selection_set,
+                schema.get_type(fragment.type_condition.name.value),
+                fragments, variables, seen | {name},
+            )
+    return total
+
+
+def query_cost(schema, document, operation_name=None, variables=None):
+    """
+    Estimate the cost of running ``operation_name`` from ``document``
+    against ``schema`` (a GraphQLSchema).
+
+    Every field costs 1 and every mutation field RATELIMIT_MUTATION_COST.
+    The selections under a list field are multiplied by the rows it will
+    return: its page size for the fields bounded by core.pagination, else
+    its ``limit`` (or ``first``) argument, or RATELIMIT_DEFAULT_LIST_SIZE
+    when it has none.
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 1
+    root_type = {
+        OperationType.QUERY: schema.query_type,
+        OperationType.MUTATION: schema.mutation_type,
+        OperationType.SUBSCRIPTION: schema.subscription_type,
+    }[operation.operation]
+    if root_type is None:
+        return 1
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+    cost = _selection_cost(schema, operation.selection_set, root_type, fragments, variables or {})
+    return max(cost, 1)
+
+
+def organization_slug(document, operation_name=None, variables=None):
+    """The organization an operation targets, from its variables or arguments"""
+    variables = variables or {}
+    for name in ('organizationSlug', 'slug'):
+        if isinstance(variables.get(name), str):
+            return variables[name]
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return None
+    for selection in operation.selection_set.selections:
+        for argument in getattr(selection, 'arguments', ()):
+            if argument.name.value not in ('organizationSlug', 'slug'):
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                value = variables.get(value.name.value)
+            elif isinstance(value, StringValueNode):
+                value = value.value
+            if isinstance(value, str):
+                return value
+    return None
+
+
+# Buckets ---------------------------------------------------------------------
+
+class DatabaseBuckets:
+    """Token buckets stored in RateLimitBucket, each charge one atomic upsert"""
+
+    def connection(self):
+        return connections[router.db_for_write(RateLimitBucket)]
+
+    def consume(self, key, cost, capacity, rate, now=None):
+        """
+        Refill ``key`` for the time since its last charge and take ``cost``
+        tokens if it holds that many. Return (allowed, tokens left).
+        """
+        now = time.time() if now is None else now
+        connection = self.connection()
+        table = connection.ops.quote_name(RateLimitBucket._meta.db_table)
+        key_column = connection.ops.quote_name('key')
+        # Every SET expression sees the row as it was before the update.
+        elapsed = f'CASE WHEN %(now)s > {table}.updated_at THEN %(now)s - {table}.updated_at ELSE 0 END'
+        refilled = (
+            f'CASE WHEN {table}.tokens + ({elapsed}) * %(rate)s > %(capacity)s '
+            f'THEN %(capacity)s ELSE {table}.tokens + ({elapsed}) * %(rate)s END'
+        )
+        sql = f"""
+            INSERT INTO {table} ({key_column}, tokens, updated_at, allowed)
+            VALUES (
+                %(key)s,
+                CASE WHEN %(cost)s <= %(capacity)s THEN %(capacity)s - %(cost)s ELSE %(capacity)s END,
+                %(now)s,
+                %(cost)s <= %(capacity)s
+            )
+            ON CONFLICT ({key_column}) DO UPDATE SET
+                tokens = CASE WHEN ({refilled}) >= %(cost)s
+                    THEN ({refilled}) - %(cost)s ELSE ({refilled}) END,
+                allowed = ({refilled}) >= %(cost)s,
+                updated_at = CASE WHEN %(now)s > {table}.updated_at THEN %(now)s ELSE {table}.updated_at END
+            RETURNING allowed, tokens
+        """
+        params = {
+            'key': key, 'cost': float(cost), 'capacity': float(capacity),
+            'rate': float(rate), 'now': now,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            allowed, tokens = cursor.fetchone()
+        return bool(allowed), tokens
+
+    def refund(self, key, cost, capacity):
+        RateLimitBucket.objects.filter(key=key).update(
+            tokens=Least(F('tokens') + float(cost), Value(float(capacity)))
+        )
+
+    def purge(self, idle_for):
+        """Delete buckets untouched for ``idle_for`` seconds; they have refilled"""
+        return RateLimitBucket.objects.filter(updated_at__lt=time.time() - idle_for).delete()[0]
+
+
+buckets = DatabaseBuckets()
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    cost: int
+    limit: int
+    remaining: int
+    retry_after: int = 0
+
+    @property
+    def message(self):
+        return f'Rate limit exceeded: this operation costs {self.cost}; retry in {self.retry_after}s.'
+
+    def merge(self, other):
+        """Combine the decisions for the organizations of one batched request"""
+        if other is None:
+            return self
+        return Decision(
+            allowed=self.allowed and other.allowed,
+            cost=self.cost + other.cost,
+            limit=self.limit,
+            remaining=min(self.remaining, other.remaining),
+            retry_after=max(self.retry_after, other.retry_after),
+        )
+
+    def apply(self, response):
+        response[HEADER_LIMIT] = str(self.limit)
+        response[HEADER_REMAINING] = str(self.remaining)
+        response[HEADER_COST] = str(self.cost)
+        if not self.allowed:
+            response.status_code = 429
+            response['Retry-After'] = str(self.retry_after)
+
+
+# Request integration -------------------------------------------------------------
+
+def client_id(request):
+    """The signed client cookie's id, or None if the client has none, or only an expired one"""
+    return request.get_signed_cookie(
+        CLIENT_COOKIE, default=None, salt=CLIENT_COOKIE_SALT, max_age=CLIENT_COOKIE_MAX_AGE
+    )
+
+
+@lru_cache(maxsize=8)
+def _networks(proxies):
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+
+def _is_trusted(address, networks):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def client_address(request):
+    """
+    The caller's IP address. When REMOTE_ADDR is a trusted proxy, the
+    X-Forwarded-For hops are walked from the right, past every trusted
+    proxy: anything further left was written by the client and is not
+    believed.
+    """
+    address = request.META.get('REMOTE_ADDR', '')
+    networks = _networks(tuple(_setting('RATELIMIT_TRUSTED_PROXIES', ())))
+    if networks:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+        hops = [hop for hop in hops if hop]
+        while hops and _is_trusted(address, networks):
+            address = hops.pop()
+    return address or 'unknown'
+
+
+def _address_key(request):
+    return f'ip:{client_address(request)}'
+
+
+class IssueRefusals:
+    """
+    Per process: when each address's cookie issue bucket next holds a
+    token. Until then, a cookieless response is refused a cookie without
+    another upsert on the primary.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def refused(self, key, now):
+        with self._lock:
+            return self._until.get(key, 0) > now
+
+    def refuse(self, key, until, now):
+        with self._lock:
+            if len(self._until) >= self.maxsize:
+                self._until = {k: t for k, t in self._until.items() if t > now}
+            if len(self._until) < self.maxsize:
+                self._until[key] = until
+
+    def clear(self):
+        with self._lock:
+            self._until.clear()
+
+
+issue_refusals = IssueRefusals()
+
+
+def ensure_client_cookie(request, response):
+    """Issue a client cookie to a caller without one, if its address may have another"""
+    if client_id(request) is not None:
+        return
+    key = f'issue:{_address_key(request)}'
+    now = time.time()
+    if issue_refusals.refused(key, now):
+        return
+    rate = _setting('RATELIMIT_CLIENT_ISSUE_RATE', 0.01)
+    allowed, tokens = buckets.consume(key, 1, _setting('RATELIMIT_CLIENT_ISSUE_CAPACITY', 20), rate, now=now)
+    if not allowed:
+        issue_refusals.refuse(key, now + _retry_after(1, tokens, rate), now)
+        return
+    response.set_signed_cookie(
+        CLIENT_COOKIE, uuid.uuid4().hex, salt=CLIENT_COOKIE_SALT,
+        max_age=CLIENT_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+    )
+
+
+def _org_quota(slug):
+    quotas = _setting('RATELIMIT_ORG_QUOTAS', {})
+    capacity, rate = quotas.get(slug, (
+        _setting('RATELIMIT_ORG_CAPACITY', 20000), _setting('RATELIMIT_ORG_RATE', 100.0),
+    ))
+    return capacity, rate
+
+
+def _retry_after(cost, tokens, rate):
+    if rate <= 0:
+        return 3600
+    return max(1, math.ceil((cost - tokens) / rate))
+
+
+def charge(request, schema, document, operation_name=None, variables=None):
+    """
+    Charge the operation's cost to the caller's buckets and return the
+    Decision. A denied charge leaves every bucket as it was.
+    """
+    return charge_operations(request, schema, [(document, operation_name, variables)])
+
+
+def charge_operations(request, schema, operations):
+    """
+    Charge a batch of (document, operation_name, variables) operations
+    together: one charge per organization they target, for the sum of
+    their costs. Return the combined Decision, or None for no operations.
+    If any charge is denied, those already taken are refunded.
+    """
+    anonymous = not getattr(getattr(request, 'user', None), 'is_authenticated', False)
+    costs = {}
+    introspections = 0
+    for document, operation_name, variables in operations:
+        if anonymous and introspection.is_introspection(document, operation_name):
+            introspections += 1
+            continue
+        slug = organization_slug(document, operation_name, variables)
+        costs[slug] = costs.get(slug, 0) + query_cost(schema, document, operation_name, variables)
+
+    decision = None
+    charges = []
+    if introspections:
+        decision = _charge_introspection(request, introspections, charges)
+    for slug, cost in costs.items():
+        if decision is not None and not decision.allowed:
+            break
+        decision = _charge(request, slug, cost, charges).merge(decision)
+    if decision is not None and not decision.allowed:
+        for key, cost, capacity in charges:
+            buckets.refund(key, cost, capacity)
+    return decision
+
+
+def _client_key(request):
+    client = client_id(request)
+    return f'c:{client}' if client else _address_key(request)
+
+
+def _charge_introspection(request, count, charges):
+    """Charge ``count`` introspection operations, adding the charge taken to ``charges``"""
+    capacity = _setting('RATELIMIT_INTROSPECTION_CAPACITY', 20)
+    rate = _setting('RATELIMIT_INTROSPECTION_RATE', 0.2)
+    key = f'introspection:{_client_key(request)}'
+    allowed, tokens = buckets.consume(key, count, capacity, rate)
+    if not allowed:
+        return Decision(False, count, capacity, int(tokens), _retry_after(count, tokens, rate))
+    charges.append((key, count, capacity))
+    return Decision(True, count, capacity, int(tokens))
+
+
+def _charge(request, slug, cost, charges):
+    """Charge ``cost`` for ``slug``, adding each charge taken to ``charges``"""
+    org_key = None
+    if slug:
+        try:
+            org_key = str(get_organization(request, slug).pk)
+        except Organization.DoesNotExist:
+            slug = None
+    client_key = _client_key(request)
+
+    client_capacity = _setting('RATELIMIT_CLIENT_CAPACITY', 2000)
+    client_rate = _setting('RATELIMIT_CLIENT_RATE', 10.0)
+    org_capacity, org_rate = _org_quota(slug)
+
+    # Without an organization there is no shared bucket to bound: one
+    # caller must not starve every other.
+    key = f'org:{org_key}:{client_key}' if org_key else f'client:{client_key}'
+    allowed, client_tokens = buckets.consume(key, cost, client_capacity, client_rate)
+    if not allowed:
+        return Decision(False, cost, client_capacity, int(client_tokens),
+                        _retry_after(cost, client_tokens, client_rate))
+    charges.append((key, cost, client_capacity))
+    if org_key is None:
+        return Decision(True, cost, client_capacity, int(client_tokens))
+
+    allowed, org_tokens = buckets.consume(f'org:{org_key}', cost, org_capacity, org_rate)
+    if not allowed:
+        return Decision(False, cost, client_capacity, int(min(client_tokens + cost, org_tokens)),
+                        _retry_after(cost, org_tokens, org_rate))
+
+    charges.append((f'org:{org_key}', cost, org_capacity))
+    return Decision(True, cost, client_capacity, int(min(client_tokens, org_tokens)))
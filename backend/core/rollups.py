@@ -0,0 +1,425 @@
+"""
+Task analytics rollups.
+
+``ProjectTaskRollup`` and ``OrganizationTaskRollup`` hold, for every
+(status, priority) cell of a project or organization, its number of tasks
+and how many of those are overdue. The analytics fields of the GraphQL
+schema read these few rows instead of scanning core_task.
+
+Every status change is recorded as a ``TaskStatusChange``, and counted into
+``ProjectDailyThroughput`` and ``OrganizationDailyThroughput``: the tasks
+created, completed (moved into DONE) and reopened (moved out of it) per
+day. The velocity queries read those buckets.
+
+The rollups are kept current in two ways:
+
+* incrementally: saving or deleting a task moves it out of its old cell
+  and into its new one, in the task's own transaction;
+* by ``refresh_rollups``, which recomputes an organization's cells from
+  core_task and its daily buckets from the status history. Run it on a
+  schedule: it repairs anything written with ``QuerySet.update()`` or
+  ``bulk_create()``, which send no signals.
+
+"Overdue" changes with the clock, not only with writes, so it is counted
+against a fixed cutoff per organization (``OrganizationRollupState``):
+an open task is overdue if it was due before the cutoff. Incremental
+updates use the same cutoff, so the counts stay exact; each refresh moves
+the cutoff to the time of the refresh.
+
+Organizations without a rollup state have no rollups. New organizations
+get one when they are created; existing ones when the command first runs.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    OrganizationDailyThroughput,
+    OrganizationRollupState,
+    OrganizationTaskRollup,
+    ProjectDailyThroughput,
+    ProjectTaskRollup,
+    Task,
+    TaskStatusChange,
+)
+
+DONE = 'DONE'
+
+_SNAPSHOT_ATTR = '_rollup_cell'
+_PROJECT_ORGANIZATION_ATTR = '_rollup_organization_id'
+CELL_FIELDS = ('organization_id', 'project_id', 'status', 'priority', 'due_date')
+
+
+def _snapshot(task):
+    """The rollup-relevant values of ``task``, or None if some aren't loaded"""
+    if any(name not in task.__dict__ for name in CELL_FIELDS):
+        return None
+    return tuple(task.__dict__[name] for name in CELL_FIELDS)
+
+
+def _is_overdue(status, due_date, cutoff):
+    return status != DONE and due_date is not None and due_date < cutoff
+
+
+def _add(model, keys, **deltas):
+    """Add ``deltas`` to the row with ``keys``, creating it if it is missing"""
+    if model.objects.filter(**keys).update(**{name: F(name) + delta for name, delta in deltas.items()}):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # A missing row with a negative delta belongs to a project or
+        # organization that is being deleted.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def _share_state(organization_id):
+    """
+    The organization's overdue cutoff, or None if it has no rollups.
+
+    The state is locked in share mode until the transaction ends: writes
+    to the same organization take it side by side, and wait only for a
+    refresh, which locks it exclusively (see refresh_organization). The
+    ORM has no FOR SHARE; elsewhere than on PostgreSQL the database
+    serializes writers anyway.
+    """
+    connection = connections[router.db_for_write(OrganizationRollupState)]
+    if connection.vendor != 'postgresql':
+        return (
+            OrganizationRollupState.objects.filter(organization_id=organization_id)
+            .values_list('overdue_before', flat=True)
+            .first()
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT overdue_before FROM {connection.ops.quote_name(OrganizationRollupState._meta.db_table)} '
+            'WHERE organization_id = %s FOR SHARE',
+            [organization_id],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _apply(cell, sign):
+    organization_id, project_id, status, priority, due_date = cell
+    if organization_id is None:
+        return
+    cutoff = _share_state(organization_id)
+    if cutoff is None:
+        return
+    overdue = sign if _is_overdue(status, due_date, cutoff) else 0
+    _add(ProjectTaskRollup, {
+        'organization_id': organization_id, 'project_id': project_id,
+        'status': status, 'priority': priority,
+    }, task_count=sign, overdue_count=overdue)
+    _add(OrganizationTaskRollup, {
+        'organization_id': organization_id, 'status': status, 'priority': priority,
+    }, task_count=sign, overdue_count=overdue)
+
+
+def _throughput(from_status, to_status):
+    """The daily bucket counts one status change adds to"""
+    return {
+        'created': int(not from_status),
+        'completed': int(to_status == DONE and from_status != DONE),
+        'reopened': int(from_status == DONE and to_status != DONE),
+    }
+
+
+def _record_transition(task, from_status, changed_at):
+    if task.organization_id is None:
+        return
+    _share_state(task.organization_id)
+    TaskStatusChange.objects.create(
+        task=task, organization_id=task.organization_id, project_id=task.project_id,
+        from_status=from_status, to_status=task.status, changed_at=changed_at,
+    )
+    counts = _throughput(from_status, task.status)
+    if not any(counts.values()):
+        # Moves between open statuses count nowhere; leaving the buckets
+        # alone spares them a row lock held until commit.
+        return
+    day = timezone.localdate(changed_at)
+    _add(ProjectDailyThroughput, {
+        'organization_id': task.organization_id, 'project_id': task.project_id, 'day': day,
+    }, **counts)
+    _add(OrganizationDailyThroughput, {'organization_id': task.organization_id, 'day': day}, **counts)
+
+
+# Signal receivers, connected in CoreConfig.ready() -----------------------------
+
+def task_initialized(sender, instance, **kwargs):
+    setattr(instance, _SNAPSHOT_ATTR, _snapshot(instance))
+
+
+def task_saving(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or getattr(instance, _SNAPSHOT_ATTR, None) is not None:
+        return
+    # Loaded with some fields deferred: read the stored values before they change.
+    row = Task.objects.filter(pk=instance.pk).values_list(*CELL_FIELDS).first()
+    setattr(instance, _SNAPSHOT_ATTR, row)
+
+
+def task_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and getattr(instance, 'previous', None) is not None:
+        # Written by core.db.updates.update_returning: the instance was
+        # loaded with the new values, the old ones come with it.
+        setattr(instance, _SNAPSHOT_ATTR, tuple(instance.previous[name] for name in CELL_FIELDS))
+    old = None if created else getattr(instance, _SNAPSHOT_ATTR, None)
+    new = _snapshot(instance)
+    if new is None and old is not None:
+        # Fields that were deferred were not saved either.
+        new = tuple(instance.__dict__.get(name, value) for name, value in zip(CELL_FIELDS, old))
+    if old != new:
+        if old is not None:
+            _apply(old, -1)
+        if new is not None:
+            _apply(new, 1)
+    if created:
+        _record_transition(instance, '', instance.created_at)
+    elif old is not None and new is not None and old[2] != new[2]:
+        _record_transition(instance, old[2], timezone.now())
+    setattr(instance, _SNAPSHOT_ATTR, new)
+
+
+def task_deleted(sender, instance, **kwargs):
+    cell = getattr(instance, _SNAPSHOT_ATTR, None) or _snapshot(instance)
+    if cell is not None:
+        _apply(cell, -1)
+
+
+def organization_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # Nothing is overdue in an organization without tasks.
+        now = timezone.now()
+        OrganizationRollupState.objects.get_or_create(
+            organization=instance, defaults={'overdue_before': now, 'refreshed_at': now}
+        )
+
+
+def project_initialized(sender, instance, **kwargs):
+    setattr(instance, _PROJECT_ORGANIZATION_ATTR, instance.__dict__.get('organization_id'))
+
+
+def project_saved(sender, instance, created, raw=False, **kwargs):
+    moved_from = getattr(instance, _PROJECT_ORGANIZATION_ATTR, None)
+    setattr(instance, _PROJECT_ORGANIZATION_ATTR, instance.organization_id)
+    if created or raw or moved_from in (None, instance.organization_id):
+        return
+    project_id, moved_to = instance.pk, instance.organization_id
+    # Project.save() moves the project's tasks with a bulk update after this
+    # signal; recount both organizations once that has committed.
+    def refresh():
+        TaskStatusChange.objects.filter(project_id=project_id).update(organization_id=moved_to)
+        for organization_id in sorted({moved_from, moved_to}):
+            refresh_organization(organization_id)
+    transaction.on_commit(refresh)
+
+
+# Refresh ----------------------------------------------------------------------
+
+def refresh_organization(organization_id, now=None):
+    """
+    Recompute every rollup cell of an organization from core_task, and its
+    daily throughput from the status history, and move its overdue cutoff
+    to ``now``. Return the number of project cells.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        state, _ = OrganizationRollupState.objects.select_for_update().get_or_create(
+            organization_id=organization_id, defaults={'overdue_before': now, 'refreshed_at': now}
+        )
+        cells = list(
+            Task.objects.filter(organization_id=organization_id)
+            .order_by()
+            .values('project_id', 'status', 'priority')
+            .annotate(
+                task_count=Count('id'),
+                overdue_count=Count('id', filter=Q(due_date__lt=now) & ~Q(status=DONE)),
+            )
+        )
+        totals = defaultdict(lambda: [0, 0])
+        for cell in cells:
+            total = totals[cell['status'], cell['priority']]
+            total[0] += cell['task_count']
+            total[1] += cell['overdue_count']
+
+        ProjectTaskRollup.objects.filter(organization_id=organization_id).delete()
+        OrganizationTaskRollup.objects.filter(organization_id=organization_id).delete()
+        ProjectTaskRollup.objects.bulk_create([
+            ProjectTaskRollup(organization_id=organization_id, **cell) for cell in cells
+        ])
+        OrganizationTaskRollup.objects.bulk_create([
+            OrganizationTaskRollup(
+                organization_id=organization_id, status=status, priority=priority,
+                task_count=task_count, overdue_count=overdue_count,
+            )
+            for (status, priority), (task_count, overdue_count) in totals.items()
+        ])
+        _rebuild_throughput(organization_id)
+        state.overdue_before = state.refreshed_at = now
+        state.save(update_fields=['overdue_before', 'refreshed_at'])
+    return len(cells)
+
+
+def _rebuild_throughput(organization_id):
+    days = list(
+        TaskStatusChange.objects.filter(organization_id=organization_id)
+        .order_by()
+        .annotate(day=TruncDate('changed_at'))
+        .values('project_id', 'day')
+        .annotate(
+            created=Count('id', filter=Q(from_status='')),
+            completed=Count('id', filter=Q(to_status=DONE) & ~Q(from_status=DONE)),
+            reopened=Count('id', filter=Q(from_status=DONE) & ~Q(to_status=DONE)),
+        )
+    )
+    ProjectDailyThroughput.objects.filter(organization_id=organization_id).delete()
+    OrganizationDailyThroughput.objects.filter(organization_id=organization_id).delete()
+    ProjectDailyThroughput.objects.bulk_create([
+        ProjectDailyThroughput(organization_id=organization_id, **day) for day in days
+        if day['created'] or day['completed'] or day['reopened']
+    ], batch_size=1000)
+    OrganizationDailyThroughput.objects.bulk_create([
+        OrganizationDailyThroughput(organization_id=organization_id, **day)
+        for day in (
+            ProjectDailyThroughput.objects.filter(organization_id=organization_id)
+            .order_by()
+            .values('day')
+            .annotate(created=Sum('created'), completed=Sum('completed'), reopened=Sum('reopened'))
+        )
+    ], batch_size=1000)
+
+
+# Reading ----------------------------------------------------------------------
+
+def summarize(rows, overdue_as_of):
+    """
+    Build the analytics of a project or organization from its rollup rows
+    (dicts with status, priority, task_count and overdue_count).
+    """
+    by_status = defaultdict(int)
+    by_priority = defaultdict(int)
+    total = overdue = 0
+    breakdown = []
+    for row in rows:
+        if not row['task_count']:
+            continue
+        total += row['task_count']
+        overdue += row['overdue_count']
+        by_status[row['status']] += row['task_count']
+        by_priority[row['priority']] += row['task_count']
+        breakdown.append({
+            'status': row['status'], 'priority': row['priority'],
+            'count': row['task_count'], 'overdue': row['overdue_count'],
+        })
+    completed = by_status[DONE]
+    return {
+        'total_tasks': total,
+        'completed_tasks': completed,
+        'overdue_tasks': overdue,
+        'completion_rate': round(completed / total * 100, 2) if total else 0,
+        'by_status': [{'key': key, 'count': count} for key, _ in Task.STATUS_CHOICES
+                      if (count := by_status[key])],
+        'by_priority': [{'key': key, 'count': count} for key, _ in Task.PRIORITY_CHOICES
+                        if (count := by_priority[key])],
+        'breakdown': breakdown,
+        'overdue_as_of': overdue_as_of,
+    }
+
+
+def backfill_history(organization_id):
+    """
+    Record history for tasks that have none, such as those inserted with
+    ``bulk_create()``: their creation and, for finished tasks, a completion
+    at their last update.
+    """
+    connection = connections[router.db_for_write(TaskStatusChange)]
+    quote = connection.ops.quote_name
+    history, tasks = quote(TaskStatusChange._meta.db_table), quote(Task._meta.db_table)
+    status = Task._meta.get_field('status')
+    done, todo = (status.get_db_prep_value(value, connection) for value in (DONE, 'TODO'))
+    created = TaskStatusChange._meta.get_field('from_status').get_db_prep_value('', connection)
+    columns = f'INSERT INTO {history} (task_id, organization_id, project_id, from_status, to_status, changed_at)'
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            {columns}
+            SELECT t.id, t.organization_id, t.project_id, %s, %s, t.updated_at FROM {tasks} t
+            WHERE t.organization_id = %s AND t.status = %s
+              AND NOT EXISTS (SELECT 1 FROM {history} h WHERE h.task_id = t.id)
+        """, [todo, done, organization_id, done])
+        cursor.execute(f"""
+            {columns}
+            SELECT t.id, t.organization_id, t.project_id, %s,
+                   CASE WHEN t.status = %s THEN %s ELSE t.status END, t.created_at
+            FROM {tasks} t
+            WHERE t.organization_id = %s
+              AND NOT EXISTS (SELECT 1 FROM {history} h WHERE h.task_id = t.id AND h.from_status = %s)
+        """, [created, done, todo, organization_id, created])
+
+
+# Velocity ----------------------------------------------------------------------
+
+GRANULARITIES = {'DAY': None, 'WEEK': TruncWeek, 'MONTH': TruncMonth}
+
+# Bounds a response to about ten years of days.
+MAX_VELOCITY_BUCKETS = 3660
+
+
+def _period_start(day, granularity):
+    if granularity == 'WEEK':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'MONTH':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(start, granularity):
+    if granularity == 'WEEK':
+        return start + timedelta(days=7)
+    if granularity == 'MONTH':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def velocity(throughput, date_from, date_to, granularity='DAY'):
+    """
+    Tasks created, completed and reopened per day, week (from Monday) or
+    month between ``date_from`` and ``date_to`` inclusive, read from the
+    daily buckets in ``throughput`` (a ProjectDailyThroughput or
+    OrganizationDailyThroughput queryset). Periods without activity are
+    included with zero counts.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+
+    starts = []
+    start = _period_start(date_from, granularity)
+    while start <= date_to:
+        starts.append(start)
+        if len(starts) > MAX_VELOCITY_BUCKETS:
+            raise ValueError(f"Ranges are limited to {MAX_VELOCITY_BUCKETS} buckets; use a coarser granularity")
+        start = _next_period(start, granularity)
+
+    rows = throughput.filter(day__gte=date_from, day__lte=date_to).order_by()
+    truncate = GRANULARITIES[granularity]
+    period = truncate('day') if truncate else F('day')
+    rows = rows.annotate(period=period).values('period').annotate(
+        created=Sum('created'), completed=Sum('completed'), reopened=Sum('reopened'),
+    )
+    counts = {row.pop('period'): row for row in rows}
+    return [
+        {'start': start, **counts.get(start, {'created': 0, 'completed': 0, 'reopened': 0})}
+        for start in starts
+    ]
@@ -1,63 +1,218 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from django.db.models import Q, Count, Avg
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from graphql import GraphQLError, specified_directives
 import logging
-from .models import Organization, Project, Task, TaskComment
+from .db.inserts import insert_returning
+from .db.updates import UpdateConflict, update_returning
+from .incremental import DeferDirective, StreamDirective
+from . import deletion, jobs, rollups
+from .loaders import get_loaders
+from .models import (
+    Job,
+    Organization,
+    OrganizationDailyThroughput,
+    Project,
+    ProjectDailyThroughput,
+    Task,
+    TaskComment,
+)
+from .pagination import paginate
+from .tenancy import get_organization, organization_id
 
 logger = logging.getLogger(__name__)
 
 
 # GraphQL Types
+class TaskCountType(graphene.ObjectType):
+    key = graphene.String()
+    count = graphene.Int()
+
+
+class TaskBreakdownType(graphene.ObjectType):
+    status = graphene.String()
+    priority = graphene.String()
+    count = graphene.Int()
+    overdue = graphene.Int()
+
+
+class TaskAnalyticsType(graphene.ObjectType):
+    """Task statistics read from the rollup tables (see core.rollups)"""
+    total_tasks = graphene.Int()
+    completed_tasks = graphene.Int()
+    overdue_tasks = graphene.Int()
+    completion_rate = graphene.Float()
+    by_status = graphene.List(TaskCountType)
+    by_priority = graphene.List(TaskCountType)
+    breakdown = graphene.List(TaskBreakdownType)
+    overdue_as_of = graphene.DateTime(description='Open tasks due before this time are counted as overdue')
+
+
+def resolve_analytics(info, organization_id, rows):
+    """TaskAnalytics from rollup ``rows``, or None if the organization has no rollups yet"""
+    state = get_loaders(info.context).rollup_states.load(organization_id)
+    if not state:
+        return None
+    return rollups.summarize(rows, state[0]['overdue_before'])
+
+
+class VelocityGranularity(graphene.Enum):
+    DAY = 'DAY'
+    WEEK = 'WEEK'
+    MONTH = 'MONTH'
+
+
+class VelocityBucketType(graphene.ObjectType):
+    """Tasks created, completed (moved into DONE) and reopened in one period"""
+    start = graphene.Date()
+    created = graphene.Int()
+    completed = graphene.Int()
+    reopened = graphene.Int()
+
+
+def velocity_argument_fields():
+    return {
+        'date_from': graphene.Date(required=True, name='from'),
+        'date_to': graphene.Date(required=True, name='to'),
+        'granularity': VelocityGranularity(default_value=VelocityGranularity.DAY.value),
+    }
+
+
+def resolve_velocity(throughput, date_from, date_to, granularity):
+    try:
+        return rollups.velocity(throughput, date_from, date_to, getattr(granularity, 'value', granularity))
+    except ValueError as e:
+        raise GraphQLError(str(e))
+
+
+def related_list(of_type):
+    """A list of related rows, bounded like the root lists (core.pagination)"""
+    return graphene.NonNull(
+        graphene.List(graphene.NonNull(of_type)), limit=graphene.Int(), offset=graphene.Int()
+    )
+
+
+class ProjectOrder(graphene.Enum):
+    """Sort keys of projects, each served by an index on the organization's projects"""
+    CREATED_AT_ASC = 'created_at'
+    CREATED_AT_DESC = '-created_at'
+    UPDATED_AT_ASC = 'updated_at'
+    UPDATED_AT_DESC = '-updated_at'
+    NAME_ASC = 'name'
+    NAME_DESC = '-name'
+    DUE_DATE_ASC = 'due_date'
+    DUE_DATE_DESC = '-due_date'
+
+
+class TaskOrder(graphene.Enum):
+    """Sort keys of tasks, each served by an index on the project's tasks"""
+    CREATED_AT_ASC = 'created_at'
+    CREATED_AT_DESC = '-created_at'
+    UPDATED_AT_ASC = 'updated_at'
+    UPDATED_AT_DESC = '-updated_at'
+    DUE_DATE_ASC = 'due_date'
+    DUE_DATE_DESC = '-due_date'
+    # By urgency (LOW < MEDIUM < HIGH < URGENT), the order of the codes.
+    PRIORITY_ASC = 'priority'
+    PRIORITY_DESC = '-priority'
+
+
+def apply_order(queryset, order_by, default):
+    """
+    Sort ``queryset`` by the ProjectOrder or TaskOrder keys ``order_by`` (or
+    ``default``), then by id in the direction of the last key, so that rows
+    with equal keys keep the same order from one page to the next.
+    """
+    keys = {}
+    for key in order_by or [default]:
+        key = getattr(key, 'value', key)
+        # A field sorted twice keeps its first direction.
+        keys.setdefault(key.lstrip('-'), key)
+    keys = list(keys.values())
+    return queryset.order_by(*keys, '-id' if keys[-1].startswith('-') else 'id')
+
+
 class OrganizationType(DjangoObjectType):
     class Meta:
         model = Organization
-        fields = '__all__'
-
+        # Tasks and comments are reached through projects, never as
+        # unbounded per-organization lists.
+        exclude = (
+            'tasks', 'task_comments', 'rollup_state', 'task_rollups', 'project_task_rollups',
+            'task_status_changes', 'daily_throughput', 'project_daily_throughput', 'jobs',
+        )
+
+    projects = related_list(lambda: ProjectType)
     project_count = graphene.Int()
     total_tasks = graphene.Int()
     completed_tasks = graphene.Int()
+    analytics = graphene.Field(TaskAnalyticsType)
+
+    def resolve_projects(self, info, limit=None, offset=None):
+        return paginate(info, self.projects.order_by('-created_at'), limit, offset)
 
     def resolve_project_count(self, info):
-        return self.projects.count()
+        return get_loaders(info.context).organization_projects.load(self.pk)['total']
 
     def resolve_total_tasks(self, info):
-        return Task.objects.filter(project__organization=self).count()
+        return get_loaders(info.context).organization_tasks.load(self.pk)['total']
 
     def resolve_completed_tasks(self, info):
-        return Task.objects.filter(project__organization=self, status='DONE').count()
+        return get_loaders(info.context).organization_tasks.load(self.pk)['done']
+
+    def resolve_analytics(self, info):
+        return resolve_analytics(info, self.pk, get_loaders(info.context).organization_rollups.load(self.pk))
 
 
 class ProjectType(DjangoObjectType):
     class Meta:
         model = Project
-        fields = '__all__'
+        exclude = ('task_rollups', 'task_status_changes', 'daily_throughput')
 
+    tasks = related_list(lambda: TaskType)
     task_count = graphene.Int()
     completed_tasks_count = graphene.Int()
     completion_rate = graphene.Float()
+    analytics = graphene.Field(TaskAnalyticsType)
+
+    def resolve_tasks(self, info, limit=None, offset=None):
+        tasks = Task.objects.filter(project=self, organization_id=self.organization_id)
+        return paginate(info, tasks.order_by('-created_at'), limit, offset)
 
     def resolve_task_count(self, info):
-        return self.task_count
+        return get_loaders(info.context).project_tasks.load(self.pk)['total']
 
     def resolve_completed_tasks_count(self, info):
-        return self.completed_tasks_count
+        return get_loaders(info.context).project_tasks.load(self.pk)['done']
 
     def resolve_completion_rate(self, info):
-        return self.completion_rate
+        stats = get_loaders(info.context).project_tasks.load(self.pk)
+        if stats['total'] == 0:
+            return 0
+        return round((stats['done'] / stats['total']) * 100, 2)
+
+    def resolve_analytics(self, info):
+        return resolve_analytics(
+            info, self.organization_id, get_loaders(info.context).project_rollups.load(self.pk)
+        )
 
 
 class TaskType(DjangoObjectType):
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = ('status_changes',)
 
+    comments = related_list(lambda: TaskCommentType)
     comment_count = graphene.Int()
 
+    def resolve_comments(self, info, limit=None, offset=None):
+        comments = TaskComment.objects.filter(task=self, organization_id=self.organization_id)
+        return paginate(info, comments.order_by('-created_at'), limit, offset)
+
     def resolve_comment_count(self, info):
-        return self.comments.count()
+        return get_loaders(info.context).task_comments.load(self.pk)['total']
 
 
 class TaskCommentType(DjangoObjectType):
@@ -66,10 +221,23 @@ class TaskCommentType(DjangoObjectType):
         fields = '__all__'
 
 
+JobKind = graphene.Enum('JobKind', [(kind.upper(), kind) for kind in jobs.public_kinds()])
+
+
+class JobType(DjangoObjectType):
+    """A background job (see core.jobs); poll it until it has finished"""
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'result', 'progress',
+            'last_error', 'created_at', 'finished_at',
+        )
+
+
 # Query Class
 class Query(graphene.ObjectType):
     # Organization queries
-    organizations = graphene.List(OrganizationType)
+    organizations = graphene.List(OrganizationType, limit=graphene.Int(), offset=graphene.Int())
     organization = graphene.Field(OrganizationType, slug=graphene.String(required=True))
     
     # Project queries with advanced filtering
@@ -78,7 +246,7 @@ class Query(graphene.ObjectType):
         organization_slug=graphene.String(required=True),
         status=graphene.String(),
         search=graphene.String(),
-        order_by=graphene.String(),
+        order_by=graphene.List(graphene.NonNull(ProjectOrder)),
         limit=graphene.Int(),
         offset=graphene.Int()
     )
@@ -94,10 +262,11 @@ class Query(graphene.ObjectType):
         project_id=graphene.ID(required=True),
         organization_slug=graphene.String(required=True),
         status=graphene.String(),
+        open_only=graphene.Boolean(description='Leave out tasks that are DONE'),
         priority=graphene.String(),
         assignee_email=graphene.String(),
         search=graphene.String(),
-        order_by=graphene.String(),
+        order_by=graphene.List(graphene.NonNull(TaskOrder)),
         limit=graphene.Int(),
         offset=graphene.Int()
     )
@@ -111,16 +280,50 @@ class Query(graphene.ObjectType):
     task_comments = graphene.List(
         TaskCommentType,
         task_id=graphene.ID(required=True),
+        organization_slug=graphene.String(required=True),
+        limit=graphene.Int(),
+        offset=graphene.Int()
+    )
+
+    # Throughput over time, read from the daily buckets in core.rollups
+    project_velocity = graphene.List(
+        VelocityBucketType,
+        project_id=graphene.ID(required=True),
+        organization_slug=graphene.String(required=True),
+        **velocity_argument_fields()
+    )
+    organization_velocity = graphene.List(
+        VelocityBucketType,
+        organization_slug=graphene.String(required=True),
+        **velocity_argument_fields()
+    )
+
+    # Background jobs of an organization, newest first
+    job = graphene.Field(
+        JobType,
+        id=graphene.ID(required=True),
         organization_slug=graphene.String(required=True)
     )
+    jobs = graphene.List(
+        JobType,
+        organization_slug=graphene.String(required=True),
+        status=graphene.String(),
+        limit=graphene.Int(),
+        offset=graphene.Int()
+    )
 
     # Organization resolvers
-    def resolve_organizations(self, info):
-        return Organization.objects.all()
+    def resolve_organizations(self, info, limit=None, offset=None):
+        organizations = paginate(info, Organization.objects.order_by('name', 'id'), limit, offset)
+        loaders = get_loaders(info.context)
+        for loader in (loaders.organization_tasks, loaders.organization_projects,
+                       loaders.organization_rollups, loaders.rollup_states):
+            loader.queue(o.pk for o in organizations)
+        return organizations
 
     def resolve_organization(self, info, slug):
         try:
-            return Organization.objects.get(slug=slug)
+            return get_organization(info.context, slug)
         except Organization.DoesNotExist:
             return None
 
@@ -128,8 +331,8 @@ class Query(graphene.ObjectType):
     def resolve_projects(self, info, organization_slug, status=None, search=None, 
                         order_by=None, limit=None, offset=None):
         try:
-            logger.info(f"Fetching projects for organization: {organization_slug}")
-            organization = Organization.objects.get(slug=organization_slug)
+            logger.info("Fetching projects for organization: %s", organization_slug)
+            organization = get_organization(info.context, organization_slug)
             projects = Project.objects.filter(organization=organization)
             
             # Apply filters
@@ -143,49 +346,41 @@ class Query(graphene.ObjectType):
                     Q(description__icontains=search)
                 )
             
-            # Apply ordering
-            if order_by:
-                if order_by.startswith('-'):
-                    projects = projects.order_by(order_by)
-                else:
-                    projects = projects.order_by(order_by)
-            else:
-                projects = projects.order_by('-created_at')
-            
-            # Apply pagination
-            if offset:
-                projects = projects[offset:]
-            if limit:
-                projects = projects[:limit]
-                
+            projects = apply_order(projects, order_by, ProjectOrder.CREATED_AT_DESC)
+            projects = paginate(info, projects, limit, offset)
+            loaders = get_loaders(info.context)
+            loaders.project_tasks.queue(p.pk for p in projects)
+            loaders.project_rollups.queue(p.pk for p in projects)
             return projects
         except Organization.DoesNotExist:
-            logger.error(f"Organization not found: {organization_slug}")
+            logger.error("Organization not found: %s", organization_slug)
             return []
         except Exception as e:
-            logger.error(f"Error fetching projects: {str(e)}")
+            logger.error("Error fetching projects: %s", e)
             return []
 
     def resolve_project(self, info, id, organization_slug):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
+            organization = get_organization(info.context, organization_slug)
             return Project.objects.get(id=id, organization=organization)
         except (Organization.DoesNotExist, Project.DoesNotExist):
             return None
 
     # Task resolvers with advanced filtering
-    def resolve_tasks(self, info, project_id, organization_slug, status=None, 
+    def resolve_tasks(self, info, project_id, organization_slug, status=None, open_only=False,
                      priority=None, assignee_email=None, search=None, 
                      order_by=None, limit=None, offset=None):
         try:
-            logger.info(f"Fetching tasks for project: {project_id}")
-            organization = Organization.objects.get(slug=organization_slug)
+            logger.info("Fetching tasks for project: %s", project_id)
+            organization = get_organization(info.context, organization_slug)
             project = Project.objects.get(id=project_id, organization=organization)
-            tasks = Task.objects.filter(project=project)
+            tasks = Task.objects.filter(project=project, organization=organization)
             
             # Apply filters
             if status:
                 tasks = tasks.filter(status=status)
+            if open_only:
+                tasks = tasks.exclude(status='DONE')
             if priority:
                 tasks = tasks.filter(priority=priority)
             if assignee_email:
@@ -199,44 +394,86 @@ class Query(graphene.ObjectType):
                     Q(assignee_email__icontains=search)
                 )
             
-            # Apply ordering
-            if order_by:
-                tasks = tasks.order_by(order_by)
-            else:
-                tasks = tasks.order_by('-created_at')
-            
-            # Apply pagination
-            if offset:
-                tasks = tasks[offset:]
-            if limit:
-                tasks = tasks[:limit]
-                
+            tasks = apply_order(tasks, order_by, TaskOrder.CREATED_AT_DESC)
+            tasks = paginate(info, tasks, limit, offset)
+            get_loaders(info.context).task_comments.queue(t.pk for t in tasks)
             return tasks
         except (Organization.DoesNotExist, Project.DoesNotExist) as e:
-            logger.error(f"Project or Organization not found: {str(e)}")
+            logger.error("Project or Organization not found: %s", e)
             return []
         except Exception as e:
-            logger.error(f"Error fetching tasks: {str(e)}")
+            logger.error("Error fetching tasks: %s", e)
             return []
 
     def resolve_task(self, info, id, organization_slug):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            return Task.objects.get(id=id, project__organization=organization)
+            organization = get_organization(info.context, organization_slug)
+            return Task.objects.get(id=id, organization=organization)
         except (Organization.DoesNotExist, Task.DoesNotExist):
             return None
 
     # Comment resolvers
-    def resolve_task_comments(self, info, task_id, organization_slug):
+    def resolve_task_comments(self, info, task_id, organization_slug, limit=None, offset=None):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            task = Task.objects.get(id=task_id, project__organization=organization)
-            return TaskComment.objects.filter(task=task)
+            organization = get_organization(info.context, organization_slug)
+            task = Task.objects.get(id=task_id, organization=organization)
         except (Organization.DoesNotExist, Task.DoesNotExist):
             return []
+        comments = TaskComment.objects.filter(task=task, organization=organization)
+        return paginate(info, comments.order_by('-created_at'), limit, offset)
+
+    # Velocity resolvers
+    def resolve_project_velocity(self, info, project_id, organization_slug, date_from, date_to,
+                                 granularity='DAY'):
+        try:
+            organization = get_organization(info.context, organization_slug)
+            project = Project.objects.get(id=project_id, organization=organization)
+        except (Organization.DoesNotExist, Project.DoesNotExist):
+            return []
+        throughput = ProjectDailyThroughput.objects.filter(project=project, organization=organization)
+        return resolve_velocity(throughput, date_from, date_to, granularity)
+
+    def resolve_organization_velocity(self, info, organization_slug, date_from, date_to, granularity='DAY'):
+        try:
+            organization = get_organization(info.context, organization_slug)
+        except Organization.DoesNotExist:
+            return []
+        throughput = OrganizationDailyThroughput.objects.filter(organization=organization)
+        return resolve_velocity(throughput, date_from, date_to, granularity)
+
+    # Job resolvers
+    def resolve_job(self, info, id, organization_slug):
+        try:
+            organization = get_organization(info.context, organization_slug)
+            return Job.objects.get(id=id, organization=organization)
+        except (Organization.DoesNotExist, Job.DoesNotExist):
+            return None
+
+    def resolve_jobs(self, info, organization_slug, status=None, limit=None, offset=None):
+        try:
+            organization = get_organization(info.context, organization_slug)
+        except Organization.DoesNotExist:
+            return []
+        queryset = Job.objects.filter(organization=organization)
+        if status:
+            queryset = queryset.filter(status=status)
+        return paginate(info, queryset.order_by('-created_at', '-id'), limit, offset)
 
 
 # Mutation Classes
+class UpdateConflictType(graphene.ObjectType):
+    """The stored state of a row that changed after the client read it"""
+    current_version = graphene.Int()
+    current_updated_at = graphene.DateTime()
+
+
+def conflict_from(error):
+    return UpdateConflictType(
+        current_version=error.current.version,
+        current_updated_at=error.current.updated_at,
+    )
+
+
 class CreateOrganization(graphene.Mutation):
     class Arguments:
         name = graphene.String(required=True)
@@ -279,14 +516,14 @@ class CreateOrganization(graphene.Mutation):
                 contact_email=contact_email.strip().lower()
             )
             
-            logger.info(f"Created organization: {organization.name}")
+            logger.info("Created organization: %s", organization.name)
             return CreateOrganization(
                 organization=organization,
                 success=True,
                 message="Organization created successfully"
             )
         except Exception as e:
-            logger.error(f"Error creating organization: {str(e)}")
+            logger.error("Error creating organization: %s", e)
             return CreateOrganization(
                 organization=None,
                 success=False,
@@ -308,7 +545,7 @@ class CreateProject(graphene.Mutation):
 
     def mutate(self, info, organization_slug, name, description="", status="ACTIVE", due_date=None):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
+            organization = get_organization(info.context, organization_slug)
             project = Project.objects.create(
                 organization=organization,
                 name=name,
@@ -343,26 +580,36 @@ class UpdateProject(graphene.Mutation):
         description = graphene.String()
         status = graphene.String()
         due_date = graphene.Date()
+        expected_version = graphene.Int(description='Only update if the project still has this version')
+        expected_updated_at = graphene.DateTime(description='Only update if the project was last updated at this time')
 
     project = graphene.Field(ProjectType)
     success = graphene.Boolean()
     message = graphene.String()
+    conflict = graphene.Field(UpdateConflictType)
 
-    def mutate(self, info, id, organization_slug, **kwargs):
+    def mutate(self, info, id, organization_slug, expected_version=None, expected_updated_at=None, **kwargs):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            project = Project.objects.get(id=id, organization=organization)
-            
-            for field, value in kwargs.items():
-                if value is not None:
-                    setattr(project, field, value)
-            
-            project.save()
+            organization = get_organization(info.context, organization_slug)
+            # One conditional UPDATE ... RETURNING of the fields given.
+            project = update_returning(
+                Project,
+                {'id': id, 'organization_id': organization.pk},
+                {field: value for field, value in kwargs.items() if value is not None},
+                expected={'version': expected_version, 'updated_at': expected_updated_at},
+            )
             return UpdateProject(
                 project=project,
                 success=True,
                 message="Project updated successfully"
             )
+        except UpdateConflict as e:
+            return UpdateProject(
+                project=e.current,
+                success=False,
+                message="Project was changed by someone else; reload it and try again",
+                conflict=conflict_from(e)
+            )
         except (Organization.DoesNotExist, Project.DoesNotExist):
             return UpdateProject(
                 project=None,
@@ -394,18 +641,16 @@ class CreateTask(graphene.Mutation):
 
     def mutate(self, info, project_id, organization_slug, title, **kwargs):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            project = Project.objects.get(id=project_id, organization=organization)
-            
-            task = Task.objects.create(
-                project=project,
-                title=title,
-                description=kwargs.get('description', ''),
-                status=kwargs.get('status', 'TODO'),
-                priority=kwargs.get('priority', 'MEDIUM'),
-                assignee_email=kwargs.get('assignee_email', ''),
-                due_date=kwargs.get('due_date')
+            # The tenant check and the insert are one INSERT ... SELECT: no
+            # row is inserted unless the project belongs to the organization.
+            task = insert_returning(
+                Task,
+                {'title': title, **{field: value for field, value in kwargs.items() if value is not None}},
+                Project.objects.filter(id=project_id, organization_id=organization_id(organization_slug)),
+                {'project_id': 'id', 'organization_id': 'organization_id'},
             )
+            if task is None:
+                raise Project.DoesNotExist
             return CreateTask(
                 task=task,
                 success=True,
@@ -435,26 +680,38 @@ class UpdateTask(graphene.Mutation):
         priority = graphene.String()
         assignee_email = graphene.String()
         due_date = graphene.DateTime()
+        expected_version = graphene.Int(description='Only update if the task still has this version')
+        expected_updated_at = graphene.DateTime(description='Only update if the task was last updated at this time')
 
     task = graphene.Field(TaskType)
     success = graphene.Boolean()
     message = graphene.String()
+    conflict = graphene.Field(UpdateConflictType)
 
-    def mutate(self, info, id, organization_slug, **kwargs):
+    def mutate(self, info, id, organization_slug, expected_version=None, expected_updated_at=None, **kwargs):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            task = Task.objects.get(id=id, project__organization=organization)
-            
-            for field, value in kwargs.items():
-                if value is not None:
-                    setattr(task, field, value)
-            
-            task.save()
+            organization = get_organization(info.context, organization_slug)
+            # One conditional UPDATE ... RETURNING, which locks the row and
+            # hands the rollups the cell the task leaves.
+            task = update_returning(
+                Task,
+                {'id': id, 'organization_id': organization.pk},
+                {field: value for field, value in kwargs.items() if value is not None},
+                expected={'version': expected_version, 'updated_at': expected_updated_at},
+                previous=rollups.CELL_FIELDS,
+            )
             return UpdateTask(
                 task=task,
                 success=True,
                 message="Task updated successfully"
             )
+        except UpdateConflict as e:
+            return UpdateTask(
+                task=e.current,
+                success=False,
+                message="Task was changed by someone else; reload it and try again",
+                conflict=conflict_from(e)
+            )
         except (Organization.DoesNotExist, Task.DoesNotExist):
             return UpdateTask(
                 task=None,
@@ -482,14 +739,14 @@ class CreateTaskComment(graphene.Mutation):
 
     def mutate(self, info, task_id, organization_slug, content, author_email):
         try:
-            organization = Organization.objects.get(slug=organization_slug)
-            task = Task.objects.get(id=task_id, project__organization=organization)
-            
-            comment = TaskComment.objects.create(
-                task=task,
-                content=content,
-                author_email=author_email
+            comment = insert_returning(
+                TaskComment,
+                {'content': content, 'author_email': author_email},
+                Task.objects.filter(id=task_id, organization_id=organization_id(organization_slug)),
+                {'task_id': 'id', 'organization_id': 'organization_id'},
             )
+            if comment is None:
+                raise Task.DoesNotExist
             return CreateTaskComment(
                 comment=comment,
                 success=True,
@@ -509,6 +766,124 @@ class CreateTaskComment(graphene.Mutation):
             )
 
 
+class EnqueueJob(graphene.Mutation):
+    """Queue background work for an organization; poll ``job`` for its outcome"""
+    class Arguments:
+        organization_slug = graphene.String(required=True)
+        kind = JobKind(required=True)
+
+    job = graphene.Field(JobType)
+    success = graphene.Boolean()
+    message = graphene.String()
+
+    def mutate(self, info, organization_slug, kind):
+        try:
+            organization = get_organization(info.context, organization_slug)
+            job = jobs.enqueue(getattr(kind, 'value', kind), organization=organization)
+            return EnqueueJob(
+                job=job,
+                success=True,
+                message="Job queued"
+            )
+        except Organization.DoesNotExist:
+            return EnqueueJob(
+                job=None,
+                success=False,
+                message="Organization not found"
+            )
+        except Exception as e:
+            return EnqueueJob(
+                job=None,
+                success=False,
+                message=str(e)
+            )
+
+
+class DeleteProject(graphene.Mutation):
+    """
+    Delete a project and its tasks in the background, in batches; poll
+    ``job`` for its progress. The project is gone once the job succeeds.
+    """
+    class Arguments:
+        id = graphene.ID(required=True)
+        organization_slug = graphene.String(required=True)
+        archive = graphene.Boolean(
+            description='Move the project, which must be completed, to the archive tables instead'
+        )
+
+    job = graphene.Field(JobType)
+    success = graphene.Boolean()
+    message = graphene.String()
+
+    def mutate(self, info, id, organization_slug, archive=False):
+        try:
+            organization = get_organization(info.context, organization_slug)
+            project = Project.objects.get(id=id, organization=organization)
+            if archive and project.status != deletion.COMPLETED:
+                return DeleteProject(
+                    job=None,
+                    success=False,
+                    message="Only completed projects can be archived"
+                )
+            job = jobs.enqueue('delete_project', organization=organization, payload={
+                'organization_id': organization.pk, 'project_id': project.pk, 'archive': bool(archive),
+            })
+            return DeleteProject(
+                job=job,
+                success=True,
+                message="Project archiving queued" if archive else "Project deletion queued"
+            )
+        except (Organization.DoesNotExist, Project.DoesNotExist):
+            return DeleteProject(
+                job=None,
+                success=False,
+                message="Project or Organization not found"
+            )
+        except Exception as e:
+            return DeleteProject(
+                job=None,
+                success=False,
+                message=str(e)
+            )
+
+
+class DeleteOrganization(graphene.Mutation):
+    """
+    Delete an organization and everything in it in the background, in
+    batches; poll ``job`` for its progress until the organization is gone.
+    """
+    class Arguments:
+        slug = graphene.String(required=True)
+
+    job = graphene.Field(JobType)
+    success = graphene.Boolean()
+    message = graphene.String()
+
+    def mutate(self, info, slug):
+        try:
+            organization = get_organization(info.context, slug)
+            job = jobs.enqueue('delete_organization', organization=organization, payload={
+                'organization_id': organization.pk,
+            })
+            return DeleteOrganization(
+                job=job,
+                success=True,
+                message="Organization deletion queued"
+            )
+        except Organization.DoesNotExist:
+            return DeleteOrganization(
+                job=None,
+                success=False,
+                message="Organization not found"
+            )
+        except Exception as e:
+            return DeleteOrganization(
+                job=None,
+                success=False,
+                message=str(e)
+            )
+
+
 class Mutation(graphene.ObjectType):
     create_organization = CreateOrganization.Field()
     create_project = CreateProject.Field()
@@ -516,7 +891,14 @@ class Mutation(graphene.ObjectType):
     create_task = CreateTask.Field()
     update_task = UpdateTask.Field()
     create_task_comment = CreateTaskComment.Field()
+    enqueue_job = EnqueueJob.Field()
+    delete_project = DeleteProject.Field()
+    delete_organization = DeleteOrganization.Field()
 
 
 # Schema
-schema = graphene.Schema(query=Query, mutation=Mutation)
+schema = graphene.Schema(
+    query=Query,
+    mutation=Mutation,
+    directives=[*specified_directives, DeferDirective, StreamDirective],
+)
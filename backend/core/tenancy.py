@@ -0,0 +1,116 @@
+"""
+Organization resolution for resolvers and mutations.
+
+Every tenant-scoped operation starts by turning an organization slug into
+an Organization. Two caches keep that cheap:
+
+* a per-request memo on the request object, so sibling fields and the
+  mutations of one request share a single lookup;
+* a process-wide LRU of slug -> id, so later requests fetch by primary key.
+
+An LRU entry is only a hint: the organization fetched by id must still
+carry the slug, otherwise the entry is dropped and the slug is looked up
+again. Renames and deletes in this process evict entries straight away;
+the slug check covers changes made by other processes.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Organization
+
+_REQUEST_ATTR = '_organizations_by_slug'
+
+
+class SlugCache:
+    """Thread-safe LRU of organization slug -> id"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        with self._lock:
+            org_id = self._entries.get(slug)
+            if org_id is not None:
+                self._entries.move_to_end(slug)
+            return org_id
+
+    def set(self, slug, org_id):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[slug] = org_id
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, slug=None, org_id=None):
+        """Drop the entry for ``slug`` and every entry pointing at ``org_id``"""
+        with self._lock:
+            if slug is not None:
+                self._entries.pop(slug, None)
+            if org_id is not None:
+                for stale in [s for s, i in self._entries.items() if i == org_id]:
+                    del self._entries[stale]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+slug_cache = SlugCache(getattr(settings, 'ORGANIZATION_SLUG_CACHE_SIZE', 1024))
+
+
+def _fetch(slug):
+    org_id = slug_cache.get(slug)
+    if org_id is not None:
+        organization = Organization.objects.filter(pk=org_id).first()
+        if organization is not None and organization.slug == slug:
+            return organization
+        slug_cache.discard(slug=slug)
+
+    organization = Organization.objects.get(slug=slug)
+    slug_cache.set(slug, organization.pk)
+    return organization
+
+
+def get_organization(request, slug):
+    """
+    Return the Organization for ``slug``, raising Organization.DoesNotExist
+    like ``Organization.objects.get``. ``request`` is the resolver's
+    ``info.context`` and may be None outside of an HTTP request.
+    """
+    memo = getattr(request, _REQUEST_ATTR, None)
+    if memo is None:
+        memo = {}
+        if request is not None:
+            setattr(request, _REQUEST_ATTR, memo)
+
+    # Misses are not memoized: a later mutation in the request may create it.
+    if slug not in memo:
+        memo[slug] = _fetch(slug)
+    return memo[slug]
+
+
+def organization_id(slug):
+    """
+    A subquery of the id of the organization with ``slug``, for checking a
+    tenant inside the statement that needs it. Compared with a partitioned
+    table's organization_id, it lets PostgreSQL prune partitions at run time.
+    """
+    return Organization.objects.filter(slug=slug).order_by().values('id')[:1]
+
+
+def forget_organization(organization):
+    """Drop ``organization`` from the cross-request cache"""
+    slug_cache.discard(slug=organization.slug, org_id=organization.pk)
+
+
+def organization_changed(sender, instance, **kwargs):
+    forget_organization(instance)
@@ -1,11 +1,24 @@
-from django.test import TestCase, TransactionTestCase
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from graphene.test import Client
+from graphql import get_introspection_query
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 from unittest.mock import patch
+from datetime import timedelta
+import gzip
 import json
+import tempfile
+from . import introspection
 from .schema import schema
-from .models import Organization, Project, Task, TaskComment
+from .models import Organization, Project, ProjectTaskRollup, Task, TaskComment
+from .compression import parse_accept_encoding
+from .tenancy import get_organization, slug_cache
 
 
 class AdvancedModelTestCase(TestCase):
@@ -79,6 +92,44 @@ class AdvancedModelTestCase(TestCase):
         
         self.assertEqual(task.organization, self.organization)
 
+    def test_project_move_updates_task_organization(self):
+        """Test that moving a project carries its tasks and comments along"""
+        project = Project.objects.create(
+            organization=self.organization,
+            name="Moving Project"
+        )
+        task = Task.objects.create(project=project, title="Moving Task")
+        comment = TaskComment.objects.create(
+            task=task,
+            content="Moving comment",
+            author_email="mover@example.com"
+        )
+        other = Organization.objects.create(
+            name="Other Org",
+            contact_email="other@example.com"
+        )
+
+        project.organization = other
+        project.save()
+
+        task.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(task.organization, other)
+        self.assertEqual(comment.organization, other)
+
+    def test_project_rename_leaves_tasks_alone(self):
+        """Test that saving a project that stays put writes only the project"""
+        project = Project.objects.create(organization=self.organization, name="Renamed Project")
+        Task.objects.create(project=project, title="Untouched Task")
+        project = Project.objects.get(pk=project.pk)
+
+        project.name = "Renamed Again"
+        with CaptureQueriesContext(connection) as queries:
+            project.save()
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 1, statements)
+        self.assertIn('UPDATE "core_project"', statements[0])
+
 
 class AdvancedGraphQLTestCase(TestCase):
     """Advanced GraphQL testing with complex scenarios"""
@@ -181,13 +232,15 @@ class AdvancedGraphQLTestCase(TestCase):
         )
         
         query = '''
-            query($projectId: ID!, $organizationSlug: String!, $priority: String, $assigneeEmail: String, $search: String) {
+            query($projectId: ID!, $organizationSlug: String!, $priority: String, $assigneeEmail: String, $search: String,
+                  $openOnly: Boolean) {
                 tasks(
                     projectId: $projectId,
                     organizationSlug: $organizationSlug,
                     priority: $priority,
                     assigneeEmail: $assigneeEmail,
-                    search: $search
+                    search: $search,
+                    openOnly: $openOnly
                 ) {
                     id
                     title
@@ -221,7 +274,56 @@ class AdvancedGraphQLTestCase(TestCase):
         result = self.client.execute(query, variables=variables)
         tasks = result['data']['tasks']
         self.assertEqual(len(tasks), 2)  # Should find both tasks assigned to john
+
+        # Test leaving out finished tasks
+        variables = {
+            'projectId': str(self.project1.id),
+            'organizationSlug': self.org1.slug,
+            'openOnly': True
+        }
+
+        result = self.client.execute(query, variables=variables)
+        tasks = result['data']['tasks']
+        self.assertEqual({task['status'] for task in tasks}, {'TODO', 'IN_PROGRESS'})
     
+    def test_task_sort_keys(self):
+        """Test multi-key sorts, priority by rank and the id tiebreaker"""
+        due = timezone.now()
+        for title, priority, due_date in [
+            ("Low", 'LOW', None),
+            ("Urgent later", 'URGENT', due + timedelta(days=2)),
+            ("Urgent sooner", 'URGENT', due + timedelta(days=1)),
+            ("Medium A", 'MEDIUM', due),
+            ("Medium B", 'MEDIUM', due),
+        ]:
+            Task.objects.create(project=self.project1, title=title, priority=priority, due_date=due_date)
+        query = '''
+            query($projectId: ID!, $organizationSlug: String!, $orderBy: [TaskOrder!]) {
+                tasks(projectId: $projectId, organizationSlug: $organizationSlug, orderBy: $orderBy) { title }
+            }
+        '''
+
+        def titles(order_by):
+            result = self.client.execute(query, variables={
+                'projectId': str(self.project1.id), 'organizationSlug': self.org1.slug, 'orderBy': order_by,
+            })
+            self.assertNotIn('errors', result)
+            return [task['title'] for task in result['data']['tasks']]
+
+        self.assertEqual(
+            titles(['PRIORITY_DESC', 'DUE_DATE_ASC']),
+            ["Urgent sooner", "Urgent later", "Medium A", "Medium B", "Low"],
+        )
+        # Equal keys fall back to id in the direction of the last key.
+        self.assertEqual(titles(['PRIORITY_ASC', 'DUE_DATE_DESC'])[1:3], ["Medium B", "Medium A"])
+        self.assertEqual(titles('PRIORITY_ASC')[0], "Low")
+
+        # Sort keys are a closed set; raw column names are rejected, not ignored.
+        result = self.client.execute(query, variables={
+            'projectId': str(self.project1.id), 'organizationSlug': self.org1.slug, 'orderBy': ['-description'],
+        })
+        self.assertIn('errors', result)
+
     def test_multi_tenancy_isolation_strict(self):
         """Strict test for multi-tenancy isolation"""
         # Create task in org1
@@ -384,3 +486,645 @@ class PerformanceTestCase(TransactionTestCase):
         # Should not error but return None
         self.assertIsNone(result.get('errors'))
         self.assertIsNone(result['data']['organization'])
+
+
+class OrganizationResolutionTestCase(TestCase):
+    """Tests for the organization slug caches"""
+
+    def setUp(self):
+        slug_cache.clear()
+        self.organization = Organization.objects.create(
+            name="Cached Org",
+            contact_email="cached@example.com"
+        )
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_request_resolves_slug_once(self):
+        """Test that sibling fields share one organization lookup"""
+        query = '''
+            query($slug: String!) {
+                organization(slug: $slug) { name }
+                projects(organizationSlug: $slug) { name }
+            }
+        '''
+        # One organization lookup plus the projects query.
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                '/graphql/',
+                {'query': query, 'variables': {'slug': self.organization.slug}},
+                content_type='application/json'
+            )
+        self.assertEqual(response.json()['data']['organization']['name'], "Cached Org")
+        self.assertEqual(slug_cache.get(self.organization.slug), self.organization.id)
+
+    def test_rename_and_delete_invalidate(self):
+        """Test that stale slugs stop resolving after rename or delete"""
+        old_slug = self.organization.slug
+        get_organization(None, old_slug)
+        self.organization.slug = 'renamed-org'
+        self.organization.save()
+        self.assertIsNone(slug_cache.get(old_slug))
+        with self.assertRaises(Organization.DoesNotExist):
+            get_organization(None, old_slug)
+
+        get_organization(None, 'renamed-org')
+        self.organization.delete()
+        self.assertEqual(len(slug_cache), 0)
+        with self.assertRaises(Organization.DoesNotExist):
+            get_organization(None, 'renamed-org')
+
+    def test_stale_entry_is_verified(self):
+        """Test that an entry left by another process is checked against the slug"""
+        other = Organization.objects.create(name="Other Org", contact_email="o@example.com")
+        slug_cache.set(self.organization.slug, other.id)
+        self.assertEqual(get_organization(None, self.organization.slug), self.organization)
+
+
+class HTTPCachingTestCase(TestCase):
+    """Tests for ETag and Cache-Control handling of GET queries"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name="Cached Org",
+            contact_email="cached@example.com"
+        )
+        self.query = '{ organization(slug: "%s") { name } }' % self.organization.slug
+
+    def test_get_query_revalidates_with_etag(self):
+        """Test that a repeated GET with If-None-Match gets a 304"""
+        response = self.client.get('/graphql/', {'query': self.query}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('s-maxage=10', response['Cache-Control'])
+        self.assertIn('max-age=0', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        response = self.client.get(
+            '/graphql/', {'query': self.query}, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.organization.contact_email = "changed@example.com"
+        self.organization.name = "Renamed Org"
+        self.organization.save()
+        response = self.client.get(
+            '/graphql/', {'query': self.query}, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_uncacheable_operations(self):
+        """Test that POSTs, mutations and uncached fields are marked no-store"""
+        response = self.client.post('/graphql/', {'query': self.query}, content_type='application/json')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+
+        response = self.client.get(
+            '/graphql/', {'query': '{ jobs(organizationSlug: "%s") { id } }' % self.organization.slug},
+            HTTP_ACCEPT='application/json'
+        )
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_introspection_is_tagged_with_the_schema_version(self):
+        """Test that introspection results carry an ETag that changes only with the schema"""
+        query = '{ __schema { queryType { name } } }'
+        response = self.client.get('/graphql/', {'query': query}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertTrue(etag.startswith(f'"{introspection.schema_version(schema.graphql_schema)}-'))
+
+        response = self.client.get(
+            '/graphql/', {'query': query}, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        with patch.object(introspection, 'schema_version', return_value='0' * 16):
+            response = self.client.get(
+                '/graphql/', {'query': query}, HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ResponseEncodingTestCase(TestCase):
+    """Tests for response compression and JSON serialization"""
+
+    def setUp(self):
+        Organization.objects.create(name="Encoded Org", contact_email="encoded@example.com")
+        self.query = {'query': '{ organizations { name contactEmail } }'}
+
+    @override_settings(GRAPHQL_COMPRESS_MIN_BYTES=10)
+    def test_negotiates_content_encoding(self):
+        """Test that large responses are compressed with an accepted coding"""
+        for i in range(20):
+            Organization.objects.create(name=f"Repeated Org {i}", contact_email=f"org{i}@example.com")
+        response = self.client.post(
+            '/graphql/', self.query, content_type='application/json', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(body['data']['organizations'][0]['name'], "Encoded Org")
+
+        response = self.client.post(
+            '/graphql/', self.query, content_type='application/json',
+            HTTP_ACCEPT_ENCODING='gzip;q=0, identity'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_small_responses_are_not_compressed(self):
+        """Test that responses under the threshold are sent as they are"""
+        response = self.client.post(
+            '/graphql/', self.query, content_type='application/json', HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json()['data']['organizations'][0]['contactEmail'], "encoded@example.com")
+
+    def test_accept_encoding_parsing(self):
+        """Test q-values in Accept-Encoding"""
+        self.assertEqual(
+            parse_accept_encoding('br;q=1.0, gzip;q=0.5, *;q=0'),
+            {'br': 1.0, 'gzip': 0.5, '*': 0.0}
+        )
+
+
+class IncrementalDeliveryTestCase(TestCase):
+    """Tests for @defer and @stream over multipart/mixed"""
+
+    ACCEPT = 'multipart/mixed; deferSpec=20220824, application/json'
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Deferred Org", contact_email="deferred@example.com")
+        for i in range(3):
+            project = Project.objects.create(organization=self.org, name=f"Project {i}")
+            for j in range(4):
+                Task.objects.create(project=project, title=f"Task {i}.{j}", status='DONE' if j % 2 else 'TODO')
+
+    def post(self, query, accept=ACCEPT):
+        return self.client.post(
+            '/graphql/', {'query': query, 'variables': {'slug': self.org.slug}},
+            content_type='application/json', HTTP_ACCEPT=accept,
+        )
+
+    def parts(self, response):
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.endswith('\r\n-----\r\n'))
+        chunks = body[:-len('\r\n-----\r\n')].split('\r\n---\r\n')[1:]
+        return [json.loads(chunk.split('\r\n\r\n', 1)[1]) for chunk in chunks]
+
+    def test_deferred_fragments_arrive_as_incremental_payloads(self):
+        """Test that deferred fields are left out of the first part and sent later"""
+        response = self.post('''
+            query($slug: String!) {
+                organization(slug: $slug) { name ...Totals @defer(label: "totals") }
+                projects(organizationSlug: $slug) { name ... @defer { taskCount completionRate } }
+            }
+            fragment Totals on OrganizationType { totalTasks completedTasks }
+        ''')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('multipart/mixed'))
+        initial, *rest = self.parts(response)
+
+        self.assertEqual(initial['data']['organization'], {'name': "Deferred Org"})
+        self.assertEqual(len(initial['data']['projects']), 3)
+        self.assertNotIn('taskCount', initial['data']['projects'][0])
+        self.assertTrue(initial['hasNext'])
+
+        self.assertEqual(rest[0]['incremental'], [{
+            'data': {'totalTasks': 12, 'completedTasks': 6}, 'path': ['organization'], 'label': 'totals',
+        }])
+        project_payloads = rest[1]['incremental']
+        self.assertEqual([entry['path'] for entry in project_payloads], [['projects', i] for i in range(3)])
+        self.assertEqual(project_payloads[0]['data'], {'taskCount': 4, 'completionRate': 50.0})
+        self.assertFalse(rest[-1]['hasNext'])
+
+    def test_streamed_list_sends_initial_count_first(self):
+        """Test that @stream sends initialCount items, then the rest from that index"""
+        project = Project.objects.get(name="Project 0")
+        response = self.client.post('/graphql/', {
+            'query': '''query($projectId: ID!, $slug: String!) {
+                tasks(projectId: $projectId, organizationSlug: $slug) @stream(initialCount: 1) { title }
+            }''',
+            'variables': {'projectId': project.id, 'slug': self.org.slug},
+        }, content_type='application/json', HTTP_ACCEPT=self.ACCEPT)
+        initial, rest = self.parts(response)
+
+        self.assertEqual(len(initial['data']['tasks']), 1)
+        self.assertEqual(rest['incremental'][0]['path'], ['tasks', 1])
+        titles = [task['title'] for task in initial['data']['tasks'] + rest['incremental'][0]['items']]
+        self.assertEqual(sorted(titles), [f"Task 0.{j}" for j in range(4)])
+        self.assertFalse(rest['hasNext'])
+
+    def test_operation_is_executed_once(self):
+        """Test that later payloads resolve from the objects the initial one loaded"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post('''
+                query($slug: String!) {
+                    projects(organizationSlug: $slug) @stream(initialCount: 1) { name ... @defer { taskCount } }
+                }
+            ''')
+            initial, *rest = self.parts(response)
+
+        self.assertEqual(len(initial['data']['projects']), 1)
+        self.assertEqual(len(rest[0]['incremental'][0]['items']), 2)
+        self.assertEqual(
+            [(entry['path'], entry['data']) for entry in rest[1]['incremental']],
+            [(['projects', i], {'taskCount': 4}) for i in range(3)],
+        )
+        # The list resolver ran once, and the counts of all three projects
+        # were loaded together.
+        self.assertEqual(sum('FROM "core_project"' in query['sql'] for query in queries), 1)
+        self.assertEqual(sum('FROM "core_task"' in query['sql'] for query in queries), 1)
+
+    def test_plain_json_without_multipart_accept(self):
+        """Test that clients not accepting multipart get the whole result at once"""
+        response = self.post(
+            'query($slug: String!) { organization(slug: $slug) { name ... @defer { totalTasks } } }',
+            accept='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['organization'], {'name': "Deferred Org", 'totalTasks': 12})
+
+    def test_disabled_defer_is_inlined(self):
+        """Test that @defer(if: false) keeps the fragment in a single JSON response"""
+        response = self.post(
+            'query($slug: String!) { organization(slug: $slug) { name ... @defer(if: false) { totalTasks } } }'
+        )
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['data']['organization']['totalTasks'], 12)
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+class BatchedOperationsTestCase(TestCase):
+    """Tests for several operations sent in one POST"""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Batch Org", contact_email="batch@example.com")
+        self.projects = [
+            Project.objects.create(organization=self.org, name=f"Batch Project {i}") for i in range(3)
+        ]
+        for project in self.projects:
+            Task.objects.create(project=project, title="Batch Task", status='DONE')
+            Task.objects.create(project=project, title="Open Task")
+
+    def post(self, operations):
+        return self.client.post('/graphql/', operations, content_type='application/json')
+
+    def test_results_come_back_in_order(self):
+        """Test that a JSON array of operations returns an array of results"""
+        response = self.post([
+            {'query': 'query($slug: String!) { organization(slug: $slug) { name totalTasks } }',
+             'variables': {'slug': self.org.slug}},
+            {'query': 'query($slug: String!) { projects(organizationSlug: $slug) { name } }',
+             'variables': {'slug': self.org.slug}},
+            {'query': '{ nonexistentField }'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        first, second, third = response.json()
+        self.assertEqual(first['data']['organization'], {'name': "Batch Org", 'totalTasks': 6})
+        self.assertEqual(len(second['data']['projects']), 3)
+        self.assertEqual(third['status'], 400)
+        self.assertIn('errors', third)
+
+    def test_operations_share_request_caches(self):
+        """Test that the organization lookup and aggregate loaders are shared"""
+        stats = 'query($slug: String!) { projects(organizationSlug: $slug) { taskCount completionRate } }'
+        operation = {'query': stats, 'variables': {'slug': self.org.slug}}
+        slug_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([operation, operation])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[1]['data']['projects'][0], {'taskCount': 2, 'completionRate': 50.0})
+        organization_lookups = [q for q in queries if 'FROM "core_organization"' in q['sql']]
+        task_counts = [q for q in queries if 'COUNT(' in q['sql']]
+        self.assertEqual(len(organization_lookups), 1)
+        self.assertEqual(len(task_counts), 1)
+
+    def test_mutation_results_are_visible_to_later_operations(self):
+        """Test that aggregates loaded before a mutation are reloaded after it"""
+        project = self.projects[0]
+        count = {
+            'query': 'query($id: ID!, $slug: String!) { project(id: $id, organizationSlug: $slug) { taskCount } }',
+            'variables': {'id': project.id, 'slug': self.org.slug},
+        }
+        create = {
+            'query': '''mutation($projectId: ID!, $slug: String!) {
+                createTask(projectId: $projectId, organizationSlug: $slug, title: "Batched") { success }
+            }''',
+            'variables': {'projectId': project.id, 'slug': self.org.slug},
+        }
+        before, created, after = self.post([count, create, count]).json()
+        self.assertEqual(before['data']['project']['taskCount'], 2)
+        self.assertTrue(created['data']['createTask']['success'])
+        self.assertEqual(after['data']['project']['taskCount'], 3)
+
+    @override_settings(GRAPHQL_BATCH_MAX_OPERATIONS=2)
+    def test_batch_size_is_limited(self):
+        """Test that oversized batches are rejected before anything runs"""
+        response = self.post([{'query': '{ organizations { id } }'}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 2', response.json()['errors'][0]['message'])
+
+
+class OptimisticConcurrencyTestCase(TestCase):
+    """Tests for version-checked updates"""
+
+    UPDATE_TASK = '''mutation($id: ID!, $slug: String!, $status: String, $title: String,
+                               $expectedVersion: Int, $expectedUpdatedAt: DateTime) {
+        updateTask(id: $id, organizationSlug: $slug, status: $status, title: $title,
+                   expectedVersion: $expectedVersion, expectedUpdatedAt: $expectedUpdatedAt) {
+            success message task { title status version } conflict { currentVersion currentUpdatedAt }
+        }
+    }'''
+
+    def setUp(self):
+        self.client = Client(schema)
+        self.org = Organization.objects.create(name="Versioned Org", contact_email="versions@example.com")
+        self.project = Project.objects.create(organization=self.org, name="Versioned Project")
+        self.task = Task.objects.create(project=self.project, title="Versioned Task", description="Kept")
+
+    def update_task(self, **variables):
+        result = self.client.execute(self.UPDATE_TASK, variables={
+            'id': self.task.id, 'slug': self.org.slug, **variables,
+        })
+        return result['data']['updateTask']
+
+    def test_update_writes_changed_columns_once(self):
+        """Test that an update is a single UPDATE of the changed columns returning the new row"""
+        with CaptureQueriesContext(connection) as queries:
+            result = self.update_task(status='IN_PROGRESS', expectedVersion=1)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['task'], {'title': "Versioned Task", 'status': 'IN_PROGRESS', 'version': 2})
+        self.assertIsNone(result['conflict'])
+
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_task"')]
+        self.assertEqual(len(updates), 1)
+        assignments = updates[0].split(' SET ')[1].split(' WHERE ')[0]
+        self.assertIn('"status"', assignments)
+        self.assertNotIn('"description"', assignments)
+        self.assertIn('RETURNING', updates[0])
+
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.description, self.task.version), ('IN_PROGRESS', "Kept", 2))
+        self.assertEqual(
+            list(self.task.status_changes.values_list('from_status', 'to_status')),
+            [('', 'TODO'), ('TODO', 'IN_PROGRESS')],
+        )
+
+    def test_stale_version_reports_conflict(self):
+        """Test that a write based on an old read is refused with the current state"""
+        self.update_task(title="First writer", expectedVersion=1)
+        result = self.update_task(title="Second writer", expectedVersion=1)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['conflict']['currentVersion'], 2)
+        self.assertEqual(result['task']['title'], "First writer")
+
+        stale = self.update_task(title="Third writer", expectedUpdatedAt='2000-01-01T00:00:00+00:00')
+        self.assertEqual(stale['conflict']['currentVersion'], 2)
+
+        self.task.refresh_from_db()
+        current = self.update_task(
+            title="Fresh writer", expectedUpdatedAt=self.task.updated_at.isoformat()
+        )
+        self.assertEqual(current['task'], {'title': "Fresh writer", 'status': 'TODO', 'version': 3})
+
+    def test_update_is_tenant_scoped(self):
+        """Test that another organization's slug neither updates nor reveals the task"""
+        other = Organization.objects.create(name="Other Versioned Org", contact_email="other@example.com")
+        result = self.update_task(title="Hijacked", slug=other.slug)
+        self.assertFalse(result['success'])
+        self.assertIsNone(result['task'])
+        self.assertIsNone(result['conflict'])
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.version), ("Versioned Task", 1))
+
+    def test_project_update_and_save_bump_versions(self):
+        """Test versioned project updates, and that ORM saves count as updates too"""
+        mutation = '''mutation($id: ID!, $slug: String!, $expectedVersion: Int) {
+            updateProject(id: $id, organizationSlug: $slug, status: "ON_HOLD", expectedVersion: $expectedVersion) {
+                success project { status version } conflict { currentVersion }
+            }
+        }'''
+        variables = {'id': self.project.id, 'slug': self.org.slug, 'expectedVersion': 1}
+        result = self.client.execute(mutation, variables=variables)['data']['updateProject']
+        self.assertEqual(result['project'], {'status': 'ON_HOLD', 'version': 2})
+
+        self.project.refresh_from_db()
+        self.project.save()
+        result = self.client.execute(mutation, variables={**variables, 'expectedVersion': 2})['data']['updateProject']
+        self.assertEqual(result['conflict'], {'currentVersion': 3})
+
+    @skipUnless(connection.vendor == 'postgresql', 'seed_tasks writes tasks with SQL on PostgreSQL only')
+    def test_seeded_tasks_start_at_version_one(self):
+        """Test that tasks seeded with one INSERT ... SELECT get a version"""
+        call_command('seed_tasks', '--orgs', '1', '--projects-per-org', '1', '--tasks', '5',
+                     '--prefix', 'Seeded', stdout=StringIO())
+        seeded = Task.objects.filter(organization__name__startswith="Seeded")
+        self.assertEqual(set(seeded.values_list('version', flat=True)), {1})
+        self.assertEqual(seeded.count(), 5)
+
+
+class SingleStatementCreateTestCase(TestCase):
+    """Tests for creating tasks and comments with one tenant-scoped INSERT ... SELECT"""
+
+    CREATE_TASK = '''mutation($projectId: ID!, $slug: String!, $title: String!, $priority: String) {
+        createTask(projectId: $projectId, organizationSlug: $slug, title: $title, priority: $priority) {
+            success message task { id title status priority version }
+        }
+    }'''
+    CREATE_COMMENT = '''mutation($taskId: ID!, $slug: String!) {
+        createTaskComment(taskId: $taskId, organizationSlug: $slug, content: "Noted",
+                          authorEmail: "author@example.com") {
+            success message comment { content task { id } }
+        }
+    }'''
+
+    def setUp(self):
+        self.client = Client(schema)
+        self.org = Organization.objects.create(name="Insert Org", contact_email="insert@example.com")
+        self.other = Organization.objects.create(name="Other Insert Org", contact_email="other@example.com")
+        self.project = Project.objects.create(organization=self.org, name="Insert Project")
+
+    def create_task(self, **variables):
+        result = self.client.execute(self.CREATE_TASK, variables={
+            'projectId': self.project.id, 'slug': self.org.slug, 'title': "Inserted", **variables,
+        })
+        return result['data']['createTask']
+
+    def test_create_task_is_one_insert(self):
+        """Test that the tenant check is part of the INSERT rather than separate lookups"""
+        with CaptureQueriesContext(connection) as queries:
+            result = self.create_task(priority='HIGH')
+        self.assertTrue(result['success'])
+        self.assertEqual(
+            {key: result['task'][key] for key in ('title', 'status', 'priority', 'version')},
+            {'title': "Inserted", 'status': 'TODO', 'priority': 'HIGH', 'version': 1},
+        )
+
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "core_task" ')]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn('"core_organization"', inserts[0])
+        self.assertIn('RETURNING', inserts[0])
+        lookups = [
+            q['sql'] for q in queries
+            if q['sql'].startswith('SELECT') and ('FROM "core_organization"' in q['sql'] or 'FROM "core_project"' in q['sql'])
+        ]
+        self.assertEqual(lookups, [])
+
+    def test_create_task_keeps_rollups_and_history(self):
+        """Test that post_save receivers still see the inserted task"""
+        task_id = self.create_task()['task']['id']
+        task = Task.objects.get(id=task_id)
+        self.assertEqual((task.organization_id, task.project_id), (self.org.id, self.project.id))
+        self.assertEqual(list(task.status_changes.values_list('from_status', 'to_status')), [('', 'TODO')])
+        self.assertEqual(
+            ProjectTaskRollup.objects.get(project=self.project, status='TODO', priority='MEDIUM').task_count, 1
+        )
+
+    def test_wrong_organization_inserts_nothing(self):
+        """Test that another organization's slug or an unknown project creates no task"""
+        for variables in ({'slug': self.other.slug}, {'slug': 'no-such-org'}, {'projectId': 999999}):
+            result = self.create_task(**variables)
+            self.assertFalse(result['success'])
+            self.assertEqual(result['message'], "Project or Organization not found")
+        self.assertFalse(Task.objects.exists())
+
+    def test_create_comment_is_tenant_scoped(self):
+        """Test that comments are inserted only on tasks of the named organization"""
+        task = Task.objects.create(project=self.project, title="Commented")
+        refused = self.client.execute(self.CREATE_COMMENT, variables={'taskId': task.id, 'slug': self.other.slug})
+        self.assertEqual(refused['data']['createTaskComment']['message'], "Task or Organization not found")
+        self.assertFalse(TaskComment.objects.exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.execute(self.CREATE_COMMENT, variables={'taskId': task.id, 'slug': self.org.slug})
+        self.assertEqual(result['data']['createTaskComment']['comment'], {'content': "Noted", 'task': {'id': str(task.id)}})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "core_taskcomment"')]), 1)
+        self.assertEqual(TaskComment.objects.get().organization_id, self.org.id)
+
+
+@override_settings(GRAPHQL_LIST_LIMITS={'projects': (2, 3), 'tasks': (2, 3)})
+class ListLimitsTestCase(TestCase):
+    """Tests for server-side default and maximum page sizes"""
+
+    def setUp(self):
+        self.org = Organization.objects.create(name="Paged Org", contact_email="paged@example.com")
+        self.projects = [
+            Project.objects.create(organization=self.org, name=f"Paged Project {i}") for i in range(4)
+        ]
+        for i in range(3):
+            Task.objects.create(project=self.projects[-1], title=f"Paged Task {i}")
+
+    def post(self, query, **variables):
+        response = self.client.post(
+            '/graphql/', {'query': query, 'variables': {'slug': self.org.slug, **variables}},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_limit_defaults_and_is_capped(self):
+        """Test that lists get the default page size, never more than the maximum"""
+        query = 'query($slug: String!, $limit: Int, $offset: Int) { projects(organizationSlug: $slug, limit: $limit, offset: $offset) { name } }'
+        result = self.post(query)
+        self.assertEqual(len(result['data']['projects']), 2)
+        self.assertEqual(
+            result['extensions']['pageInfo'], {'projects': {'limit': 2, 'offset': 0, 'hasNextPage': True}}
+        )
+        result = self.post(query, limit=1000)
+        self.assertEqual(len(result['data']['projects']), 3)
+        self.assertTrue(result['extensions']['pageInfo']['projects']['hasNextPage'])
+        result = self.post(query, limit=3, offset=3)
+        self.assertEqual(len(result['data']['projects']), 1)
+        self.assertEqual(
+            result['extensions']['pageInfo'], {'projects': {'limit': 3, 'offset': 3, 'hasNextPage': False}}
+        )
+
+    def test_nested_lists_are_bounded(self):
+        """Test that related lists are paged and reported by their path"""
+        result = self.post('''query($slug: String!) {
+            organization(slug: $slug) { projects(limit: 1) { tasks { title } } }
+        }''')
+        self.assertEqual(len(result['data']['organization']['projects'][0]['tasks']), 2)
+        self.assertEqual(result['extensions']['pageInfo'], {
+            'organization.projects': {'limit': 1, 'offset': 0, 'hasNextPage': True},
+            'organization.projects.0.tasks': {'limit': 2, 'offset': 0, 'hasNextPage': True},
+        })
+
+    @override_settings(GRAPHQL_MAX_LIST_ROWS=3)
+    def test_rows_per_request_are_capped(self):
+        """Test that lists share one budget of rows per request"""
+        result = self.post('''query($slug: String!) {
+            first: projects(organizationSlug: $slug) { name }
+            second: projects(organizationSlug: $slug) { name }
+        }''')
+        self.assertEqual(len(result['data']['first']), 2)
+        self.assertEqual(len(result['data']['second']), 1)
+        self.assertEqual(result['extensions']['pageInfo']['second'], {'limit': 1, 'offset': 0, 'hasNextPage': True})
+
+    def test_batched_operations_report_their_own_lists(self):
+        """Test that each result of a batch carries only its own pageInfo"""
+        response = self.client.post('/graphql/', [
+            {'query': 'query($slug: String!) { projects(organizationSlug: $slug) { name } }',
+             'variables': {'slug': self.org.slug}},
+            {'query': 'query($slug: String!) { organization(slug: $slug) { name } }',
+             'variables': {'slug': self.org.slug}},
+        ], content_type='application/json')
+        first, second = response.json()
+        self.assertIn('projects', first['extensions']['pageInfo'])
+        self.assertNotIn('extensions', second)
+
+
+class StartupTestCase(TestCase):
+    """Tests for the work done once per process: warm-up and introspection results"""
+
+    def test_export_schema(self):
+        """Test that export_schema writes the SDL and introspection result, and checks them"""
+        with tempfile.TemporaryDirectory() as out_dir:
+            call_command('export_schema', '--out-dir', out_dir, stdout=StringIO())
+            exported = json.loads(Path(out_dir, 'introspection.json').read_text())
+            self.assertEqual(exported['data']['__schema']['queryType']['name'], 'Query')
+            self.assertEqual(
+                exported['extensions']['schemaVersion'], introspection.schema_version(schema.graphql_schema)
+            )
+            self.assertIn('type Query {', Path(out_dir, 'schema.graphql').read_text())
+            call_command('export_schema', '--out-dir', out_dir, '--check', stdout=StringIO())
+
+            Path(out_dir, 'schema.graphql').write_text('type Query { stale: Int }\n')
+            with self.assertRaisesMessage(CommandError, 'schema.graphql'):
+                call_command('export_schema', '--out-dir', out_dir, '--check', stdout=StringIO())
+
+    def test_warm_up_primes_the_introspection_result(self):
+        """Test that warm_up times each step and leaves the standard introspection query cached"""
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        self.assertEqual(
+            [line.split(':')[0] for line in out.getvalue().splitlines()],
+            ['urls', 'schema', 'validation', 'introspection', 'total'],
+        )
+        hits = introspection.cached_result.cache_info().hits
+        response = self.client.post('/graphql/', {
+            'query': get_introspection_query(descriptions=True), 'operationName': 'IntrospectionQuery',
+        }, content_type='application/json')
+        self.assertEqual(response.json()['data']['__schema']['queryType']['name'], 'Query')
+        self.assertEqual(introspection.cached_result.cache_info().hits, hits + 1)
+
+    def test_only_introspection_is_cached(self):
+        """Test that operations reading data or taking variables are executed every time"""
+        organization = Organization.objects.create(name="Startup Org", contact_email="startup@example.com")
+        graphql_schema = schema.graphql_schema
+        self.assertIsNotNone(
+            introspection.cached_result(graphql_schema, '{ __typename __type(name: "Query") { name } }')
+        )
+        self.assertIsNone(introspection.cached_result(graphql_schema, '{ __typename organizations { name } }'))
+        self.assertIsNone(introspection.cached_result(
+            graphql_schema, 'query($name: String!) { __type(name: $name) { name } }'
+        ))
+        self.assertIsNone(introspection.cached_result(graphql_schema, '{ __type(name: "Query") { nope } }'))
+
+        response = self.client.post(
+            '/graphql/', {'query': '{ __typename organizations { name } }'}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['data']['organizations'], [{'name': organization.name}])
@@ -0,0 +1,995 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, models, transaction
+from django.db.migrations.state import ModelState, ProjectState
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .admin import EstimatedCountPaginator
+from .db import advisor
+from .db.operations import AddIndexOnline
+from .db.pool import ConnectionPool, PoolTimeout
+from .db.routers import ConsistencyToken, PrimaryReplicaRouter, is_pinned, primary_reads
+from .middleware import CONSISTENCY_COOKIE, CONSISTENCY_HEADER, ReadYourWritesMiddleware
+from . import deletion, jobs, rollups
+from .models import (
+    ArchivedProject,
+    ArchivedTask,
+    ArchivedTaskComment,
+    Job,
+    Organization,
+    OrganizationDailyThroughput,
+    OrganizationTaskRollup,
+    Project,
+    ProjectDailyThroughput,
+    ProjectTaskRollup,
+    Task,
+    TaskComment,
+    TaskStatusChange,
+)
+from .partitioning import PartitionPlan, partitioned_tables, shadow_name
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    """Tests for the in-process connection pool"""
+
+    def test_connections_are_reused(self):
+        """Test that a returned connection is handed out again"""
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(pool.created, 1)
+
+    def test_max_size_blocks_until_timeout(self):
+        """Test that the pool never exceeds max_size"""
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+    def test_waiter_receives_released_connection(self):
+        """Test that a blocked caller wakes up when a connection is returned"""
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=2)
+        conn = pool.getconn()
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.getconn()))
+        waiter.start()
+        pool.putconn(conn)
+        waiter.join()
+        self.assertEqual(received, [conn])
+
+    def test_unhealthy_connections_are_replaced(self):
+        """Test that broken or failed-check connections are discarded"""
+        pool = ConnectionPool(FakeConnection, max_size=2, check_interval=0,
+                              is_healthy=lambda conn: False)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats['discarded'], 1)
+
+        replacement.closed = True
+        pool.putconn(replacement)
+        self.assertEqual(pool.stats['size'], 0)
+
+
+class ReadReplicaRoutingTestCase(TestCase):
+    """Tests for replica routing and read-your-writes pinning"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.organization = Organization.objects.create(
+            name="Routing Org",
+            contact_email="routing@example.com"
+        )
+
+    def test_reads_use_replica_unless_pinned(self):
+        """Test that reads go to the replica outside of pinned blocks"""
+        with patch('core.db.routers.replicas', return_value=['replica']):
+            self.assertEqual(self.router.db_for_read(Task), 'replica')
+            self.assertEqual(self.router.db_for_write(Task), 'default')
+            with primary_reads():
+                self.assertEqual(self.router.db_for_read(Task), 'default')
+            self.assertEqual(self.router.db_for_read(Task), 'replica')
+            self.assertFalse(self.router.allow_migrate('replica', 'core'))
+
+    def test_reads_use_primary_without_replicas(self):
+        """Test that a single-database setup always routes to default"""
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+
+    def test_consistency_token_expiry(self):
+        """Test that a token without an LSN pins only until it expires"""
+        self.assertTrue(ConsistencyToken(time.time() + 60).requires_primary())
+        self.assertFalse(ConsistencyToken(time.time() - 1).requires_primary())
+        token = ConsistencyToken.parse(str(ConsistencyToken(123.5, '0/16B3748')))
+        self.assertEqual((token.expires_at, token.lsn), (123.5, '0/16B3748'))
+        self.assertIsNone(ConsistencyToken.parse('garbage'))
+
+    def test_forged_consistency_tokens(self):
+        """Test that a client cannot pin itself beyond the window or send a bad LSN"""
+        forged = ConsistencyToken.parse(f'{time.time() + 10 ** 9:.3f}')
+        self.assertLessEqual(forged.expires_at, time.time() + 5)
+        for value in ('inf', 'nan', f'{time.time() + 60}:0/16B3748; DROP', f'{time.time() + 60}:nope'):
+            self.assertIsNone(ConsistencyToken.parse(value), value)
+
+        seen = []
+        middleware = ReadYourWritesMiddleware(lambda request: seen.append(is_pinned()) or HttpResponse())
+        request = RequestFactory().get('/graphql/', HTTP_X_CONSISTENCY_TOKEN=f'{time.time() + 60}:zz/zz')
+        with patch('core.db.routers.replicas', return_value=['replica']):
+            response = middleware(request)
+        self.assertEqual((response.status_code, seen), (200, [False]))
+
+    @patch('core.db.routers.replicas', return_value=['replica'])
+    def test_mutation_pins_following_reads(self, mock_replicas):
+        """Test that a client reads from the primary after it mutates"""
+        mutation = '''
+            mutation($organizationSlug: String!) {
+                createProject(organizationSlug: $organizationSlug, name: "Pinned") { success }
+            }
+        '''
+        response = self.client.post(
+            '/graphql/',
+            {'query': mutation, 'variables': {'organizationSlug': self.organization.slug}},
+            content_type='application/json'
+        )
+        self.assertTrue(response.json()['data']['createProject']['success'])
+        self.assertIn(CONSISTENCY_HEADER, response)
+        self.assertIn(CONSISTENCY_COOKIE, response.cookies)
+
+        seen = []
+        middleware = ReadYourWritesMiddleware(lambda request: seen.append(is_pinned()) or HttpResponse())
+        request = RequestFactory().get('/graphql/')
+        request.COOKIES[CONSISTENCY_COOKIE] = response.cookies[CONSISTENCY_COOKIE].value
+        with patch('core.db.routers.replica_has_replayed', return_value=False):
+            middleware(request)
+        middleware(RequestFactory().get('/graphql/'))
+        self.assertEqual(seen, [True, False])
+
+    def test_caught_up_replica_releases_pin(self):
+        """Test that a replica past the write LSN is used before the window ends"""
+        token = ConsistencyToken(time.time() + 60, '0/16B3748')
+        with patch('core.db.routers.replicas', return_value=['replica']):
+            with patch('core.db.routers.replica_has_replayed', return_value=True):
+                self.assertFalse(token.requires_primary())
+            with patch('core.db.routers.replica_has_replayed', return_value=False):
+                self.assertTrue(token.requires_primary())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning requires PostgreSQL')
+class OnlineIndexTestCase(TransactionTestCase):
+    """Tests for building indexes concurrently, partition by partition"""
+
+    table = 'core_online_index_test'
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {self.table} (id integer, organization_id integer) '
+                'PARTITION BY LIST (organization_id)'
+            )
+            cursor.execute(f'CREATE TABLE {self.table}_org1 PARTITION OF {self.table} FOR VALUES IN (1)')
+            cursor.execute(f'CREATE TABLE {self.table}_default PARTITION OF {self.table} DEFAULT')
+        self.addCleanup(self.drop_table)
+        self.state = ProjectState()
+        self.state.add_model(ModelState('core', 'OnlineIndexTest', [
+            ('id', models.IntegerField(primary_key=True)),
+            ('organization_id', models.IntegerField()),
+        ], options={'db_table': self.table}))
+
+    def drop_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def indexes(self):
+        """Each index on the table and its partitions, with whether it is valid"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid::regclass::text LIKE %s",
+                [f'{self.table}%'],
+            )
+            return dict(cursor.fetchall())
+
+    def test_partitioned_table(self):
+        """Test that the parent index is valid once every partition's is attached, and drops with them"""
+        operation = AddIndexOnline(
+            'onlineindextest', models.Index(fields=['organization_id', '-id'], name='core_online_org_idx')
+        )
+        to_state = self.state.clone()
+        operation.state_forwards('core', to_state)
+        with connection.schema_editor(atomic=False) as editor:
+            operation.database_forwards('core', editor, self.state, to_state)
+        self.assertEqual(self.indexes(), {
+            'core_online_org_idx': True, 'core_online_org_idx_0': True, 'core_online_org_idx_1': True,
+        })
+
+        with connection.schema_editor(atomic=False) as editor:
+            operation.database_backwards('core', editor, to_state, self.state)
+        self.assertEqual(self.indexes(), {})
+
+
+class PartitioningTestCase(TestCase):
+    """Tests for the organization partitioning plan"""
+
+    def test_partition_statements(self):
+        """Test hash and list partition DDL"""
+        hash_plan = PartitionPlan('hash', partitions=2)
+        self.assertEqual(hash_plan.partition_statements('core_task'), [
+            'CREATE TABLE core_task_p0 PARTITION OF core_task_partitioned '
+            'FOR VALUES WITH (MODULUS 2, REMAINDER 0)',
+            'CREATE TABLE core_task_p1 PARTITION OF core_task_partitioned '
+            'FOR VALUES WITH (MODULUS 2, REMAINDER 1)',
+        ])
+        list_plan = PartitionPlan('list', tenants=[7])
+        self.assertEqual(list_plan.partition_statements('core_task'), [
+            'CREATE TABLE core_task_org7 PARTITION OF core_task_partitioned FOR VALUES IN (7)',
+            'CREATE TABLE core_task_default PARTITION OF core_task_partitioned DEFAULT',
+        ])
+        with self.assertRaises(ValueError):
+            PartitionPlan('list')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning requires PostgreSQL')
+    def test_online_conversion(self):
+        """Test that prepare, copy and swap keep every row, including concurrent writes"""
+        organization = Organization.objects.create(name="Partitioned Org", contact_email="p@example.com")
+        project = Project.objects.create(organization=organization, name="Partitioned Project")
+        task = Task.objects.create(project=project, title="Copied")
+        TaskComment.objects.create(task=task, content="Copied", author_email="a@example.com")
+
+        call_command('partition_tables', 'prepare', '--partitions', '2', '--execute', stdout=StringIO())
+        # Written after prepare: reaches the shadow tables through the triggers.
+        mirrored = Task.objects.create(project=project, title="Mirrored")
+        call_command('partition_tables', 'copy', '--execute', stdout=StringIO())
+        call_command('partition_tables', 'swap', '--execute', stdout=StringIO())
+
+        self.assertEqual(
+            set(Task.objects.values_list('title', flat=True)), {"Copied", "Mirrored"}
+        )
+        self.assertEqual(TaskComment.objects.get().task_id, task.id)
+        created = Task.objects.create(project=project, title="After swap")
+        self.assertGreater(created.id, mirrored.id)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'core_task'")
+            self.assertEqual(cursor.fetchone()[0], 'p')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning requires PostgreSQL')
+class PartitionCopyTestCase(TransactionTestCase):
+    """Tests for copying into the shadow tables while the live ones are written"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Copied Org", contact_email="c@example.com")
+        self.other = Organization.objects.create(name="Other Org", contact_email="o@example.com")
+        self.project = Project.objects.create(organization=self.organization, name="Copied Project")
+        self.addCleanup(self.drop_shadows)
+        call_command('partition_tables', 'prepare', '--partitions', '2', '--execute', stdout=StringIO())
+
+    def drop_shadows(self):
+        with connection.cursor() as cursor:
+            for table in partitioned_tables():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_partition_sync ON {table}')
+                cursor.execute(f'DROP FUNCTION IF EXISTS {table}_partition_sync()')
+                cursor.execute(f'DROP TABLE IF EXISTS {shadow_name(table)} CASCADE')
+
+    def copy_around(self, write):
+        """Run the copy while ``write`` is applied but not yet committed"""
+        def copy():
+            try:
+                call_command('partition_tables', 'copy', '--execute', stdout=StringIO())
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            write()
+            thread = threading.Thread(target=copy)
+            thread.start()
+            # Commit once the copy waits on the written rows, or has finished
+            # without waiting.
+            deadline = time.monotonic() + 5
+            while thread.is_alive() and time.monotonic() < deadline:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                    )
+                    if cursor.fetchone()[0]:
+                        break
+                time.sleep(0.01)
+        thread.join()
+
+    def shadow_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, organization_id FROM {shadow_name("core_task")} ORDER BY id')
+            return cursor.fetchall()
+
+    def test_concurrent_delete_and_move(self):
+        """Test that a row deleted or moved during its batch is copied as committed"""
+        deleted = Task.objects.create(project=self.project, title="Deleted")
+        moved = Task.objects.create(project=self.project, title="Moved")
+        kept = Task.objects.create(project=self.project, title="Kept")
+
+        def write():
+            Task.objects.filter(pk=deleted.pk).delete()
+            Task.objects.filter(pk=moved.pk).update(organization_id=self.other.id)
+
+        self.copy_around(write)
+        self.assertEqual(self.shadow_rows(), [
+            (moved.id, self.other.id), (kept.id, self.organization.id),
+        ])
+        with connection.cursor() as cursor:
+            self.assertEqual(PartitionPlan.differences(cursor, 'core_task'), 0)
+
+    def test_swap_refuses_differences(self):
+        """Test that swap checks every shadow against its live table first"""
+        task = Task.objects.create(project=self.project, title="Copied")
+        call_command('partition_tables', 'copy', '--execute', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {shadow_name("core_task")} WHERE id = %s', [task.id])
+        with self.assertRaisesMessage(CommandError, '1 ids differ between core_task'):
+            call_command('partition_tables', 'swap', '--execute', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'core_task'")
+            self.assertEqual(cursor.fetchone()[0], 'r')
+
+
+class IndexAdvisorTestCase(TestCase):
+    """Tests for the index advisor and its command"""
+
+    @staticmethod
+    def access(queryset):
+        return advisor.parse(*queryset.query.sql_with_params())
+
+    def test_parse_orm_queries(self):
+        """Test what the parser reads from the SQL the ORM generates"""
+        page = self.access(
+            Task.objects.filter(organization_id=1, project_id=2, status='TODO').order_by('-created_at')[:50]
+        )
+        self.assertEqual((page.table, set(page.equal)), ('core_task', {'organization_id', 'project_id', 'status'}))
+        self.assertEqual(page.order, [('created_at', True)])
+
+        open_tasks = self.access(Task.objects.filter(project_id=2).exclude(status='DONE'))
+        self.assertEqual((open_tasks.equal, open_tasks.excluded), (['project_id'], {'status': 'DONE'}))
+
+        counts = self.access(
+            Task.objects.filter(project_id__in=[1, 2]).order_by().values('project_id').annotate(n=Count('id'))
+        )
+        self.assertTrue(counts.aggregate)
+        self.assertEqual((counts.equal, counts.read), (['project_id'], {'project_id', 'id'}))
+        self.assertEqual(counts.key, self.access(Task.objects.filter(project_id__in=[3]).order_by().values(
+            'project_id').annotate(n=Count('id'))).key)
+
+        self.assertIsNone(self.access(Task.objects.filter(project__name="Joined")))
+
+    def test_proposals(self):
+        """Test composite and partial candidates, and that existing indexes are respected"""
+        served = self.access(Task.objects.filter(project_id=2, status='TODO').order_by('-created_at'))
+        self.assertEqual(advisor.propose([served], connection), [])
+        # An id tiebreaker needs no index of its own.
+        tiebroken = self.access(Task.objects.filter(project_id=2, status='TODO').order_by('-created_at', '-id'))
+        self.assertEqual(advisor.propose([tiebroken], connection), [])
+
+        by_assignee = self.access(
+            Task.objects.filter(organization_id=1, assignee_email='a@example.com').order_by('-due_date')
+        )
+        blocked = self.access(Task.objects.filter(project_id=2).exclude(status='BLOCKED').order_by('-created_at'))
+        open_tasks = self.access(Task.objects.filter(project_id=2).exclude(status='DONE').order_by('-created_at'))
+        candidates = advisor.propose([by_assignee, blocked, open_tasks], connection)
+        indexes = {tuple(candidate.index().fields): candidate.index() for candidate in candidates}
+        # The tenant stays in the key: an email doesn't imply the organization.
+        self.assertEqual(set(indexes), {
+            ('organization', 'assignee_email', '-due_date'), ('project', '-created_at'),
+        })
+        self.assertEqual(indexes['project', '-created_at'].condition, ~Q(status='BLOCKED'))
+        self.assertTrue(all(len(index.name) <= 30 for index in indexes.values()))
+
+        by_id = self.access(Task.objects.filter(id=1))
+        self.assertEqual(advisor.untenanted([by_id, self.access(Task.objects.filter(id=1, organization_id=1))]), [by_id])
+
+    def test_organization_foreign_keys_share_composite_indexes(self):
+        """Test that the organization foreign keys have no single-column index of their own"""
+        with connection.cursor() as cursor:
+            for model in (Task, TaskComment):
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                indexed = [c['columns'] for c in constraints.values() if c['index'] and not c['primary_key']]
+                self.assertNotIn(['organization_id'], indexed)
+                self.assertTrue(any(columns[0] == 'organization_id' for columns in indexed))
+
+    def test_command_replays_workload(self):
+        """Test that the built-in workload replays against seeded data"""
+        organization = Organization.objects.create(name="Advised Org", contact_email="advised@example.com")
+        project = Project.objects.create(organization=organization, name="Advised Project")
+        task = Task.objects.create(project=project, title="Advised")
+        TaskComment.objects.create(task=task, content="Noted", author_email="a@example.com")
+        out = StringIO()
+        call_command('advise_indexes', stdout=out)
+        self.assertIn('Replayed 12 operations', out.getvalue())
+
+
+class ChoiceCodesTestCase(TestCase):
+    """Tests for choice fields stored as small integer codes"""
+
+    def setUp(self):
+        organization = Organization.objects.create(name="Codes Org", contact_email="codes@example.com")
+        self.project = Project.objects.create(organization=organization, name="Codes Project")
+
+    def test_strings_in_python_codes_in_the_database(self):
+        """Test that instances, lookups and values() see the strings while the columns hold codes"""
+        task = Task.objects.create(project=self.project, title="Urgent", status='IN_PROGRESS', priority='URGENT')
+        Task.objects.create(project=self.project, title="Low", priority='LOW')
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.priority), ('IN_PROGRESS', 'URGENT'))
+        self.assertEqual(
+            list(Task.objects.filter(priority__in=['URGENT', 'HIGH']).values_list('title', flat=True)), ["Urgent"]
+        )
+        self.assertEqual(Task.objects.exclude(status='TODO').values('status').get(), {'status': 'IN_PROGRESS'})
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT status, priority FROM {Task._meta.db_table} WHERE id = %s', [task.id])
+            self.assertEqual(cursor.fetchone(), (2, 4))
+
+    def test_priority_sorts_by_urgency(self):
+        """Test that ordering by priority follows the order of the choices"""
+        for priority in ['HIGH', 'LOW', 'URGENT', 'MEDIUM']:
+            Task.objects.create(project=self.project, title=priority, priority=priority)
+        self.assertEqual(
+            list(Task.objects.order_by('priority').values_list('title', flat=True)),
+            ['LOW', 'MEDIUM', 'HIGH', 'URGENT'],
+        )
+
+    def test_unknown_choices(self):
+        """Test that a value outside the choices is refused, not stored as a code"""
+        field = Task._meta.get_field('status')
+        with self.assertRaises(ValueError):
+            Task.objects.filter(status='ARCHIVED').exists()
+        with self.assertRaises(ValidationError):
+            field.to_python(9)
+        task = Task(project=self.project, title="Archived", status='ARCHIVED')
+        with self.assertRaises(ValidationError):
+            task.full_clean()
+
+
+class AdminListTestCase(TestCase):
+    """Tests for the admin changelists of projects and tasks"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Admin Org", contact_email="admin@example.com")
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def add_project(self, name, done, todo):
+        project = Project.objects.create(organization=self.organization, name=name)
+        Task.objects.bulk_create([
+            Task(organization=self.organization, project=project, title=f"{name} {i}",
+                 status='DONE' if i < done else 'TODO')
+            for i in range(done + todo)
+        ])
+        return project
+
+    def test_project_counts_are_annotated(self):
+        """Test that the project changelist counts tasks in its own query, whatever the page size"""
+        self.add_project("Half Done", done=1, todo=1)
+        self.add_project("Empty", done=0, todo=0)
+        with CaptureQueriesContext(connection) as two_projects:
+            response = self.client.get('/admin/core/project/')
+        self.assertEqual(response.status_code, 200)
+        project_admin = response.context['cl'].model_admin
+        counts = {
+            project.name: (project_admin.task_count(project), project_admin.completion_rate(project))
+            for project in response.context['cl'].result_list
+        }
+        self.assertEqual(counts, {"Half Done": (2, 50.0), "Empty": (0, 0)})
+
+        for i in range(3):
+            self.add_project(f"More {i}", done=1, todo=2)
+        with CaptureQueriesContext(connection) as five_projects:
+            self.client.get('/admin/core/project/', {'o': '-6'})
+        self.assertEqual(len(five_projects), len(two_projects))
+
+    def test_task_list_loads_related_rows(self):
+        """Test that the task changelist reads each task's project and organization in one query"""
+        self.add_project("Related", done=2, todo=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/core/task/')
+        self.assertContains(response, "Admin Org - Related")
+        self.assertEqual(sum('core_project' in query['sql'] for query in queries), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Row estimates come from pg_class')
+    def test_estimated_count(self):
+        """Test that large unfiltered lists are paged by the planner's estimate, filtered ones exactly"""
+        self.add_project("Estimated", done=3, todo=2)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Task._meta.db_table}')
+        Task.objects.create(project=Project.objects.get(), title="After ANALYZE")
+
+        self.assertEqual(EstimatedCountPaginator(Task.objects.all(), 100).count, 6)
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=0):
+            self.assertEqual(EstimatedCountPaginator(Task.objects.all(), 100).count, 5)
+            self.assertEqual(EstimatedCountPaginator(Task.objects.filter(status='DONE'), 100).count, 3)
+
+
+class RollupTestCase(TestCase):
+    """Tests for the incrementally maintained task analytics rollups"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Rollup Org", contact_email="rollup@example.com")
+        self.project = Project.objects.create(organization=self.organization, name="Rollup Project")
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def cells(self, model, **filters):
+        return {
+            (row.status, row.priority): (row.task_count, row.overdue_count)
+            for row in model.objects.filter(**filters) if row.task_count
+        }
+
+    def assert_matches_refresh(self):
+        incremental = self.cells(OrganizationTaskRollup, organization=self.organization)
+        projects = self.cells(ProjectTaskRollup, project=self.project)
+        cutoff = self.organization.rollup_state.overdue_before
+        rollups.refresh_organization(self.organization.pk, now=cutoff)
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=self.organization), incremental)
+        self.assertEqual(self.cells(ProjectTaskRollup, project=self.project), projects)
+
+    def test_task_writes_update_cells(self):
+        """Test that creating, editing and deleting tasks moves them between cells"""
+        task = Task.objects.create(project=self.project, title="Late", priority='HIGH', due_date=self.yesterday)
+        Task.objects.create(project=self.project, title="Done", status='DONE', due_date=self.yesterday)
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=self.organization), {
+            ('TODO', 'HIGH'): (1, 1), ('DONE', 'MEDIUM'): (1, 0),
+        })
+
+        task.status = 'DONE'
+        task.save()
+        self.assertEqual(self.cells(ProjectTaskRollup, project=self.project), {
+            ('DONE', 'HIGH'): (1, 0), ('DONE', 'MEDIUM'): (1, 0),
+        })
+
+        # Saving an instance loaded with the rollup fields deferred.
+        deferred = Task.objects.only('id', 'title').get(pk=task.pk)
+        deferred.priority = 'LOW'
+        deferred.save(update_fields=['priority'])
+        Task.objects.get(title="Done").delete()
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=self.organization), {
+            ('DONE', 'LOW'): (1, 0),
+        })
+        self.assert_matches_refresh()
+
+    def test_overdue_is_counted_against_the_cutoff(self):
+        """Test that tasks falling due after the cutoff count once it moves"""
+        soon = timezone.now() + timedelta(minutes=5)
+        Task.objects.create(project=self.project, title="Soon", due_date=soon)
+        self.assertEqual(self.cells(ProjectTaskRollup, project=self.project), {('TODO', 'MEDIUM'): (1, 0)})
+
+        rollups.refresh_organization(self.organization.pk, now=soon + timedelta(minutes=1))
+        self.assertEqual(self.cells(ProjectTaskRollup, project=self.project), {('TODO', 'MEDIUM'): (1, 1)})
+        Task.objects.create(project=self.project, title="Also late", due_date=soon)
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=self.organization), {
+            ('TODO', 'MEDIUM'): (2, 2),
+        })
+
+    def test_moving_a_project_recounts_both_organizations(self):
+        """Test that rollups follow a project into another organization"""
+        Task.objects.create(project=self.project, title="Moving")
+        other = Organization.objects.create(name="Other Rollup Org", contact_email="other@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.organization = other
+            self.project.save()
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=self.organization), {})
+        self.assertEqual(self.cells(OrganizationTaskRollup, organization=other), {('TODO', 'MEDIUM'): (1, 0)})
+
+    def test_analytics_query_and_refresh_command(self):
+        """Test the analytics fields, built for existing data by refresh_rollups"""
+        Task.objects.bulk_create([
+            Task(project=self.project, organization=self.organization, title=f"Bulk {i}",
+                 status='DONE' if i % 2 else 'TODO', due_date=self.yesterday)
+            for i in range(4)
+        ])
+        call_command('refresh_rollups', stdout=StringIO())
+
+        response = self.client.post('/graphql/', {
+            'query': '''query($slug: String!) {
+                organization(slug: $slug) {
+                    analytics { totalTasks completedTasks overdueTasks completionRate byStatus { key count } }
+                }
+                projects(organizationSlug: $slug) { analytics { breakdown { status priority count overdue } } }
+            }''',
+            'variables': {'slug': self.organization.slug},
+        }, content_type='application/json')
+        data = response.json()['data']
+        self.assertEqual(data['organization']['analytics'], {
+            'totalTasks': 4, 'completedTasks': 2, 'overdueTasks': 2, 'completionRate': 50.0,
+            'byStatus': [{'key': 'TODO', 'count': 2}, {'key': 'DONE', 'count': 2}],
+        })
+        self.assertCountEqual(data['projects'][0]['analytics']['breakdown'], [
+            {'status': 'TODO', 'priority': 'MEDIUM', 'count': 2, 'overdue': 2},
+            {'status': 'DONE', 'priority': 'MEDIUM', 'count': 2, 'overdue': 0},
+        ])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Locks in share mode require PostgreSQL')
+class RollupLockTestCase(TransactionTestCase):
+    """Tests that task writes in one organization wait only for a refresh"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Locking Org", contact_email="locking@example.com")
+        project = Project.objects.create(organization=self.organization, name="Locking Project")
+        # In cells of their own: writes to the same cell do wait for each other.
+        self.tasks = [
+            Task.objects.create(project=project, title=f"Task {i}", priority=priority)
+            for i, priority in enumerate(['LOW', 'MEDIUM'])
+        ]
+
+    def elsewhere(self, function):
+        """Run ``function`` on another connection; return the error it raised rather than wait for a lock"""
+        errors = []
+
+        def run():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL lock_timeout = '1s'")
+                    function()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return errors[0] if errors else None
+
+    def save(self, task, **changes):
+        for name, value in changes.items():
+            setattr(task, name, value)
+        task.save()
+
+    def test_concurrent_task_updates(self):
+        """Test that updates of two tasks run side by side, and a refresh waits for both"""
+        with transaction.atomic():
+            self.save(self.tasks[0], priority='HIGH')
+            self.assertIsNone(self.elsewhere(lambda: self.save(self.tasks[1], priority='URGENT')))
+            self.assertIsInstance(
+                self.elsewhere(lambda: rollups.refresh_organization(self.organization.pk)), OperationalError
+            )
+        self.assertEqual(
+            set(OrganizationTaskRollup.objects.filter(task_count__gt=0).values_list('priority', flat=True)),
+            {'HIGH', 'URGENT'},
+        )
+
+    def test_concurrent_status_changes(self):
+        """Test that two tasks' moves between open statuses are recorded side by side"""
+        with transaction.atomic():
+            self.save(self.tasks[0], status='IN_PROGRESS', priority='HIGH')
+            self.assertIsNone(self.elsewhere(lambda: self.save(self.tasks[1], status='BLOCKED')))
+        self.assertEqual(TaskStatusChange.objects.exclude(from_status='').count(), 2)
+
+
+class ThroughputTestCase(TestCase):
+    """Tests for status history and the daily throughput buckets"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Velocity Org", contact_email="velocity@example.com")
+        self.project = Project.objects.create(organization=self.organization, name="Velocity Project")
+        self.today = timezone.localdate()
+
+    def buckets(self, model, **filters):
+        return {
+            row.day: (row.created, row.completed, row.reopened)
+            for row in model.objects.filter(**filters)
+        }
+
+    def update_status(self, task, status):
+        return self.client.post('/graphql/', {
+            'query': '''mutation($id: ID!, $slug: String!, $status: String) {
+                updateTask(id: $id, organizationSlug: $slug, status: $status) { success }
+            }''',
+            'variables': {'id': task.id, 'slug': self.organization.slug, 'status': status},
+        }, content_type='application/json')
+
+    def test_status_changes_are_recorded_and_bucketed(self):
+        """Test history and daily counts for create, complete and reopen"""
+        task = Task.objects.create(project=self.project, title="Tracked")
+        Task.objects.create(project=self.project, title="Born done", status='DONE')
+        self.update_status(task, 'IN_PROGRESS')
+        self.update_status(task, 'DONE')
+        self.update_status(task, 'DONE')
+        self.update_status(task, 'TODO')
+
+        self.assertEqual(
+            list(task.status_changes.values_list('from_status', 'to_status')),
+            [('', 'TODO'), ('TODO', 'IN_PROGRESS'), ('IN_PROGRESS', 'DONE'), ('DONE', 'TODO')],
+        )
+        expected = {self.today: (2, 2, 1)}
+        self.assertEqual(self.buckets(ProjectDailyThroughput, project=self.project), expected)
+        self.assertEqual(self.buckets(OrganizationDailyThroughput, organization=self.organization), expected)
+
+        # Rebuilding from the history gives the same buckets.
+        rollups.refresh_organization(self.organization.pk)
+        self.assertEqual(self.buckets(ProjectDailyThroughput, project=self.project), expected)
+        self.assertEqual(self.buckets(OrganizationDailyThroughput, organization=self.organization), expected)
+
+    def test_backfill_for_bulk_created_tasks(self):
+        """Test that tasks inserted without signals get a creation and completion record"""
+        Task.objects.bulk_create([
+            Task(project=self.project, organization=self.organization, title="Bulk open"),
+            Task(project=self.project, organization=self.organization, title="Bulk done", status='DONE'),
+        ])
+        rollups.backfill_history(self.organization.pk)
+        rollups.backfill_history(self.organization.pk)
+        self.assertEqual(TaskStatusChange.objects.filter(organization=self.organization).count(), 3)
+        rollups.refresh_organization(self.organization.pk)
+        self.assertEqual(self.buckets(ProjectDailyThroughput, project=self.project), {self.today: (2, 1, 0)})
+
+    def test_velocity_query(self):
+        """Test zero-filled weekly buckets and the range limit"""
+        monday = self.today - timedelta(days=self.today.weekday())
+        ProjectDailyThroughput.objects.bulk_create([
+            ProjectDailyThroughput(organization=self.organization, project=self.project,
+                                   day=monday - timedelta(days=13), created=3, completed=1),
+            ProjectDailyThroughput(organization=self.organization, project=self.project,
+                                   day=monday - timedelta(days=12), created=2, completed=2),
+            ProjectDailyThroughput(organization=self.organization, project=self.project,
+                                   day=monday, created=1, reopened=1),
+        ])
+        query = '''query($projectId: ID!, $slug: String!, $from: Date!, $to: Date!, $granularity: VelocityGranularity) {
+            projectVelocity(projectId: $projectId, organizationSlug: $slug, from: $from, to: $to,
+                            granularity: $granularity) { start created completed reopened }
+        }'''
+        variables = {
+            'projectId': self.project.id, 'slug': self.organization.slug,
+            'from': str(monday - timedelta(days=14)), 'to': str(monday + timedelta(days=6)),
+            'granularity': 'WEEK',
+        }
+        response = self.client.post('/graphql/', {'query': query, 'variables': variables},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['data']['projectVelocity'], [
+            {'start': str(monday - timedelta(days=14)), 'created': 5, 'completed': 3, 'reopened': 0},
+            {'start': str(monday - timedelta(days=7)), 'created': 0, 'completed': 0, 'reopened': 0},
+            {'start': str(monday), 'created': 1, 'completed': 0, 'reopened': 1},
+        ])
+
+        variables.update({'from': '2000-01-01', 'granularity': 'DAY'})
+        response = self.client.post('/graphql/', {'query': query, 'variables': variables},
+                                    content_type='application/json')
+        self.assertIn('limited to', response.json()['errors'][0]['message'])
+
+
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Jobs Org", contact_email="jobs@example.com")
+
+    def graphql(self, query, **variables):
+        response = self.client.post('/graphql/', {'query': query, 'variables': variables},
+                                    content_type='application/json')
+        return response.json()['data']
+
+    def test_enqueue_run_and_poll(self):
+        """Test enqueueing through GraphQL, coalescing queued duplicates and polling the outcome"""
+        Project.objects.create(organization=self.organization, name="Queued")
+        mutation = '''mutation($slug: String!) {
+            enqueueJob(organizationSlug: $slug, kind: REFRESH_ROLLUPS) { success job { id status } }
+        }'''
+        first = self.graphql(mutation, slug=self.organization.slug)['enqueueJob']
+        second = self.graphql(mutation, slug=self.organization.slug)['enqueueJob']
+        self.assertTrue(first['success'])
+        self.assertEqual(first['job'], {'id': second['job']['id'], 'status': 'QUEUED'})
+
+        self.assertEqual(jobs.work('test'), 1)
+        self.assertEqual(jobs.work('test'), 0)
+        job = self.graphql(
+            '''query($id: ID!, $slug: String!) {
+                job(id: $id, organizationSlug: $slug) { status attempts result finishedAt }
+            }''',
+            id=first['job']['id'], slug=self.organization.slug,
+        )['job']
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual(job['attempts'], 1)
+        self.assertIsNotNone(job['finishedAt'])
+
+        other = Organization.objects.create(name="Other Jobs Org", contact_email="other@example.com")
+        self.assertIsNone(self.graphql(
+            'query($id: ID!, $slug: String!) { job(id: $id, organizationSlug: $slug) { id } }',
+            id=first['job']['id'], slug=other.slug,
+        )['job'])
+
+    def test_unique_jobs_are_queued_once(self):
+        """Test that a unique job is not queued again while it runs, even by a caller racing its insert"""
+        job = jobs.enqueue('refresh_rollups', organization=self.organization)
+        jobs.claim('test')
+        self.assertEqual(jobs.enqueue('refresh_rollups', organization=self.organization), job)
+
+        lookup = jobs._active_job
+        lookups = []
+
+        def missed_once(*args):
+            lookups.append(args)
+            return None if len(lookups) == 1 else lookup(*args)
+
+        with patch.object(jobs, '_active_job', missed_once):
+            self.assertEqual(jobs.enqueue('refresh_rollups', organization=self.organization), job)
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(Job.objects.filter(kind='refresh_rollups').count(), 1)
+
+        jobs.run(Job.objects.get(pk=job.pk))
+        self.assertNotEqual(jobs.enqueue('refresh_rollups', organization=self.organization), job)
+
+    def test_failures_back_off_then_fail(self):
+        """Test that a failing job is retried later and fails once out of attempts"""
+        def broken(job):
+            raise RuntimeError('boom')
+
+        with patch.dict(jobs.HANDLERS, {'broken': jobs.Handler(broken, False, False)}):
+            job = jobs.enqueue('broken', organization=self.organization, max_attempts=2)
+            self.assertEqual(jobs.work('test'), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('QUEUED', 1))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIn('RuntimeError: boom', job.last_error)
+
+            self.assertEqual(jobs.work('test'), 0)
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertEqual(jobs.work('test'), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+            self.assertIsNotNone(job.finished_at)
+
+        with self.assertRaises(ValueError):
+            jobs.enqueue('broken')
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a job whose worker died runs again and the stale attempt can't overwrite it"""
+        jobs.enqueue('refresh_rollups', organization=self.organization)
+        stale, = jobs.claim('dead-worker')
+        self.assertEqual(jobs.requeue_expired(), 0)
+
+        later = timezone.now() + timedelta(seconds=301)
+        with self.settings(JOB_LEASE_SECONDS=300):
+            self.assertEqual(jobs.requeue_expired(now=later), 1)
+        fresh, = jobs.claim('live-worker', now=later)
+        self.assertEqual(fresh.attempts, 2)
+
+        self.assertFalse(jobs.heartbeat(stale))
+        self.assertTrue(jobs.run(stale))
+        fresh.refresh_from_db()
+        self.assertEqual((fresh.status, fresh.locked_by), ('RUNNING', 'live-worker'))
+        self.assertTrue(jobs.run(fresh))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'SUCCEEDED')
+
+
+@override_settings(DELETION_BATCH_SIZE=2)
+class DeletionTestCase(TestCase):
+    """Tests for deleting and archiving projects and organizations in batches"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(name="Deleted Org", contact_email="deleted@example.com")
+        self.project = self.add_project("Doomed", tasks=5)
+        self.kept = self.add_project("Kept", tasks=2)
+
+    def add_project(self, name, tasks, status='ACTIVE'):
+        project = Project.objects.create(organization=self.organization, name=name, status=status)
+        for i in range(tasks):
+            task = Task.objects.create(project=project, title=f"{name} {i}", status='DONE' if i % 2 else 'TODO')
+            TaskComment.objects.create(task=task, content="Note", author_email="author@example.com")
+        return project
+
+    def graphql(self, query, **variables):
+        response = self.client.post('/graphql/', {'query': query, 'variables': variables},
+                                    content_type='application/json')
+        return response.json()['data']
+
+    def test_delete_project_in_batches(self):
+        """Test that a project's rows go in batches, with progress, and the rollups are recounted"""
+        reports = []
+        counts = deletion.delete_project(
+            self.organization.pk, self.project.pk, progress=lambda counts: reports.append(dict(counts))
+        )
+        self.assertEqual(counts, {'projects': 1, 'tasks': 5, 'comments': 5, 'total_tasks': 5})
+        self.assertEqual([report['tasks'] for report in reports], [0, 2, 4, 5, 5])
+
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(TaskComment.objects.count(), 2)
+        self.assertFalse(TaskStatusChange.objects.filter(project_id=self.project.pk).exists())
+        self.assertFalse(ProjectTaskRollup.objects.filter(project_id=self.project.pk).exists())
+        self.assertEqual(sum(OrganizationTaskRollup.objects.values_list('task_count', flat=True)), 2)
+        # Running it again finds nothing left to do.
+        self.assertEqual(deletion.delete_project(self.organization.pk, self.project.pk)['tasks'], 0)
+
+    def test_archive_completed_project(self):
+        """Test that archiving moves a completed project's rows to the archive tables"""
+        with self.assertRaises(ValueError):
+            deletion.delete_project(self.organization.pk, self.project.pk, archive=True)
+
+        finished = self.add_project("Finished", tasks=3, status='COMPLETED')
+        task_ids = set(finished.tasks.values_list('pk', flat=True))
+        deletion.delete_project(self.organization.pk, finished.pk, archive=True)
+
+        self.assertFalse(Project.objects.filter(pk=finished.pk).exists())
+        archived = ArchivedProject.objects.get(pk=finished.pk)
+        self.assertEqual((archived.name, archived.status), ("Finished", 'COMPLETED'))
+        self.assertEqual(set(archived.tasks.values_list('pk', flat=True)), task_ids)
+        self.assertEqual(sorted(archived.tasks.values_list('status', flat=True)), ['DONE', 'TODO', 'TODO'])
+        self.assertEqual(ArchivedTaskComment.objects.filter(task__project=archived).count(), 3)
+
+    def test_delete_organization_through_graphql(self):
+        """Test that deleteOrganization queues a job that removes everything and keeps itself"""
+        finished = self.add_project("Finished", tasks=1, status='COMPLETED')
+        deletion.delete_project(self.organization.pk, finished.pk, archive=True)
+        result = self.graphql(
+            'mutation($slug: String!) { deleteOrganization(slug: $slug) { success job { id status } } }',
+            slug=self.organization.slug,
+        )['deleteOrganization']
+        self.assertEqual(result['job']['status'], 'QUEUED')
+
+        self.assertEqual(jobs.work('test'), 1)
+        job = Job.objects.get(pk=result['job']['id'])
+        self.assertEqual((job.status, job.organization_id), ('SUCCEEDED', None))
+        self.assertEqual(job.result['tasks'], 7)
+        self.assertEqual(job.progress['projects'], 2)
+        self.assertFalse(Organization.objects.filter(pk=self.organization.pk).exists())
+        for model in (Task, TaskComment, TaskStatusChange, ArchivedProject, ArchivedTask, OrganizationTaskRollup):
+            self.assertFalse(model.objects.exists(), model.__name__)
+
+    def test_delete_project_mutation(self):
+        """Test that deleteProject checks its arguments and queues a job polled through job"""
+        mutation = '''mutation($id: ID!, $slug: String!, $archive: Boolean) {
+            deleteProject(id: $id, organizationSlug: $slug, archive: $archive) { success message job { id } }
+        }'''
+        refused = self.graphql(mutation, id=self.project.pk, slug=self.organization.slug, archive=True)
+        self.assertEqual(refused['deleteProject']['message'], "Only completed projects can be archived")
+
+        queued = self.graphql(mutation, id=self.project.pk, slug=self.organization.slug)['deleteProject']
+        self.assertTrue(queued['success'])
+        self.assertEqual(jobs.work('test'), 1)
+        job = self.graphql(
+            'query($id: ID!, $slug: String!) { job(id: $id, organizationSlug: $slug) { status progress } }',
+            id=queued['job']['id'], slug=self.organization.slug,
+        )['job']
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual(json.loads(job['progress'])['tasks'], 5)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent claims need row locks')
+class JobWorkerTestCase(TransactionTestCase):
+    def test_concurrent_workers_run_each_job_once(self):
+        """Test that worker threads sharing the queue never run a job twice"""
+        runs = []
+        lock = threading.Lock()
+
+        def record(job):
+            time.sleep(0.01)
+            with lock:
+                runs.append(job.pk)
+
+        with patch.dict(jobs.HANDLERS, {'record': jobs.Handler(record, False, False)}):
+            queued = {jobs.enqueue('record').pk for _ in range(40)}
+            out = StringIO()
+            call_command('run_worker', '--burst', '--concurrency', '4', stdout=out)
+
+        self.assertEqual(sorted(runs), sorted(queued))
+        self.assertEqual(Job.objects.filter(status='SUCCEEDED').count(), 40)
+        self.assertIn('Worker stopped', out.getvalue())
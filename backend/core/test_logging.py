@@ -0,0 +1,82 @@
+import copy
+import io
+import json
+import logging
+import logging.config
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from .log import JSONFormatter, QueuedRotatingFileHandler, SamplingFilter
+
+
+class LoggingPipelineTestCase(SimpleTestCase):
+    """Tests for the queued JSON logging pipeline"""
+
+    def make_record(self, level=logging.INFO, msg='hello %s', args=('world',), **extra):
+        record = logging.LogRecord('core.test', level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        """Test that records render as JSON with extra attributes"""
+        line = JSONFormatter().format(self.make_record(organization='acme'))
+        payload = json.loads(line)
+        self.assertEqual(payload['message'], 'hello world')
+        self.assertEqual(payload['level'], 'INFO')
+        self.assertEqual(payload['organization'], 'acme')
+
+    def test_sampling_filter_thins_info_but_keeps_errors(self):
+        """Test that sampling only drops low-level records"""
+        sampler = SamplingFilter(rate=0.25)
+        kept = [sampler.filter(self.make_record()) for _ in range(8)]
+        self.assertEqual(sum(kept), 2)
+        self.assertTrue(all(sampler.filter(self.make_record(level=logging.ERROR)) for _ in range(4)))
+
+    def test_queued_handler_writes_in_background(self):
+        """Test that queued records reach the rotating file"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'test.log')
+            handler = QueuedRotatingFileHandler(path)
+            handler.setFormatter(JSONFormatter())
+            logger = logging.getLogger('core.test_queued')
+            logger.propagate = False
+            logger.addHandler(handler)
+            try:
+                logger.info("Fetching tasks for project: %s", 42)
+                handler.flush()
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+
+            with open(path) as f:
+                payload = json.loads(f.readline())
+            self.assertEqual(payload['message'], 'Fetching tasks for project: 42')
+            self.assertEqual(payload['logger'], 'core.test_queued')
+
+    def test_configured_handlers_sample_independently(self):
+        """Test that LOGGING's file and console handlers each keep their share of the records"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'sampled.log')
+            console = io.StringIO()
+            config = copy.deepcopy(settings.LOGGING)
+            for sampler in config['filters'].values():
+                sampler['rate'] = 0.5
+            config['handlers']['file']['filename'] = path
+            config['handlers']['console']['stream'] = console
+            logging.config.dictConfig(config)
+            try:
+                logger = logging.getLogger('core.test_sampled')
+                for i in range(10):
+                    logger.info("Sampled line %s", i)
+                for handler in logging.getLogger('core').handlers:
+                    handler.flush()
+                with open(path) as f:
+                    written = [json.loads(line)['message'] for line in f]
+            finally:
+                logging.config.dictConfig(settings.LOGGING)
+
+        self.assertEqual(len(written), 5)
+        self.assertEqual(console.getvalue().count('Sampled line'), 5)
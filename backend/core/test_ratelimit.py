@@ -0,0 +1,230 @@
+from unittest.mock import patch
+
+from django.core.signing import get_cookie_signer
+from django.test import TestCase, override_settings
+from graphql import parse
+
+from .models import Organization, RateLimitBucket
+from .ratelimit import (
+    CLIENT_COOKIE,
+    CLIENT_COOKIE_SALT,
+    buckets,
+    issue_refusals,
+    organization_slug,
+    query_cost,
+)
+from .schema import schema
+
+PROJECTS_QUERY = '''
+    query($organizationSlug: String!, $limit: Int) {
+        projects(organizationSlug: $organizationSlug, limit: $limit) { id name }
+    }
+'''
+
+
+class QueryCostTestCase(TestCase):
+    """Tests for query cost estimation"""
+
+    def cost(self, query, variables=None):
+        return query_cost(schema.graphql_schema, parse(query), None, variables)
+
+    def test_lists_multiply_by_limit(self):
+        """Test that list selections are charged per requested item"""
+        self.assertEqual(self.cost(PROJECTS_QUERY, {'limit': 5}), 1 + 5 * 2)
+        self.assertEqual(self.cost(PROJECTS_QUERY), 1 + 20 * 2)
+        self.assertEqual(self.cost('{ organization(slug: "a") { name projectCount } }'), 3)
+
+    def test_mutations_and_fragments(self):
+        """Test mutation surcharge and fragment expansion"""
+        mutation = '''
+            mutation { createOrganization(name: "x", contactEmail: "x@example.com") {
+                organization { ...Org } success
+            } }
+            fragment Org on OrganizationType { id name }
+        '''
+        self.assertEqual(self.cost(mutation), 10 + (1 + 2) + 1)
+        self.assertEqual(
+            organization_slug(parse('{ task(id: 1, organizationSlug: "acme") { id } }')), 'acme'
+        )
+
+
+@override_settings(RATELIMIT_CLIENT_CAPACITY=100, RATELIMIT_CLIENT_RATE=0.001,
+                   RATELIMIT_ORG_CAPACITY=150, RATELIMIT_ORG_RATE=0.001)
+class RateLimitTestCase(TestCase):
+    """Tests for token-bucket rate limiting of the GraphQL endpoint"""
+
+    def setUp(self):
+        self.organization = Organization.objects.create(
+            name="Limited Org",
+            contact_email="limited@example.com"
+        )
+        issue_refusals.clear()
+        self.addCleanup(issue_refusals.clear)
+
+    def post(self, limit, client):
+        self.client.cookies[CLIENT_COOKIE] = get_cookie_signer(
+            salt=CLIENT_COOKIE + CLIENT_COOKIE_SALT
+        ).sign(client)
+        return self.client.post(
+            '/graphql/',
+            {'query': PROJECTS_QUERY,
+             'variables': {'organizationSlug': self.organization.slug, 'limit': limit}},
+            content_type='application/json'
+        )
+
+    def test_charges_by_cost_until_exhausted(self):
+        """Test remaining-quota headers and the 429 once the bucket is empty"""
+        response = self.post(20, client='a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Cost'], '41')
+        self.assertEqual(response['X-RateLimit-Remaining'], '59')
+
+        self.post(20, client='a')
+        response = self.post(20, client='a')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['X-RateLimit-Remaining'], '18')
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn('Rate limit exceeded', response.json()['errors'][0]['message'])
+
+        # A cheaper operation still fits in what is left.
+        self.assertEqual(self.post(5, client='a').status_code, 200)
+
+    def test_clients_have_separate_buckets(self):
+        """Test that clients sharing an IP are limited independently, up to the org quota"""
+        self.assertEqual(self.post(30, client='a').status_code, 200)
+        self.assertEqual(self.post(30, client='b').status_code, 200)
+        # Client c has tokens, but the organization's 150 are nearly spent.
+        self.assertEqual(self.post(30, client='c').status_code, 429)
+        self.assertEqual(RateLimitBucket.objects.get(key__endswith=':c:c').tokens, 100)
+
+    def test_batch_is_charged_once(self):
+        """Test that a batched request is one charge for the sum of its operations"""
+        self.client.cookies[CLIENT_COOKIE] = get_cookie_signer(
+            salt=CLIENT_COOKIE + CLIENT_COOKIE_SALT
+        ).sign('batch')
+        operation = {'query': PROJECTS_QUERY,
+                     'variables': {'organizationSlug': self.organization.slug, 'limit': 20}}
+        response = self.client.post('/graphql/', [operation, operation], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Cost'], '82')
+        self.assertEqual(response['X-RateLimit-Remaining'], '18')
+
+        response = self.client.post('/graphql/', [operation, operation], content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual([entry['status'] for entry in response.json()], [400, 400])
+        self.assertEqual(int(RateLimitBucket.objects.get(key__endswith=':c:batch').tokens), 18)
+
+    def test_denied_batch_refunds_earlier_charges(self):
+        """Test that a batch denied for one organization spends nothing from the others"""
+        other = Organization.objects.create(name="Small Org", contact_email="small@example.com")
+        operations = [
+            {'query': '{ __schema { queryType { name } } }'},
+            {'query': PROJECTS_QUERY, 'variables': {'organizationSlug': self.organization.slug, 'limit': 20}},
+            {'query': PROJECTS_QUERY, 'variables': {'organizationSlug': other.slug, 'limit': 20}},
+        ]
+        self.client.cookies[CLIENT_COOKIE] = get_cookie_signer(
+            salt=CLIENT_COOKIE + CLIENT_COOKIE_SALT
+        ).sign('batch')
+        with self.settings(RATELIMIT_ORG_QUOTAS={other.slug: (10, 0.001)}):
+            response = self.client.post('/graphql/', operations, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            {bucket.key: int(bucket.tokens) for bucket in RateLimitBucket.objects.all()},
+            {
+                'introspection:c:batch': 20,
+                'org:%d' % self.organization.pk: 150,
+                'org:%d:c:batch' % self.organization.pk: 100,
+                'org:%d:c:batch' % other.pk: 100,
+                'org:%d' % other.pk: 10,
+            },
+        )
+
+    @override_settings(RATELIMIT_INTROSPECTION_CAPACITY=2)
+    def test_anonymous_introspection_has_its_own_bucket(self):
+        """Test that anonymous introspection is limited per operation, apart from other queries"""
+        self.client.cookies[CLIENT_COOKIE] = get_cookie_signer(
+            salt=CLIENT_COOKIE + CLIENT_COOKIE_SALT
+        ).sign('anonymous')
+        query = {'query': '{ __schema { queryType { name } } }'}
+        for remaining in (1, 0):
+            response = self.client.post('/graphql/', query, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-RateLimit-Remaining'], str(remaining))
+        response = self.client.post('/graphql/', query, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(RateLimitBucket.objects.get(key='introspection:c:anonymous').tokens), 0)
+        self.assertFalse(RateLimitBucket.objects.filter(key__startswith='org:').exists())
+
+        # Other operations are charged to the regular buckets still.
+        self.assertEqual(self.post(5, client='a').status_code, 200)
+
+    def test_new_clients_get_a_cookie(self):
+        """Test that a client without an id is limited by IP and issued one"""
+        response = self.client.post(
+            '/graphql/', {'query': '{ organizations { id } }'}, content_type='application/json'
+        )
+        self.assertIn(CLIENT_COOKIE, response.cookies)
+        self.assertTrue(RateLimitBucket.objects.filter(key='client:ip:127.0.0.1').exists())
+
+    @override_settings(RATELIMIT_CLIENT_ISSUE_CAPACITY=2)
+    def test_cookieless_clients_share_their_address(self):
+        """Test that dropping cookies neither refills a bucket nor mints cookies without end"""
+        issued = []
+        consume = patch.object(buckets, 'consume', wraps=buckets.consume)
+        with consume as consumed:
+            for _ in range(5):
+                self.client.cookies.clear()
+                response = self.client.post(
+                    '/graphql/',
+                    {'query': PROJECTS_QUERY, 'variables': {'organizationSlug': self.organization.slug, 'limit': 20}},
+                    content_type='application/json'
+                )
+                issued.append(CLIENT_COOKIE in response.cookies)
+        self.assertEqual(issued, [True, True, False, False, False])
+        # Once refused, the address is not charged for asking again.
+        self.assertEqual(
+            [call.args[0] for call in consumed.call_args_list if call.args[0].startswith('issue:')],
+            ['issue:ip:127.0.0.1'] * 3,
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            set(RateLimitBucket.objects.filter(key__startswith='org:').values_list('key', flat=True)),
+            {'org:%d' % self.organization.pk, 'org:%d:ip:127.0.0.1' % self.organization.pk},
+        )
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_forwarded_addresses_from_trusted_proxies(self):
+        """Test that X-Forwarded-For names the client only when a trusted proxy sent it"""
+        query = {'query': '{ organizations { id } }'}
+        for remote, expected in (('10.0.0.2', '203.0.113.7'), ('198.51.100.1', '198.51.100.1')):
+            self.client.cookies.clear()
+            self.client.post(
+                '/graphql/', query, content_type='application/json',
+                REMOTE_ADDR=remote, HTTP_X_FORWARDED_FOR='192.0.2.1, 203.0.113.7, 10.0.0.5',
+            )
+            self.assertTrue(RateLimitBucket.objects.filter(key=f'client:ip:{expected}').exists())
+        self.assertFalse(RateLimitBucket.objects.filter(key='client:ip:192.0.2.1').exists())
+
+    def test_operations_without_an_organization_are_charged_per_client(self):
+        """Test that operations without an organization share no bucket between clients"""
+        query = {'query': '{ organizations(limit: 20) { id name } }'}
+        for client in ('a', 'b'):
+            self.client.cookies[CLIENT_COOKIE] = get_cookie_signer(
+                salt=CLIENT_COOKIE + CLIENT_COOKIE_SALT
+            ).sign(client)
+            # 41 tokens each: together more than the 150 of a shared bucket.
+            for _ in range(2):
+                response = self.client.post('/graphql/', query, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(RateLimitBucket.objects.values_list('key', flat=True)), {'client:c:a', 'client:c:b'}
+        )
+
+    def test_consume_refills_over_time(self):
+        """Test the refill arithmetic of a single bucket"""
+        self.assertEqual(buckets.consume('t', 8, 10, 1.0, now=100.0), (True, 2.0))
+        allowed, tokens = buckets.consume('t', 8, 10, 1.0, now=103.0)
+        self.assertFalse(allowed)
+        self.assertEqual(tokens, 5.0)
+        self.assertEqual(buckets.consume('t', 8, 10, 1.0, now=106.0), (True, 0.0))
+        self.assertEqual(buckets.consume('t', 1, 10, 1.0, now=1000.0), (True, 9.0))
@@ -186,3 +186,25 @@ class ModelTestCase(TestCase):
             title="Test Task"
         )
         self.assertEqual(task.organization, self.organization)
+
+    def test_task_moves_between_organizations(self):
+        """Test that a task moved to another organization's project takes its comments with it"""
+        task = Task.objects.create(project=self.project, title="Moving Task")
+        TaskComment.objects.create(task=task, content="Along", author_email="a@example.com")
+        other = Organization.objects.create(name="Other Organization", contact_email="other@example.com")
+        target = Project.objects.create(organization=other, name="Target Project")
+
+        task = Task.objects.get(pk=task.pk)
+        task.project_id = target.pk
+        task.save()
+        self.assertEqual(Task.objects.get(pk=task.pk).organization_id, other.pk)
+        self.assertEqual(TaskComment.objects.get(task=task).organization_id, other.pk)
+        self.assertFalse(Task.objects.filter(organization=self.organization).exists())
+
+        comment = TaskComment.objects.create(
+            task=Task.objects.create(project=self.project, title="Stays"), content="Moved", author_email="a@example.com"
+        )
+        comment = TaskComment.objects.get(pk=comment.pk)
+        comment.task = task
+        comment.save()
+        self.assertEqual(TaskComment.objects.get(pk=comment.pk).organization_id, other.pk)
@@ -1,16 +1,44 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django_ratelimit.decorators import ratelimit
-from graphene_django.views import GraphQLView
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, get_operation_ast, parse, print_ast
+from functools import lru_cache
+import json
 import logging
+from . import caching, compression, introspection, pagination, ratelimit
+from .db import routers
+from .incremental import MULTIPART_CONTENT_TYPE, IncrementalExecutionContext, IncrementalPlan, MultipartBody
+from .loaders import clear_loaders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=256)
+def parse_query(query):
+    """Return the parsed document for ``query``, or None if it can't be parsed"""
+    try:
+        return parse(query)
+    except Exception:
+        return None
+
+
+def get_operation_type(query, operation_name=None):
+    """Return the OperationType of ``query``, or None if it can't be parsed"""
+    document = parse_query(query)
+    operation_ast = get_operation_ast(document, operation_name) if document else None
+    return operation_ast.operation if operation_ast else None
+
+
 @method_decorator(csrf_exempt, name='dispatch')
-@method_decorator(ratelimit(key='ip', rate='100/h', method='POST'), name='dispatch')
-@method_decorator(ratelimit(key='ip', rate='1000/d', method='POST'), name='dispatch')
 class RateLimitedGraphQLView(GraphQLView):
     """
     Custom GraphQL view with rate limiting and enhanced security
@@ -19,22 +47,229 @@ class RateLimitedGraphQLView(GraphQLView):
     def dispatch(self, request, *args, **kwargs):
         # Log GraphQL requests
         if request.method == 'POST':
-            logger.info(f"GraphQL request from {request.META.get('REMOTE_ADDR', 'unknown')}")
+            logger.info("GraphQL request from %s", ratelimit.client_address(request))
         
-        return super().dispatch(request, *args, **kwargs)
+        request.rate_limit = None
+        request.cache_max_age = None
+        request.introspection_etag = None
+        # A JSON array of operations is a batch, whatever the view was built with.
+        self.batch = self.batch or self.is_batch_request(request)
+        response = self.incremental_response(request)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.get('Content-Type', '').startswith('application/json'):
+            encoding = compression.choose_encoding(request, response)
+            response = caching.finalize_response(
+                request, response, request.cache_max_age, encoding, request.introspection_etag
+            )
+            compression.compress_response(response, encoding)
+        if request.rate_limit is not None:
+            request.rate_limit.apply(response)
+            ratelimit.ensure_client_cookie(request, response)
+        return response
     
     def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
         """Override to add custom execution logic"""
+        is_mutation = bool(query) and get_operation_type(query, operation_name) == OperationType.MUTATION
+        # Operations after a mutation in the same batch must see its writes too.
+        wrote = is_mutation or (self.batch and getattr(request, 'batch_wrote', False))
+        request.batch_wrote = request.wrote_to_primary = wrote
+
         try:
-            result = super().execute_graphql_request(
-                request, data, query, variables, operation_name, show_graphiql
-            )
+            # Reads made while mutating must see the mutation's own writes.
+            with routers.primary_reads(wrote or routers.is_pinned()):
+                denied = self.charge_rate_limit(request, query, variables, operation_name, show_graphiql)
+                if denied:
+                    request.batch_wrote = request.wrote_to_primary = False
+                    return denied
+                result = None
+                if query:
+                    # Operations about the schema alone are answered from memory.
+                    result = introspection.cached_result(self.schema.graphql_schema, query, operation_name)
+                if result is not None:
+                    response_etag = introspection.etag(self.schema.graphql_schema, query, operation_name)
+                    request.introspection_etag = None if self.batch else response_etag
+                else:
+                    result = super().execute_graphql_request(
+                        request, data, query, variables, operation_name, show_graphiql
+                    )
+            if is_mutation:
+                clear_loaders(request)
             
             # Log errors if any
             if result and hasattr(result, 'errors') and result.errors:
-                logger.error(f"GraphQL errors: {result.errors}")
+                logger.error("GraphQL errors: %s", result.errors)
+            elif request.method == 'GET' and not self.batch:
+                document = parse_query(query)
+                request.cache_max_age = document and caching.cache_max_age(document, operation_name)
             
             return result
         except Exception as e:
-            logger.error(f"GraphQL execution error: {str(e)}")
+            logger.error("GraphQL execution error: %s", e)
             raise
+
+    def incremental_response(self, request):
+        """
+        Execute a query using @defer or @stream as a multipart/mixed stream
+        of payloads, or return None to handle the request as usual.
+        """
+        if self.batch or 'multipart/mixed' not in request.headers.get('Accept', ''):
+            return None
+        try:
+            data = self.parse_body(request)
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        except HttpError:
+            return None
+        if not query or get_operation_type(query, operation_name) != OperationType.QUERY:
+            return None
+        plan = IncrementalPlan(parse_query(query), operation_name, variables)
+        if not plan:
+            return None
+
+        request.wrote_to_primary = False
+        denied = self.charge_rate_limit(request, query, variables, operation_name, False)
+        if denied:
+            return self.json_response(request, {'errors': [self.format_error(e) for e in denied.errors]}, 400)
+
+        # The later payloads are resolved after the middleware stack has
+        # returned, so carry the read-your-writes pin along explicitly. Every
+        # phase reads one snapshot of one database.
+        pinned = routers.is_pinned()
+        with routers.primary_reads(pinned):
+            alias = routers.read_alias()
+
+        def phase(resolve):
+            with routers.primary_reads(pinned), routers.reads_from(alias):
+                return resolve()
+
+        def execute():
+            request.incremental_plan = plan
+            self.execution_context_class = IncrementalExecutionContext
+            result = GraphQLView.execute_graphql_request(
+                self, request, data, print_ast(plan.initial), variables, operation_name
+            )
+            if result.errors:
+                logger.error("GraphQL errors: %s", result.errors)
+            return result
+
+        def parts():
+            with routers.snapshot(alias):
+                initial = phase(execute)
+                if initial.data is None:
+                    yield initial
+                    return
+                first = {'data': initial.data, 'hasNext': True}
+                if initial.errors:
+                    first['errors'] = [self.format_error(e) for e in initial.errors]
+                yield self.encode_part(request, first)
+                for number, patch in enumerate(plan.patches, start=1):
+                    incremental = phase(lambda: plan.payloads(patch, self.format_error))
+                    yield self.encode_part(request, {
+                        'incremental': incremental,
+                        'hasNext': number < len(plan.patches),
+                    })
+
+        # The first part is produced here, so a failed operation still gets
+        # a JSON error response. The transaction then stays open until the
+        # response has been sent, or closed.
+        parts = parts()
+        first = next(parts)
+        if isinstance(first, ExecutionResult):
+            parts.close()
+            return self.json_response(request, {'errors': [self.format_error(e) for e in first.errors]}, 400)
+
+        response = StreamingHttpResponse(MultipartBody(first, parts), content_type=MULTIPART_CONTENT_TYPE)
+        # Let nginx pass each part on as soon as it is written.
+        response['X-Accel-Buffering'] = 'no'
+        patch_cache_control(response, no_store=True)
+        return response
+
+    def get_response(self, request, data, show_graphiql=False):
+        # Each operation of a batch reports only the lists of its own result.
+        pagination.take_page_info(request)
+        return super().get_response(request, data, show_graphiql)
+
+    def encode_part(self, request, payload):
+        encoded = self.json_encode(request, payload)
+        return encoded.encode() if isinstance(encoded, str) else encoded
+
+    def json_response(self, request, payload, status):
+        return HttpResponse(self.json_encode(request, payload), status=status, content_type='application/json')
+
+    def json_encode(self, request, d, pretty=False):
+        """
+        Serialize with orjson when it is installed, else the standard library.
+        A payload with results carries the pageInfo of the lists resolved
+        since the previous one (core.pagination).
+        """
+        if isinstance(d, dict) and ('data' in d or 'incremental' in d):
+            page_info = pagination.take_page_info(request)
+            if page_info:
+                d = {**d, 'extensions': {'pageInfo': page_info}}
+        if self.pretty or pretty or request.GET.get('pretty'):
+            return super().json_encode(request, d, pretty=True)
+        if orjson is not None:
+            try:
+                encoded = orjson.dumps(d)
+            except TypeError:
+                # Values orjson rejects, such as integers beyond 64 bits.
+                pass
+            else:
+                # Batched responses are joined as text by GraphQLView.
+                return encoded.decode() if self.batch else encoded
+        return json.dumps(d, separators=(',', ':'))
+
+    def charge_rate_limit(self, request, query, variables, operation_name, show_graphiql):
+        """Charge the operation's cost; return an error result if it is refused"""
+        if show_graphiql or not getattr(settings, 'RATELIMIT_ENABLE', True):
+            return None
+        if self.batch:
+            # The whole batch is charged once, before its first operation runs.
+            if not hasattr(request, 'batch_denial'):
+                request.batch_denial = self.charge_operations(request, self.batch_operations(request))
+            return request.batch_denial
+        document = query and parse_query(query)
+        if document is None:
+            return None
+        return self.charge_operations(request, [(document, operation_name, variables)])
+
+    def charge_operations(self, request, operations):
+        decision = ratelimit.charge_operations(request, self.schema.graphql_schema, operations)
+        if decision is None:
+            return None
+        request.rate_limit = decision
+        if decision.allowed:
+            return None
+        logger.warning("Rate limited %s (cost %s)", ratelimit.client_address(request), decision.cost)
+        return ExecutionResult(data=None, errors=[GraphQLError(decision.message)])
+
+    def is_batch_request(self, request):
+        return (
+            request.method == 'POST'
+            and self.get_content_type(request) == 'application/json'
+            and request.body.lstrip()[:1] == b'['
+        )
+
+    def parse_body(self, request):
+        data = super().parse_body(request)
+        if self.batch:
+            limit = getattr(settings, 'GRAPHQL_BATCH_MAX_OPERATIONS', 10)
+            if len(data) > limit:
+                raise HttpError(HttpResponseBadRequest(f"A batch may hold at most {limit} operations."))
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest("Each operation in a batch must be a JSON object."))
+        return data
+
+    def batch_operations(self, request):
+        """The parsed (document, operation_name, variables) of each batched operation"""
+        operations = []
+        for entry in self.parse_body(request):
+            try:
+                query, variables, operation_name, _ = self.get_graphql_params(request, entry)
+            except HttpError:
+                # Reported when the operation itself runs.
+                continue
+            document = query and parse_query(query)
+            if document is not None:
+                operations.append((document, operation_name, variables))
+        return operations
@@ -0,0 +1,52 @@
+"""
+Work a server process does once, before its first request.
+
+Left to the first request, a worker imports the URLconf and the views,
+builds the graphene schema from the models and validates it while a
+client waits, and the first introspection query pays for executing it
+(core.introspection). ``warm_up`` does all of that at startup instead:
+config.wsgi calls it when GRAPHQL_WARMUP is on, so with gunicorn's
+``--preload`` it runs once in the master and every worker forks with the
+result. ``manage.py warmup`` runs it at deploy time, where a schema that
+fails to build fails the deploy.
+
+Nothing here opens a database connection: connections must not be shared
+across ``fork``.
+"""
+import time
+
+from graphql import validate_schema
+
+from . import introspection
+
+
+def _schema():
+    from graphene_django.settings import graphene_settings
+    return graphene_settings.SCHEMA.graphql_schema
+
+
+def _load_urls():
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+def _check_schema():
+    errors = validate_schema(_schema())
+    if errors:
+        raise TypeError('\n\n'.join(error.message for error in errors))
+
+
+def warm_up():
+    """Prime the per-process caches; return the seconds each step took, in order"""
+    steps = {
+        'urls': _load_urls,
+        'schema': _schema,
+        'validation': _check_schema,
+        'introspection': lambda: introspection.prime(_schema()),
+    }
+    timings = {}
+    for name, function in steps.items():
+        start = time.perf_counter()
+        function()
+        timings[name] = time.perf_counter() - start
+    return timings
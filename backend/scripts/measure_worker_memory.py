@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Report how much memory each gunicorn worker holds alone.
+
+Starts gunicorn with config/gunicorn.py in each mode (without preload,
+with preload, with preload and gc.freeze), sends it some GraphQL requests
+and reads every worker's /proc/<pid>/smaps_rollup:
+
+* RSS: pages the worker can reach, shared or not;
+* PSS: each shared page divided among the processes sharing it;
+* USS: pages only this worker holds, what a further worker would cost.
+
+Or, with --pid, measures the workers of a running gunicorn master.
+Linux only. Run from backend/ with DATABASE_URL set, e.g.
+
+    python scripts/measure_worker_memory.py --workers 3 --requests 300
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+MODES = {
+    'no preload': {'GUNICORN_PRELOAD': '0'},
+    'preload': {'GUNICORN_PRELOAD': '1', 'GUNICORN_GC_FREEZE': '0'},
+    'preload + gc.freeze': {'GUNICORN_PRELOAD': '1', 'GUNICORN_GC_FREEZE': '1'},
+}
+
+QUERIES = [
+    '{ organizations { id name slug } }',
+    '{ __schema { queryType { name } types { name kind } } }',
+]
+
+
+def memory(pid):
+    """RSS, PSS and USS of ``pid`` in kB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0])
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'uss': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as listing:
+        return [int(child) for child in listing.read().split()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_workers(master, workers, port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if master.poll() is not None:
+            sys.exit(f'gunicorn exited with status {master.returncode}')
+        if len(children(master.pid)) >= workers:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                pass
+        time.sleep(0.2)
+    sys.exit('gunicorn did not start its workers in time')
+
+
+def send_requests(port, count):
+    for i in range(count):
+        body = json.dumps({'query': QUERIES[i % len(QUERIES)]}).encode()
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{port}/graphql/', body, {'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+
+def report(name, master_pid):
+    workers = [memory(pid) for pid in children(master_pid)]
+    print(f'{name}: {len(workers)} workers')
+    print(f'  master  RSS {memory(master_pid)["rss"] / 1024:7.1f} MB')
+    for i, worker in enumerate(workers):
+        print('  worker {}  RSS {:7.1f} MB  PSS {:7.1f} MB  USS {:7.1f} MB'.format(
+            i, worker['rss'] / 1024, worker['pss'] / 1024, worker['uss'] / 1024
+        ))
+    if workers:
+        print('  total PSS of the workers {:.1f} MB, mean USS {:.1f} MB'.format(
+            sum(w['pss'] for w in workers) / 1024, sum(w['uss'] for w in workers) / len(workers) / 1024
+        ))
+
+
+def measure(name, overrides, workers, requests):
+    port = free_port()
+    env = {
+        **os.environ,
+        **overrides,
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_ACCESS_LOG': '/dev/null',
+        # Every request comes from the same client; its bucket would run dry.
+        'RATELIMIT_ENABLE': '0',
+    }
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'python:config.gunicorn'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_workers(master, workers, port)
+        # Enough requests to reach every worker and let them collect.
+        send_requests(port, requests)
+        report(name, master.pid)
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pid', type=int, help='measure the workers of this running gunicorn master')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    if args.pid:
+        report(f'gunicorn {args.pid}', args.pid)
+        return
+    for name, overrides in MODES.items():
+        measure(name, overrides, args.workers, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -47,6 +47,7 @@ export const CREATE_PROJECT = gql`
         dueDate
         createdAt
         updatedAt
+        version
         taskCount
         completedTasksCount
         completionRate
@@ -68,6 +69,7 @@ export const UPDATE_PROJECT = gql`
     $description: String
     $status: String
     $dueDate: Date
+    $expectedVersion: Int
   ) {
     updateProject(
       id: $id
@@ -76,9 +78,14 @@ export const UPDATE_PROJECT = gql`
       description: $description
       status: $status
       dueDate: $dueDate
+      expectedVersion: $expectedVersion
     ) {
       success
       message
+      conflict {
+        currentVersion
+        currentUpdatedAt
+      }
       project {
         id
         name
@@ -87,6 +94,7 @@ export const UPDATE_PROJECT = gql`
         dueDate
         createdAt
         updatedAt
+        version
         taskCount
         completedTasksCount
         completionRate
@@ -134,6 +142,7 @@ export const CREATE_TASK = gql`
         dueDate
         createdAt
         updatedAt
+        version
         commentCount
         project {
           id
@@ -159,6 +168,7 @@ export const UPDATE_TASK = gql`
     $priority: String
     $assigneeEmail: String
     $dueDate: DateTime
+    $expectedVersion: Int
   ) {
     updateTask(
       id: $id
@@ -169,9 +179,14 @@ export const UPDATE_TASK = gql`
       priority: $priority
       assigneeEmail: $assigneeEmail
       dueDate: $dueDate
+      expectedVersion: $expectedVersion
     ) {
       success
       message
+      conflict {
+        currentVersion
+        currentUpdatedAt
+      }
       task {
         id
         title
@@ -182,6 +197,7 @@ export const UPDATE_TASK = gql`
         dueDate
         createdAt
         updatedAt
+        version
         commentCount
         project {
           id
@@ -255,6 +271,7 @@ export const TASK_FRAGMENT = gql`
     dueDate
     createdAt
     updatedAt
+    version
     commentCount
   }
 `;
@@ -268,6 +285,7 @@ export const PROJECT_FRAGMENT = gql`
     dueDate
     createdAt
     updatedAt
+    version
     taskCount
     completedTasksCount
     completionRate
@@ -39,7 +39,7 @@ export const GET_PROJECTS = gql`
     $organizationSlug: String!
     $status: String
     $search: String
-    $orderBy: String
+    $orderBy: [ProjectOrder!]
     $limit: Int
     $offset: Int
   ) {
@@ -58,9 +58,12 @@ export const GET_PROJECTS = gql`
       dueDate
       createdAt
       updatedAt
-      taskCount
-      completedTasksCount
-      completionRate
+      version
+      ... @defer {
+        taskCount
+        completedTasksCount
+        completionRate
+      }
       organization {
         id
         name
@@ -80,6 +83,7 @@ export const GET_PROJECT = gql`
       dueDate
       createdAt
       updatedAt
+      version
       taskCount
       completedTasksCount
       completionRate
@@ -101,7 +105,7 @@ export const GET_TASKS = gql`
     $priority: String
     $assigneeEmail: String
     $search: String
-    $orderBy: String
+    $orderBy: [TaskOrder!]
     $limit: Int
     $offset: Int
   ) {
@@ -125,6 +129,7 @@ export const GET_TASKS = gql`
       dueDate
       createdAt
       updatedAt
+      version
       commentCount
       project {
         id
@@ -151,6 +156,7 @@ export const GET_TASK = gql`
       dueDate
       createdAt
       updatedAt
+      version
       commentCount
       project {
         id
@@ -194,7 +200,7 @@ export const GET_DASHBOARD_DATA = gql`
       totalTasks
       completedTasks
     }
-    projects(organizationSlug: $organizationSlug, limit: 5, orderBy: "-updated_at") {
+    projects(organizationSlug: $organizationSlug, limit: 5, orderBy: UPDATED_AT_DESC) {
       id
       name
       description
@@ -248,6 +254,19 @@ export const GET_ORGANIZATION_STATS = gql`
       projectCount
       totalTasks
       completedTasks
+      analytics {
+        overdueTasks
+        completionRate
+        byStatus {
+          key
+          count
+        }
+        byPriority {
+          key
+          count
+        }
+        overdueAsOf
+      }
     }
     projects(organizationSlug: $organizationSlug) {
       id
@@ -257,6 +276,32 @@ export const GET_ORGANIZATION_STATS = gql`
       completionRate
       createdAt
       dueDate
+      analytics {
+        overdueTasks
+      }
+    }
+  }
+`;
+
+export const GET_PROJECT_VELOCITY = gql`
+  query GetProjectVelocity(
+    $projectId: ID!
+    $organizationSlug: String!
+    $from: Date!
+    $to: Date!
+    $granularity: VelocityGranularity
+  ) {
+    projectVelocity(
+      projectId: $projectId
+      organizationSlug: $organizationSlug
+      from: $from
+      to: $to
+      granularity: $granularity
+    ) {
+      start
+      created
+      completed
+      reopened
     }
   }
 `;
@@ -10,10 +10,12 @@ import { setContext } from '@apollo/client/link/context';
 import { onError } from '@apollo/client/link/error';
 import { RetryLink } from '@apollo/client/link/retry';
 
-// GraphQL endpoint
+// GraphQL endpoint. Queries go over GET so the browser and the nginx
+// microcache can reuse them (see nginx.conf); mutations stay on POST.
 const httpLink = createHttpLink({
-  uri: 'http://localhost:8000/graphql/',
+  uri: import.meta.env.VITE_API_URL ?? 'http://localhost:8000/graphql/',
   credentials: 'include',
+  useGETForQueries: true,
 });
 
 // Auth link (for future authentication)
@@ -309,12 +309,16 @@ export function TaskDetail() {
       const result = await updateTask({
         id: taskId,
         organizationSlug: selectedOrganization.slug,
+        expectedVersion: task?.version,
         ...data,
       });
       
       if (result?.success) {
         setIsEditing(false);
         refetchTask();
+      } else if (result?.conflict) {
+        // Someone else saved first: show their version before editing again.
+        refetchTask();
       }
     } catch (error) {
       console.error('Failed to update task:', error);
@@ -1,5 +1,7 @@
 // GraphQL Query and Mutation types for Apollo Client
 
+import { type ProjectOrder, type TaskOrder } from './index';
+
 // Query Variables
 export type GetOrganizationsVariables = Record<string, never>
 
@@ -11,7 +13,7 @@ export interface GetProjectsVariables {
   organizationSlug: string;
   status?: string;
   search?: string;
-  orderBy?: string;
+  orderBy?: ProjectOrder[];
   limit?: number;
   offset?: number;
 }
@@ -28,7 +30,7 @@ export interface GetTasksVariables {
   priority?: string;
   assigneeEmail?: string;
   search?: string;
-  orderBy?: string;
+  orderBy?: TaskOrder[];
   limit?: number;
   offset?: number;
 }
@@ -106,9 +108,19 @@ export interface GraphQLError {
   extensions?: Record<string, unknown>;
 }
 
+// A paged list in a response, keyed by its path (e.g. "projects.0.tasks")
+export interface PageInfo {
+  limit: number;
+  offset: number;
+  hasNextPage: boolean;
+}
+
 export interface GraphQLResponse<T = unknown> {
   data?: T;
   errors?: GraphQLError[];
+  extensions?: {
+    pageInfo?: Record<string, PageInfo>;
+  };
   loading?: boolean;
   networkStatus?: number;
 }
@@ -9,6 +9,19 @@ export interface Organization {
   projectCount?: number;
   totalTasks?: number;
   completedTasks?: number;
+  analytics?: TaskAnalytics | null;
+}
+
+// Read from the server's task rollups; null until they have been built.
+export interface TaskAnalytics {
+  totalTasks?: number;
+  completedTasks?: number;
+  overdueTasks?: number;
+  completionRate?: number;
+  byStatus?: { key: string; count: number }[];
+  byPriority?: { key: string; count: number }[];
+  breakdown?: { status: string; priority: string; count: number; overdue: number }[];
+  overdueAsOf?: string;
 }
 
 export interface Project {
@@ -20,9 +33,11 @@ export interface Project {
   dueDate?: string;
   createdAt: string;
   updatedAt: string;
+  version?: number;
   taskCount?: number;
   completedTasksCount?: number;
   completionRate?: number;
+  analytics?: TaskAnalytics | null;
 }
 
 export interface Task {
@@ -36,6 +51,7 @@ export interface Task {
   dueDate?: string;
   createdAt: string;
   updatedAt: string;
+  version?: number;
   commentCount?: number;
 }
 
@@ -52,6 +68,16 @@ export interface TaskComment {
 export type ProjectStatus = 'ACTIVE' | 'COMPLETED' | 'ON_HOLD' | 'CANCELLED';
 export type TaskStatus = 'TODO' | 'IN_PROGRESS' | 'DONE' | 'BLOCKED';
 export type TaskPriority = 'LOW' | 'MEDIUM' | 'HIGH' | 'URGENT';
+export type ProjectOrder =
+  | 'CREATED_AT_ASC' | 'CREATED_AT_DESC'
+  | 'UPDATED_AT_ASC' | 'UPDATED_AT_DESC'
+  | 'NAME_ASC' | 'NAME_DESC'
+  | 'DUE_DATE_ASC' | 'DUE_DATE_DESC';
+export type TaskOrder =
+  | 'CREATED_AT_ASC' | 'CREATED_AT_DESC'
+  | 'UPDATED_AT_ASC' | 'UPDATED_AT_DESC'
+  | 'DUE_DATE_ASC' | 'DUE_DATE_DESC'
+  | 'PRIORITY_ASC' | 'PRIORITY_DESC';
 
 // Form input types
 export interface CreateOrganizationInput {
@@ -74,6 +100,8 @@ export interface UpdateProjectInput {
   description?: string;
   status?: ProjectStatus;
   dueDate?: string;
+  // The version last read; the update is refused if it has changed since.
+  expectedVersion?: number;
 }
 
 export interface CreateTaskInput {
@@ -96,6 +124,7 @@ export interface UpdateTaskInput {
   priority?: TaskPriority;
   assigneeEmail?: string;
   dueDate?: string;
+  expectedVersion?: number;
 }
 
 export interface CreateTaskCommentInput {
@@ -110,7 +139,7 @@ export interface ProjectFilters {
   organizationSlug: string;
   status?: ProjectStatus;
   search?: string;
-  orderBy?: string;
+  orderBy?: ProjectOrder[];
   limit?: number;
   offset?: number;
 }
@@ -122,7 +151,7 @@ export interface TaskFilters {
   priority?: TaskPriority;
   assigneeEmail?: string;
   search?: string;
-  orderBy?: string;
+  orderBy?: TaskOrder[];
   limit?: number;
   offset?: number;
 }